@@ -1,8 +1,86 @@
 """
 ASGI config for backend project.
+
+Serves the order status event stream directly and everything else through
+Django. Run it under an ASGI server, e.g.
+`gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker`.
 """
+import asyncio
 import os
-from django.core.asgi import get_asgi_application
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-application = get_asgi_application()
\ No newline at end of file
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django's ASGI handler, except that streaming responses (the admin
+    exports) are iterated in a thread of their own.
+
+    Django 3.2 iterates them on the event loop, where the first database
+    read raises SynchronousOnlyOperation after the 200 has gone out. An
+    export holds a transaction and a server-side cursor open between parts,
+    so every part is produced in the same dedicated thread, never the
+    shared one other requests' views run in, and that thread's connection
+    is closed once the response ends.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-stream') as executor:
+            parts = iter(response)
+            try:
+                while True:
+                    part = await loop.run_in_executor(executor, next, parts, None)
+                    if part is None:
+                        break
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body'})
+            finally:
+                # Closing the response ends the export's transaction in the
+                # thread that opened it; request_finished then fires there
+                await loop.run_in_executor(executor, _close_in_thread, response)
+        await sync_to_async(close_old_connections, thread_sensitive=True)()
+
+
+def _close_in_thread(response):
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+# Imported once the app registry is ready
+from gas_management.streams import ORDER_EVENTS_PATH, order_events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Long-lived streams bypass Django's handler, which would hold a thread
+    # for each open stream
+    if scope['type'] == 'http' and scope['path'] == ORDER_EVENTS_PATH:
+        await order_events(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
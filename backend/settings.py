@@ -26,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'gas_management.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,15 +60,44 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # PostgreSQL with a per-process connection pool; CONN_MAX_AGE stays 0
+        # so each request returns its connection to the pool when it ends
+        'ENGINE': 'gas_management.postgresql_pool',
         'NAME': os.environ.get('DB_NAME', 'postgres'),
         'USER': os.environ.get('DB_USER', 'postgres'),
         'PASSWORD': os.environ.get('DB_PASSWORD', 'postgres'),
         'HOST': os.environ.get('DB_HOST', 'db'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        'POOL': {
+            # Connections each worker process keeps open, and the most it may open
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Seconds before a connection is replaced
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 1800)),
+            # Seconds an idle connection above MIN_SIZE is kept open
+            'MAX_IDLE': 300,
+            # Seconds a request waits for a free connection before failing
+            'TIMEOUT': 10,
+            # Connections idle this many seconds are pinged before reuse
+            'CHECK_AFTER': 30,
+        },
     }
 }
 
+# Cache shared by every worker process: catalogue pages and their version,
+# Idempotency-Key replays, and the auth identity and role-change markers.
+# Without CACHE_LOCATION (host:port of a memcached server) each process keeps
+# a private in-memory cache, so an invalidation reaches only the process that
+# made it and the others serve what they hold until it expires.
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_LOCATION,
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -104,6 +135,54 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'gas_management.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'gas_management.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
+    # Projected list pages are encoded with orjson; every other response
+    # renders exactly as with DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'gas_management.renderers.ProjectedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
+
+# Seconds an authenticated user and their role are reused within a process
+# before being reloaded; saves of the user or profile invalidate them sooner.
+# 0 loads the user on every request.
+AUTH_USER_CACHE_TIMEOUT = 60
+# Users kept per process; the least recently seen are dropped first
+AUTH_USER_CACHE_SIZE = 10000
+
+# Seconds an Idempotency-Key on order creation or mark-as-paid is honoured;
+# purge_idempotency_keys deletes older keys and should run at least daily.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Days after which DELIVERED, CANCELLED and REJECTED orders may be moved, with
+# their invoices, payments and ratings, into the archive tables by
+# archive_orders; served from then on by /api/archive/orders/.
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+# Seconds a catalogue page (GET /v1/gas/) stays cached; 0 disables the cache.
+# Edits to inventory and stock movements invalidate it once they commit, in
+# every process when CACHE_LOCATION is set; without it other processes can
+# serve their stale copy for up to this long.
+CATALOGUE_CACHE_TIMEOUT = 300
+
+# Ranked full-text search (PostgreSQL only) for the catalogue's `search`
+# parameter; False keeps the unranked icontains search everywhere.
+CATALOGUE_FULL_TEXT_SEARCH = True
+
+# Order status Server-Sent Events, streamed by backend.asgi at /api/v1/events/orders/.
+# LocalBackend only reaches streams held by the process that made the change;
+# when the API runs in more than one process use
+# 'gas_management.events.PostgresNotifyBackend' so every ASGI worker hears it.
+ORDER_EVENTS_BACKEND = 'gas_management.events.LocalBackend'
+# Seconds between keepalive comments on an idle stream
+ORDER_EVENTS_KEEPALIVE = 15
+# Events a stream may fall behind by before it is closed for the client to reconnect
+ORDER_EVENTS_QUEUE_SIZE = 100
+
+# Bearer token Prometheus must send to scrape /metrics; unset leaves it open,
+# for deployments where /metrics is only reachable from the internal network
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
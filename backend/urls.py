@@ -1,13 +1,15 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from gas_management.views import LoginView, RefreshView
+from gas_management.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('gas_management.urls')),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/v1/login/', TokenObtainPairView.as_view(), name='login'),
-    path('api/v1/logout/', TokenObtainPairView.as_view(), name='logout'),
+    path('api/token/', LoginView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', RefreshView.as_view(), name='token_refresh'),
+    path('api/v1/login/', LoginView.as_view(), name='login'),
+    path('api/v1/logout/', LoginView.as_view(), name='logout'),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, GasInventory, Order, Invoice, Payment, Rating
+from .models import UserProfile, GasInventory, Order, Invoice, InvoiceOutbox, Payment, Rating
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -56,6 +56,12 @@ class InvoiceAdmin(admin.ModelAdmin):
     list_filter = ('is_paid', 'admin_approval', 'created_at')
     search_fields = ('invoice_number', 'order__buyer__username')
 
+@admin.register(InvoiceOutbox)
+class InvoiceOutboxAdmin(admin.ModelAdmin):
+    """Django admin configuration for InvoiceOutbox, to inspect any undrained backlog."""
+    
+    list_display = ('order', 'created_at')
+    
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     """
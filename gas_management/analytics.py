@@ -0,0 +1,202 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedRating, Order, Rating, SellerDailySales
+
+# Orders count towards sales from approval on; a cancellation takes them back out
+COUNTED_STATUSES = ('APPROVED', 'DELIVERED')
+
+ORDER_SALES_FIELDS = (
+    'gas_inventory__seller_id', 'created_at', 'gas_inventory__brand',
+    'gas_inventory__weight_kg', 'quantity', 'total_price',
+)
+SALES_COLUMNS = (
+    'seller_id', 'day', 'brand', 'weight_kg', 'orders', 'units', 'revenue', 'rating_count', 'rating_sum',
+)
+REBUILD_BATCH_SIZE = 5000
+
+
+def _day(created_at):
+    return timezone.localtime(created_at).date()
+
+
+def order_sales(order):
+    """ The rollup inputs for an order instance whose gas_inventory is loaded. """
+    inventory = order.gas_inventory
+    return (inventory.seller_id, order.created_at, inventory.brand, inventory.weight_kg,
+            order.quantity, order.total_price)
+
+
+def orders_sales(order_ids):
+    """ The rollup inputs for many orders, read with one query. """
+    return Order.objects.filter(pk__in=order_ids).values_list(*ORDER_SALES_FIELDS)
+
+
+def _upsert(deltas):
+    """
+    Add per-key deltas to the rollup with INSERT ... ON CONFLICT DO UPDATE,
+    which both PostgreSQL and SQLite support. The addition happens in SQL,
+    so concurrent writers to the same row never lose each other's updates.
+    """
+    if not deltas:
+        return
+    ops = connection.ops
+    table = ops.quote_name(SellerDailySales._meta.db_table)
+    columns = ', '.join(SALES_COLUMNS)
+    additive = ', '.join(f'{name} = {table}.{name} + EXCLUDED.{name}' for name in SALES_COLUMNS[4:])
+    batch_size = min(500, (connection.features.max_query_params or 5000) // len(SALES_COLUMNS))
+    placeholder = '(' + ', '.join(['%s'] * len(SALES_COLUMNS)) + ')'
+
+    items = list(deltas.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            params = []
+            for (seller_id, day, brand, weight_kg), (orders, units, revenue, rating_count, rating_sum) in batch:
+                params += [
+                    seller_id, ops.adapt_datefield_value(day), brand,
+                    ops.adapt_decimalfield_value(weight_kg, 5, 1), orders, units,
+                    ops.adapt_decimalfield_value(revenue, 14, 2), rating_count, rating_sum,
+                ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholder] * len(batch))} '
+                f'ON CONFLICT (seller_id, day, brand, weight_kg) DO UPDATE SET {additive}',
+                params,
+            )
+
+
+def record_sales(rows, sign=1):
+    """
+    Fold orders into (sign=1) or out of (sign=-1) the daily rollup.
+
+    `rows` are (seller_id, created_at, brand, weight_kg, quantity, total_price)
+    tuples as returned by order_sales()/orders_sales(). Call inside the
+    transaction that changes the orders' status so both commit together.
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal(0), 0, 0])
+    for seller_id, created_at, brand, weight_kg, quantity, total_price in rows:
+        delta = deltas[(seller_id, _day(created_at), brand, weight_kg)]
+        delta[0] += sign
+        delta[1] += sign * quantity
+        delta[2] += sign * total_price
+    _upsert(deltas)
+
+
+def record_rating(rating, count_delta, sum_delta):
+    """ Adjust the rating figures on the rollup row of the order `rating` belongs to. """
+    seller_id, created_at, brand, weight_kg, _, _ = order_sales(rating.order)
+    _upsert({(seller_id, _day(created_at), brand, weight_kg): [0, 0, Decimal(0), count_delta, sum_delta]})
+
+
+def seller_dashboard(seller_id, date_from, date_to):
+    """
+    Totals and per-day, per-brand and per-weight breakdowns for one seller.
+
+    Reads only the seller's rollup rows for the window, so the cost depends
+    on the window length and product range, never on order history.
+    """
+    rows = SellerDailySales.objects.filter(seller_id=seller_id, day__range=(date_from, date_to)).values_list(
+        'day', 'brand', 'weight_kg', 'orders', 'units', 'revenue', 'rating_count', 'rating_sum'
+    )
+
+    def bucket():
+        return {'orders': 0, 'units': 0, 'revenue': Decimal(0), 'rating_count': 0, 'rating_sum': 0}
+
+    totals = bucket()
+    groups = {'day': defaultdict(bucket), 'brand': defaultdict(bucket), 'weight_kg': defaultdict(bucket)}
+    for day, brand, weight_kg, orders, units, revenue, rating_count, rating_sum in rows:
+        for target in (totals, groups['day'][day], groups['brand'][brand], groups['weight_kg'][weight_kg]):
+            target['orders'] += orders
+            target['units'] += units
+            target['revenue'] += revenue
+            target['rating_count'] += rating_count
+            target['rating_sum'] += rating_sum
+
+    def present(values):
+        rating_sum = values.pop('rating_sum')
+        values['revenue'] = f"{Decimal(values['revenue']).quantize(Decimal('0.01'))}"
+        values['average_rating'] = round(rating_sum / values['rating_count'], 2) if values['rating_count'] else None
+        return values
+
+    result = {'date_from': date_from, 'date_to': date_to, 'totals': present(totals)}
+    for name, key in [('by_day', 'day'), ('by_brand', 'brand'), ('by_weight', 'weight_kg')]:
+        result[name] = [
+            {key: str(group) if key == 'weight_kg' else group, **present(values)}
+            for group, values in sorted(groups[key].items())
+        ]
+    return result
+
+
+def rebuild_sales(seller_ids=None):
+    """
+    Recompute the rollup from the Order and Rating tables, archived orders
+    and ratings included, and replace it.
+
+    Returns (rows_written, rows_changed), where rows_changed counts keys
+    whose stored figures had drifted from the recomputed ones.
+    """
+    orders = [model.objects.filter(status__in=COUNTED_STATUSES) for model in (Order, ArchivedOrder)]
+    ratings = [Rating.objects.all(), ArchivedRating.objects.all()]
+    existing = SellerDailySales.objects.all()
+    if seller_ids is not None:
+        orders = [queryset.filter(gas_inventory__seller_id__in=seller_ids) for queryset in orders]
+        ratings = [queryset.filter(order__gas_inventory__seller_id__in=seller_ids) for queryset in ratings]
+        existing = existing.filter(seller_id__in=seller_ids)
+
+    def key_fields(prefix):
+        return {
+            'seller': F(f'{prefix}gas_inventory__seller_id'),
+            'day_': TruncDate(f'{prefix}created_at'),
+            'brand': F(f'{prefix}gas_inventory__brand'),
+            'weight': F(f'{prefix}gas_inventory__weight_kg'),
+        }
+
+    # A day can hold both archived orders and live ones (still APPROVED, say),
+    # so their figures are added up
+    rebuilt = defaultdict(lambda: [0, 0, Decimal(0), 0, 0])
+    for queryset in orders:
+        order_totals = (
+            queryset.values(**key_fields(''))
+            .annotate(count=Count('pk'), units=Sum('quantity'), revenue=Sum('total_price'))
+            .values_list('seller', 'day_', 'brand', 'weight', 'count', 'units', 'revenue')
+        )
+        for seller_id, day, brand, weight_kg, count, units, revenue in order_totals.iterator():
+            totals = rebuilt[(seller_id, day, brand, weight_kg)]
+            totals[:3] = [totals[0] + count, totals[1] + units, totals[2] + revenue]
+    for queryset in ratings:
+        rating_totals = (
+            queryset.values(**key_fields('order__'))
+            .annotate(count=Count('pk'), total=Sum('rating'))
+            .values_list('seller', 'day_', 'brand', 'weight', 'count', 'total')
+        )
+        for seller_id, day, brand, weight_kg, count, total in rating_totals.iterator():
+            totals = rebuilt[(seller_id, day, brand, weight_kg)]
+            totals[3:] = [totals[3] + count, totals[4] + total]
+
+    with transaction.atomic():
+        # Rows whose orders were all cancelled linger as zeros; they match "no row"
+        stored = {
+            (seller_id, day, brand, weight_kg): [orders, units, revenue, rating_count, rating_sum]
+            for seller_id, day, brand, weight_kg, orders, units, revenue, rating_count, rating_sum
+            in existing.select_for_update().values_list(*SALES_COLUMNS)
+            if orders or rating_count
+        }
+        changed = sum(1 for key in stored.keys() | rebuilt.keys() if stored.get(key) != rebuilt.get(key))
+        existing.delete()
+        SellerDailySales.objects.bulk_create(
+            [
+                SellerDailySales(
+                    seller_id=seller_id, day=day, brand=brand, weight_kg=weight_kg,
+                    orders=orders, units=units, revenue=revenue, rating_count=rating_count, rating_sum=rating_sum,
+                )
+                for (seller_id, day, brand, weight_kg), (orders, units, revenue, rating_count, rating_sum)
+                in rebuilt.items()
+            ],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+    return len(rebuilt), changed
@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import orders_sales, record_sales
+from .events import publish_status_changes
+from .invoicing import queue_invoices
+from .models import GasInventory, Order
+from .order_states import record_transitions
+from .stock import take_stock_many
+
+MAX_BATCH_SIZE = 1000
+
+NOT_FOUND = 'Order not found.'
+INSUFFICIENT_STOCK = 'Not enough inventory to fulfill this order.'
+
+
+def _outcome(order_id, status, detail=None):
+    outcome = {'id': order_id, 'status': status, 'ok': detail is None}
+    if detail is not None:
+        outcome['detail'] = detail
+    return outcome
+
+
+def _lock_orders(order_ids):
+    """
+    Lock the requested orders in primary key order and return
+    {id: (status, gas_inventory_id, quantity)}.
+
+    Locks are always taken orders first, then inventory, each in id order,
+    the same order the single-order approve and cancel actions use, so a
+    batch and a concurrent single action can never deadlock.
+    """
+    rows = (
+        Order.objects.select_for_update()
+        .filter(pk__in=order_ids)
+        .order_by('pk')
+        .values_list('pk', 'status', 'gas_inventory_id', 'quantity')
+    )
+    return {pk: (status, inventory_id, quantity) for pk, status, inventory_id, quantity in rows}
+
+
+def approve_orders(order_ids, actor_id=None):
+    """
+    Approve many pending orders in one transaction with a fixed number of queries.
+
+    Orders are taken in id order and each one is approved only if its
+    inventory row still holds enough units after the orders before it, so
+    a batch never oversells. Stock, statuses, their history, the sales
+    rollup and the invoice outbox are each written with a single statement.
+    Returns one outcome dict per requested id, in request order.
+    """
+    outcomes = {}
+    with transaction.atomic():
+        orders = _lock_orders(order_ids)
+        inventory_ids = sorted({inventory_id for _, inventory_id, _ in orders.values()})
+        available = dict(
+            GasInventory.objects.select_for_update()
+            .filter(pk__in=inventory_ids)
+            .order_by('pk')
+            .values_list('pk', 'quantity')
+        )
+
+        taken = {}
+        approved = []
+        for order_id, (status, inventory_id, quantity) in orders.items():
+            if status != 'PENDING':
+                outcomes[order_id] = _outcome(order_id, status, f'Cannot approve order with status {status}')
+            elif available[inventory_id] < quantity:
+                outcomes[order_id] = _outcome(order_id, status, INSUFFICIENT_STOCK)
+            else:
+                available[inventory_id] -= quantity
+                taken[inventory_id] = taken.get(inventory_id, 0) + quantity
+                approved.append(order_id)
+                outcomes[order_id] = _outcome(order_id, 'APPROVED')
+
+        if approved:
+            take_stock_many(taken)
+            now = timezone.now()
+            Order.objects.filter(pk__in=approved).update(status='APPROVED', updated_at=now)
+            record_transitions(approved, 'PENDING', 'APPROVED', actor_id, now)
+            record_sales(orders_sales(approved))
+            queue_invoices(approved)
+            publish_status_changes(approved, 'APPROVED', 'PENDING')
+
+    return [outcomes.get(order_id) or _outcome(order_id, None, NOT_FOUND) for order_id in order_ids]
+
+
+def reject_orders(order_ids, actor_id=None):
+    """ Reject many pending orders with one UPDATE; returns per-order outcomes like approve_orders(). """
+    outcomes = {}
+    with transaction.atomic():
+        orders = _lock_orders(order_ids)
+        rejected = []
+        for order_id, (status, _, _) in orders.items():
+            if status != 'PENDING':
+                outcomes[order_id] = _outcome(order_id, status, f'Cannot reject order with status {status}')
+            else:
+                rejected.append(order_id)
+                outcomes[order_id] = _outcome(order_id, 'REJECTED')
+
+        if rejected:
+            now = timezone.now()
+            Order.objects.filter(pk__in=rejected).update(status='REJECTED', updated_at=now)
+            record_transitions(rejected, 'PENDING', 'REJECTED', actor_id, now)
+            publish_status_changes(rejected, 'REJECTED', 'PENDING')
+
+    return [outcomes.get(order_id) or _outcome(order_id, None, NOT_FOUND) for order_id in order_ids]
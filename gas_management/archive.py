@@ -0,0 +1,135 @@
+"""
+Archiving of settled orders.
+
+Orders that ended DELIVERED, CANCELLED or REJECTED and are older than
+ORDER_ARCHIVE_AFTER_DAYS are moved, with their invoice, payment and rating,
+from the live tables into the Archived* tables, which keeps the live tables
+and their indexes sized to recent business. A chunk of orders moves in one
+transaction: each table's rows are deleted from the live table and inserted
+into the archive by one statement on PostgreSQL (`WITH moved AS (DELETE ...
+RETURNING ...) INSERT ...`), so a row is always in exactly one of the two and
+an interrupted run resumes where it stopped.
+
+On PostgreSQL the archive tables are range-partitioned by month of
+created_at. The partitions a chunk needs are created just before it moves,
+and history queries bounded by created_at read only the months they cover.
+Status history (OrderStatusChange) is left where it is.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+
+from .models import (
+    ArchivedInvoice, ArchivedOrder, ArchivedPayment, ArchivedRating,
+    Invoice, InvoiceOutbox, Order, Payment, Rating,
+)
+
+TERMINAL_STATUSES = ('DELIVERED', 'CANCELLED', 'REJECTED')
+DEFAULT_AGE_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def archive_after_days():
+    return getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', DEFAULT_AGE_DAYS)
+
+
+def _months(start, end):
+    """ The first instant of each UTC month from `start`'s to `end`'s, inclusive. """
+    month = datetime.datetime(start.year, start.month, 1, tzinfo=datetime.timezone.utc)
+    while month <= end:
+        yield month
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def ensure_partitions(model, start, end, created=None):
+    """
+    Create the monthly partitions of `model`'s archive table that rows
+    created between `start` and `end` fall in, on PostgreSQL. `created`, a
+    set, remembers partitions already made during one run.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    created = set() if created is None else created
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        for month in _months(start, end):
+            name = f'{table}_p{month:%Y%m}'
+            if name in created:
+                continue
+            following = (month + datetime.timedelta(days=32)).replace(day=1)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} '
+                f'PARTITION OF {connection.ops.quote_name(table)} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+            created.add(name)
+
+
+def _move(target, rows, archived_at, partitions):
+    """ Copy `rows`, a queryset of a live table, into `target`, then delete them; returns the number moved. """
+    bounds = rows.aggregate(first=Min('created_at'), last=Max('created_at'))
+    if bounds['first'] is None:
+        return 0
+    ensure_partitions(target, bounds['first'], bounds['last'], partitions)
+
+    quote = connection.ops.quote_name
+    table = quote(rows.model._meta.db_table)
+    columns = ', '.join(
+        quote(field.column) for field in target._meta.concrete_fields if field.name != 'archived_at'
+    )
+    selected, params = rows.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # The DELETE returns each row as it stands once any writer holding
+            # it has committed, so no change made meanwhile is lost
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {table} WHERE id IN ({selected}) RETURNING {columns}) '
+                f'INSERT INTO {quote(target._meta.db_table)} ({columns}, archived_at) '
+                f'SELECT {columns}, %s FROM moved',
+                [*params, archived_at]
+            )
+            return cursor.rowcount
+        cursor.execute(
+            f'INSERT INTO {quote(target._meta.db_table)} ({columns}, archived_at) '
+            f'SELECT {columns}, %s FROM {table} WHERE id IN ({selected})',
+            [archived_at, *params]
+        )
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({selected})', params)
+        return cursor.rowcount
+
+
+def archivable_orders(older_than_days=None):
+    """ Settled orders created more than `older_than_days` ago whose invoice is not still to be generated. """
+    days = archive_after_days() if older_than_days is None else older_than_days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    return Order.objects.filter(status__in=TERMINAL_STATUSES, created_at__lt=cutoff).exclude(
+        Exists(InvoiceOutbox.objects.filter(order=OuterRef('pk')))
+    )
+
+
+def archive_orders(older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move archivable orders and their invoices, payments and ratings into
+    the archive, `batch_size` orders per transaction. Orders locked by a
+    request in flight are skipped until a later run. Returns the number of
+    orders archived.
+    """
+    candidates = archivable_orders(older_than_days)
+    partitions = set()
+    archived = 0
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                candidates.select_for_update(skip_locked=True, of=('self',))
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return archived
+            archived_at = timezone.now()
+            _move(ArchivedRating, Rating.objects.filter(order_id__in=order_ids), archived_at, partitions)
+            _move(ArchivedPayment, Payment.objects.filter(invoice__order_id__in=order_ids), archived_at, partitions)
+            _move(ArchivedInvoice, Invoice.objects.filter(order_id__in=order_ids), archived_at, partitions)
+            archived += _move(ArchivedOrder, Order.objects.filter(pk__in=order_ids), archived_at, partitions)
@@ -0,0 +1,279 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import UserProfile
+
+# Claims added to every token pair at login and copied onto refreshed access tokens
+ROLE_CLAIM = 'role'
+ROLE_ISSUED_AT_CLAIM = 'role_iat'
+
+DEFAULT_USER_CACHE_TIMEOUT = 60
+DEFAULT_USER_CACHE_SIZE = 10000
+UNKNOWN_ROLE = object()
+
+
+def role_changed_key(user_id):
+    return f'gas_management:role-changed:{user_id}'
+
+
+def mark_role_changed(user_id):
+    """
+    Record that a user's role may have changed so tokens issued before now
+    stop being trusted for their role claim. The marker only needs to outlive
+    the longest-lived token that could still carry the old claim.
+
+    The marker lives in the cache, so it reaches other processes only
+    through a shared one (CACHE_LOCATION). With the default per-process
+    LocMemCache they keep trusting an access token's old claim until it
+    expires (ACCESS_TOKEN_LIFETIME); refreshing never carries it over, since
+    GasTokenRefreshSerializer reads the role from the database.
+    """
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    cache.set(role_changed_key(user_id), int(time.time()), timeout)
+
+
+def identity_version_key(user_id):
+    return f'gas_management:identity-version:{user_id}'
+
+
+def user_cache_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', DEFAULT_USER_CACHE_TIMEOUT)
+
+
+class CachedIdentity:
+    """ A cached user, and their role once a request has had to look it up. """
+    __slots__ = ('user', 'role', 'version', 'loaded_at')
+
+    def __init__(self, user, version):
+        self.user = user
+        self.role = UNKNOWN_ROLE
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+
+class UserCache:
+    """
+    A bounded, thread-safe LRU of authenticated users for one process.
+
+    Entries are keyed by user id and stamped with the identity version they
+    were loaded under; a different version, or an entry older than
+    AUTH_USER_CACHE_TIMEOUT seconds, is a miss.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, version):
+        with self._lock:
+            identity = self._entries.get(user_id)
+            if (identity is not None and identity.version == version
+                    and time.monotonic() - identity.loaded_at < user_cache_timeout()):
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return identity
+            self.misses += 1
+            return None
+
+    def put(self, user_id, identity):
+        max_size = getattr(settings, 'AUTH_USER_CACHE_SIZE', DEFAULT_USER_CACHE_SIZE)
+        with self._lock:
+            self._entries[user_id] = identity
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+user_cache = UserCache()
+
+
+def _bump_identity_version(user_id):
+    user_cache.discard(user_id)
+    cache.set(identity_version_key(user_id), uuid.uuid4().hex, user_cache_timeout())
+
+
+def invalidate_identity(user_id):
+    """
+    Stop trusting cached copies of a user in every process sharing the
+    cache. Bumped now and again after commit, so a copy reloaded from the
+    not-yet-committed old row in between is dropped too.
+    """
+    _bump_identity_version(user_id)
+    transaction.on_commit(lambda: _bump_identity_version(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps each validated user in this process's
+    user_cache, so steady-state requests make no identity queries. The role
+    still comes from the token's claim; when a request has to look it up
+    instead, the result is kept with the cached user too.
+
+    Saving or deleting a User or UserProfile invalidates the cached copy
+    through the shared cache's identity version; changes made with
+    queryset.update() are picked up within AUTH_USER_CACHE_TIMEOUT seconds.
+    With the default per-process LocMemCache other processes also rely on
+    that timeout. A timeout of 0 turns the cache off.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if not user_cache_timeout():
+            user = self.load_user(user_id)
+        else:
+            version = cache.get(identity_version_key(user_id))
+            identity = user_cache.get(user_id, version)
+            if identity is None:
+                identity = CachedIdentity(self.load_user(user_id), version)
+                user_cache.put(user_id, identity)
+            # Requests get their own copy to annotate or modify
+            user = copy.copy(identity.user)
+            user._cached_identity = identity
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+
+class Principal:
+    """ The authenticated user together with their resolved role. """
+    __slots__ = ('user', 'role')
+
+    def __init__(self, user, role):
+        self.user = user
+        self.role = role
+
+    @property
+    def is_buyer(self):
+        return self.role == 'BUYER'
+
+    @property
+    def is_seller(self):
+        return self.role == 'SELLER'
+
+    @property
+    def is_admin(self):
+        return self.role == 'ADMIN'
+
+
+def _role_from_token(user, token):
+    if token is None or not hasattr(token, 'get'):
+        return None
+    role = token.get(ROLE_CLAIM)
+    if role is None:
+        return None
+    # Fall back to the database if the role changed after this claim was issued
+    changed_at = cache.get(role_changed_key(user.pk))
+    if changed_at is not None and changed_at >= token.get(ROLE_ISSUED_AT_CLAIM, 0):
+        return None
+    return role
+
+
+def _profile_role(user):
+    # Users from CachedJWTAuthentication remember the role between requests
+    identity = getattr(user, '_cached_identity', None)
+    if identity is not None and identity.role is not UNKNOWN_ROLE:
+        return identity.role
+    role = UserProfile.objects.filter(user=user).values_list('role', flat=True).first()
+    if identity is not None:
+        identity.role = role
+    return role
+
+
+def get_principal(request):
+    """
+    Resolve the caller's role once per request.
+
+    The role comes from the access token's claim when present and still
+    current; otherwise (tokens issued before the claim existed, forced
+    authentication in tests, or a role changed since login) a single
+    UserProfile lookup is made, and kept with the user by
+    CachedJWTAuthentication. Either way the result is memoised on the
+    request so permissions and views share it.
+    """
+    principal = getattr(request, '_principal', None)
+    if principal is not None:
+        return principal
+
+    user = request.user
+    role = None
+    if user is not None and user.is_authenticated:
+        role = _role_from_token(user, request.auth)
+        if role is None:
+            role = _profile_role(user)
+
+    principal = Principal(user, role)
+    request._principal = principal
+    return principal
+
+
+def stamp_role(token, user_id):
+    """ Set `token`'s role claim from the user's profile, as it stands now. """
+    role = UserProfile.objects.filter(user_id=user_id).values_list('role', flat=True).first()
+    if role is None:
+        token.payload.pop(ROLE_CLAIM, None)
+        token.payload.pop(ROLE_ISSUED_AT_CLAIM, None)
+    else:
+        token[ROLE_CLAIM] = role
+        token[ROLE_ISSUED_AT_CLAIM] = int(time.time())
+    return token
+
+
+class GasTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """ Token pair serializer that embeds the user's role as a claim. """
+
+    @classmethod
+    def get_token(cls, user):
+        return stamp_role(super().get_token(user), user.pk)
+
+
+class GasTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh serializer that re-reads the role for the new access token
+    instead of copying the refresh token's claim, so a role change reaches
+    every process by the next refresh at the latest.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        data['access'] = str(stamp_role(access, access[api_settings.USER_ID_CLAIM]))
+        return data
@@ -0,0 +1,108 @@
+"""
+Reproducible performance scenarios, run with `python manage.py benchmark <name>`.
+
+Each scenario module registers its entry points with `@scenario(...)`. An
+entry point receives the parsed command options and returns a JSON-friendly
+dict of results, usually built from `summarize()`.
+"""
+import pkgutil
+import platform
+import subprocess
+import time
+from importlib import import_module
+
+import django
+from django.db import connection
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """ Register a benchmark scenario under `name`. """
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def load_scenarios():
+    for module in pkgutil.iter_modules(__path__):
+        import_module(f'{__name__}.{module.name}')
+    return SCENARIOS
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples, elapsed=None):
+    """ Latency percentiles in milliseconds and throughput for a list of durations in seconds. """
+    ordered = sorted(samples)
+    total = elapsed if elapsed is not None else sum(ordered)
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'ops_per_sec': round(len(ordered) / total, 1) if total else 0.0,
+    }
+
+
+def measure(func, iterations, warmup=3):
+    """ Call `func` `warmup` times untimed, then `iterations` times, returning each duration. """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def environment():
+    """ What a result file was measured against, so runs of different versions can be told apart. """
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'revision': revision,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+# Figures compared between runs, and whether a rise is an improvement
+COMPARED = {'p50_ms': False, 'p95_ms': False, 'p99_ms': False, 'ops_per_sec': True, 'queries_mean': False}
+
+
+def compare(baseline, current, path=''):
+    """
+    Every COMPARED figure present in both result trees, with its relative
+    change in percent; `better` says whether the change is an improvement.
+    """
+    changes = []
+    for key, value in current.items():
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f'{path}.{key}' if path else key
+        if isinstance(value, dict):
+            changes.extend(compare(previous or {}, value, name))
+        elif key in COMPARED and isinstance(previous, (int, float)) and isinstance(value, (int, float)):
+            change = round((value - previous) / previous * 100, 1) if previous else None
+            changes.append({
+                'figure': name,
+                'baseline': previous,
+                'current': value,
+                'change_pct': change,
+                'better': value != previous and (value > previous) == COMPARED[key],
+            })
+    return changes
@@ -0,0 +1,50 @@
+"""
+Seller dashboard latency from the daily rollup versus aggregating orders.
+
+Compares the busiest and the quietest benchmark seller: the rollup path
+should cost the same for both, while the direct aggregate grows with the
+seller's order history.
+"""
+from django.db.models import Count, Sum
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import api_client, ensure_orders
+from ..analytics import COUNTED_STATUSES, rebuild_sales
+from ..models import Order, UserProfile
+
+
+@scenario('seller_analytics')
+def seller_analytics(options):
+    ensure_orders(options['rows'] or 1000000, stdout=options['stdout'])
+    rebuild_sales()
+
+    by_volume = list(
+        Order.objects.filter(gas_inventory__seller__username__startswith='bench-')
+        .values('gas_inventory__seller_id')
+        .annotate(orders=Count('pk'))
+        .order_by('orders')
+        .values_list('gas_inventory__seller_id', 'orders')
+    )
+    url = reverse('v1-seller-analytics')
+    results = {}
+    for label, (seller_id, orders) in [('quietest', by_volume[0]), ('busiest', by_volume[-1])]:
+        seller = UserProfile.objects.select_related('user').get(user_id=seller_id).user
+        client = api_client(seller)
+
+        def rollup():
+            assert client.get(url).status_code == 200
+
+        def direct():
+            list(
+                Order.objects.filter(gas_inventory__seller_id=seller_id, status__in=COUNTED_STATUSES)
+                .values('gas_inventory__brand', 'gas_inventory__weight_kg')
+                .annotate(units=Sum('quantity'), revenue=Sum('total_price'), orders=Count('pk'))
+            )
+
+        results[label] = {
+            'orders': orders,
+            'rollup_endpoint': summarize(measure(rollup, options['iterations'])),
+            'direct_aggregate': summarize(measure(direct, options['iterations'])),
+        }
+    return results
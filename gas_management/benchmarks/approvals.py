@@ -0,0 +1,56 @@
+"""
+Latency of one bulk-approve request for a batch of pending orders.
+
+Each iteration places a fresh batch (untimed) spread over a handful of
+inventory rows and times the single POST that approves all of it.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.urls import reverse
+
+from . import scenario, summarize
+from .fixtures import api_client, bench_user, ensure_users, random_location
+from ..models import GasInventory, Order
+
+INVENTORY_ROWS = 20
+
+
+@scenario('bulk_approve')
+def bulk_approve(options):
+    batch = options['rows'] or 500
+    iterations = min(options['iterations'], 50)
+    rng = random.Random(7)
+
+    seller_id = ensure_users('SELLER', 1)[0]
+    buyer_id = ensure_users('BUYER', 1)[0]
+    client = api_client(bench_user('ADMIN'))
+    url = reverse('order-bulk-approve')
+
+    samples = []
+    for _ in range(iterations):
+        # Ids are read back rather than taken from bulk_create(), which only
+        # sets them on backends that can return rows from a bulk insert
+        location = random_location(rng)
+        GasInventory.objects.bulk_create([
+            GasInventory(seller_id=seller_id, brand='MERU', weight_kg=Decimal('13.0'),
+                         quantity=batch, unit_price=Decimal('4500'), location=location)
+            for _ in range(INVENTORY_ROWS)
+        ])
+        inventory_ids = list(GasInventory.objects.filter(seller_id=seller_id, location=location)
+                             .order_by('-pk').values_list('pk', flat=True)[:INVENTORY_ROWS])
+        first_id = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Order.objects.bulk_create([
+            Order(gas_inventory_id=rng.choice(inventory_ids), buyer_id=buyer_id, quantity=1,
+                  total_price=Decimal('4500'), delivery_address='Bench', contact_phone='0700000000')
+            for _ in range(batch)
+        ])
+        ids = list(Order.objects.filter(pk__gt=first_id, buyer_id=buyer_id).values_list('pk', flat=True))
+
+        started = time.perf_counter()
+        response = client.post(url, {'ids': ids}, format='json')
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+
+    return {'batch_size': batch, 'request': summarize(samples)}
@@ -0,0 +1,83 @@
+"""
+Archiving settled orders, and reading the archive back.
+
+Seeds `--rows` delivered orders (20000 by default) with the invoices,
+payments and ratings build_history() gives them, spread over the year before
+ORDER_ARCHIVE_AFTER_DAYS, and times one archive_orders() run that moves them.
+Then times a buyer's page of archived orders over the whole archive against
+the same page bounded to one month, which PostgreSQL serves from a single
+partition.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from . import measure, scenario, summarize
+from .fixtures import api_client, build_history, bulk_insert, ensure_users, explicit_timestamps
+from ..archive import archive_after_days, archive_orders
+from ..models import ArchivedOrder, GasInventory, Invoice, Order, Payment, Rating
+
+BUYERS = 20
+SEED_BATCH_SIZE = 5000
+
+
+def seed_settled_orders(rows, seed=42):
+    """ `rows` delivered orders from BUYERS benchmark buyers, all old enough to archive. """
+    rng = random.Random(seed)
+    buyer_ids = ensure_users('BUYER', BUYERS)
+    inventory = GasInventory.objects.create(
+        seller_id=ensure_users('SELLER', 1)[0], brand='MERU', weight_kg=Decimal('13.0'), quantity=1,
+        unit_price=Decimal('4500'), location='Bench'
+    )
+    oldest = timezone.now() - timedelta(days=archive_after_days() + 365)
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        orders = []
+        for _ in range(min(SEED_BATCH_SIZE, rows - start)):
+            created_at = oldest + timedelta(seconds=rng.randint(0, 364 * 24 * 60 * 60))
+            orders.append(Order(
+                gas_inventory=inventory, buyer_id=rng.choice(buyer_ids), quantity=1, total_price=Decimal('4500'),
+                status='DELIVERED', delivery_address='Bench', contact_phone='0700000000',
+                created_at=created_at, updated_at=created_at + timedelta(days=1),
+            ))
+        with transaction.atomic(), explicit_timestamps(Order, Invoice, Payment, Rating):
+            bulk_insert(Order, orders)
+            history = [build_history(rng, order, timezone.now()) for order in orders]
+            Invoice.objects.bulk_create([invoice for invoice, _, _ in history])
+            Payment.objects.bulk_create([payment for _, payment, _ in history if payment is not None])
+            Rating.objects.bulk_create([rating for _, _, rating in history if rating is not None])
+    return buyer_ids, oldest
+
+
+@scenario('order_archive')
+def order_archive(options):
+    rows = options['rows'] or 20000
+    buyer_ids, oldest = seed_settled_orders(rows)
+
+    started = time.perf_counter()
+    archived = archive_orders()
+    elapsed = time.perf_counter() - started
+
+    client = api_client(ArchivedOrder.objects.filter(buyer_id=buyer_ids[0]).latest('created_at').buyer)
+    url = reverse('archived-order-list')
+    month = (oldest + timedelta(days=180)).date()
+    one_month = {'page_size': 50, 'date_from': month.isoformat(), 'date_to': (month + timedelta(days=30)).isoformat()}
+
+    def page(params):
+        def get():
+            assert client.get(url, params).status_code == 200
+        return get
+
+    return {
+        'archive': {
+            'orders': archived,
+            'seconds': round(elapsed, 2),
+            'orders_per_sec': round(archived / elapsed, 1) if elapsed else 0.0,
+        },
+        'history_page': summarize(measure(page({'page_size': 50}), options['iterations'])),
+        'history_page_one_month': summarize(measure(page(one_month), options['iterations'])),
+    }
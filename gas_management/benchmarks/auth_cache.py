@@ -0,0 +1,60 @@
+"""
+JWT authentication with and without the in-process user cache.
+
+Times CachedJWTAuthentication.authenticate() on its own, then a small
+authenticated read (the seller dashboard, served from its rollup, with a
+real bearer token) end to end, with AUTH_USER_CACHE_TIMEOUT at 0 (the user
+loaded on every request, as with simplejwt's JWTAuthentication) and at its
+configured value.
+Identity queries are those against auth_user or gas_management_userprofile.
+"""
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import measure, scenario, summarize
+from .fixtures import api_client, bench_user
+from ..authentication import CachedJWTAuthentication, GasTokenObtainPairSerializer, user_cache
+
+IDENTITY_TABLES = ('"auth_user"', 'gas_management_userprofile')
+
+
+def identity_queries(func):
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return sum(1 for query in queries.captured_queries if any(table in query['sql'] for table in IDENTITY_TABLES))
+
+
+@scenario('auth_cache')
+def auth_cache(options):
+    user = bench_user('SELLER')
+    token = str(GasTokenObtainPairSerializer.get_token(user).access_token)
+    assert AccessToken(token)['role'] == 'SELLER'
+    header = f'Bearer {token}'
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=header)
+    authentication = CachedJWTAuthentication()
+    client = api_client(user)
+    client.force_authenticate(user=None)
+    client.credentials(HTTP_AUTHORIZATION=header)
+    url = reverse('v1-seller-analytics')
+
+    def authenticate():
+        authentication.authenticate(request)
+
+    def read():
+        assert client.get(url).status_code == 200
+
+    results = {}
+    for label, timeout in (('uncached', 0), ('cached', getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60) or 60)):
+        with override_settings(AUTH_USER_CACHE_TIMEOUT=timeout):
+            user_cache.clear()
+            read()
+            results[label] = {
+                'authenticate': summarize(measure(authenticate, options['iterations'])),
+                'request': summarize(measure(read, options['iterations'])),
+                'identity_queries_per_request': identity_queries(read),
+            }
+    return results
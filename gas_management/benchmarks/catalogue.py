@@ -0,0 +1,77 @@
+"""
+Catalogue latency with and without the indexes from migrations 0002 and 0006.
+
+The "before" pass drops the catalogue indexes inside a transaction that is
+rolled back afterwards, so both passes run against the same data and the
+schema is left untouched. The catalogue cache is off for both passes so
+every request reaches the database.
+"""
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import api_client, bench_user, ensure_inventory
+
+CATALOGUE_INDEXES = [
+    'gasinv_instock_recent_idx',
+    'gasinv_instock_price_idx',
+    'gasinv_instock_weight_idx',
+    'gasinv_seller_recent_idx',
+    'gasinv_brand_upper_idx',
+    'gasinv_location_trgm_idx',
+    'gasinv_instock_rating_idx',
+    'gasinv_instock_ratingcnt_idx',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+def catalogue_queries(seller_id):
+    return {
+        'newest': {},
+        'brand': {'brand': 'meru'},
+        'location': {'location': 'kisumu market'},
+        'price_range': {'min_price': 2000, 'max_price': 2500, 'ordering': 'unit_price'},
+        'seller': {'seller': seller_id},
+        'by_weight': {'ordering': 'weight_kg'},
+        'top_rated': {'ordering': '-seller_rating'},
+    }
+
+
+def run_queries(client, queries, iterations):
+    url = reverse('v1-gas-list')
+    results = {}
+    for name, params in queries.items():
+        def fetch():
+            response = client.get(url, params)
+            assert response.status_code == 200, response.status_code
+        results[name] = summarize(measure(fetch, iterations))
+    return results
+
+
+@scenario('catalogue')
+def catalogue(options):
+    stdout = options['stdout']
+    seller_ids = ensure_inventory(options['rows'] or 1000000, stdout=stdout)
+
+    client = api_client(bench_user('BUYER'))
+    queries = catalogue_queries(seller_ids[len(seller_ids) // 2])
+
+    before = {}
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+        if connection.vendor == 'postgresql':
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        for name in CATALOGUE_INDEXES:
+                            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+                    before = run_queries(client, queries, options['iterations'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        after = run_queries(client, queries, options['iterations'])
+    return {'without_indexes': before, 'with_indexes': after}
@@ -0,0 +1,28 @@
+"""
+Catalogue throughput with the read-through cache off and warm.
+
+Both passes run the catalogue scenario's query mix against the same seeded
+data; the cached pass warms each key in the untimed warmup calls.
+"""
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from . import scenario
+from .catalogue import catalogue_queries, run_queries
+from .fixtures import api_client, bench_user, ensure_inventory
+from ..catalogue_cache import stats
+
+
+@scenario('catalogue_cache')
+def catalogue_cache(options):
+    seller_ids = ensure_inventory(options['rows'] or 100000, stdout=options['stdout'])
+    client = api_client(bench_user('BUYER'))
+    queries = catalogue_queries(seller_ids[len(seller_ids) // 2])
+
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+        uncached = run_queries(client, queries, options['iterations'])
+
+    cache.clear()
+    stats.reset()
+    cached = run_queries(client, queries, options['iterations'])
+    return {'uncached': uncached, 'cached': cached, 'counters': stats.snapshot()}
@@ -0,0 +1,51 @@
+"""
+Full GETs against revalidations that come back 304.
+
+For a catalogue page (with the catalogue cache off, and warm) and a buyer's
+orders, times a plain GET against the same GET sent with the ETag of the
+previous response as If-None-Match, and records the bytes each sends.
+"""
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import BENCH_PREFIX, api_client, ensure_orders
+from ..models import Order
+
+
+def compare_requests(client, url, params, iterations):
+    full = client.get(url, params)
+    assert full.status_code == 200, (url, full.status_code)
+    etag = full['ETag']
+
+    def get():
+        assert client.get(url, params).status_code == 200
+
+    def revalidate():
+        assert client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    results = {
+        'full': summarize(measure(get, iterations)),
+        'not_modified': summarize(measure(revalidate, iterations)),
+        'full_bytes': len(full.content),
+        'not_modified_bytes': len(client.get(url, params, HTTP_IF_NONE_MATCH=etag).content),
+    }
+    results['speedup'] = round(results['full']['p50_ms'] / results['not_modified']['p50_ms'], 1)
+    return results
+
+
+@scenario('conditional_get')
+def conditional_get(options):
+    ensure_orders(options['rows'] or 20000, stdout=options['stdout'])
+    # A benchmark buyer who has placed orders
+    buyer = Order.objects.select_related('buyer').filter(buyer__username__startswith=BENCH_PREFIX).latest('pk').buyer
+    buyer_client = api_client(buyer)
+    catalogue = reverse('v1-gas-list')
+    iterations = options['iterations']
+
+    results = {}
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+        results['catalogue'] = compare_requests(buyer_client, catalogue, {'page_size': 50}, iterations)
+    results['catalogue_cached'] = compare_requests(buyer_client, catalogue, {'page_size': 50}, iterations)
+    results['my_orders'] = compare_requests(buyer_client, reverse('order-my-orders'), {'page_size': 50}, iterations)
+    return results
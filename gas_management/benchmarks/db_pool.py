@@ -0,0 +1,79 @@
+"""
+Catalogue throughput with and without the database connection pool.
+
+Worker threads each send `GET /v1/gas/` in a loop and end every request the
+way Django's handler does with CONN_MAX_AGE at 0, through
+close_old_connections(). With the stock PostgreSQL backend that means a new
+connection per request; with `gas_management.postgresql_pool` the connection
+goes back to the pool. The catalogue cache is off so every request reaches
+the database. Against a remote server, TLS and authentication make each new
+connection dearer than against a local one.
+"""
+import threading
+import time
+
+from django.db import close_old_connections, connections
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import scenario, summarize
+from .fixtures import api_client, bench_user, ensure_inventory
+from ..connection_pool import close_pools, pool_stats
+
+ENGINES = {
+    'direct': 'django.db.backends.postgresql',
+    'pooled': 'gas_management.postgresql_pool',
+}
+# Threads per worker process, as with gunicorn's gthread worker
+THREADS = 4
+
+
+def run_threads(user, requests):
+    url = reverse('v1-gas-list')
+    samples = [[] for _ in range(THREADS)]
+    barrier = threading.Barrier(THREADS + 1)
+
+    def work(durations):
+        client = api_client(user)
+        barrier.wait()
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(url, {'page_size': 20})
+            close_old_connections()
+            durations.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+        connections.close_all()
+
+    threads = [threading.Thread(target=work, args=(durations,)) for durations in samples]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize([duration for durations in samples for duration in durations], elapsed)
+
+
+@scenario('db_pool')
+def db_pool(options):
+    ensure_inventory(options['rows'] or 100000, stdout=options['stdout'])
+    user = bench_user('BUYER')
+    requests = max(1, options['iterations'] // THREADS)
+    database = connections.databases['default']
+    configured = database['ENGINE']
+
+    results = {'threads': THREADS}
+    try:
+        with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+            for name, engine in ENGINES.items():
+                # Threads build their own connection wrappers from this dict
+                database['ENGINE'] = engine
+                close_pools()
+                results[name] = run_threads(user, requests)
+                if name == 'pooled':
+                    results['pool_stats'] = pool_stats()
+    finally:
+        database['ENGINE'] = configured
+        close_pools()
+    return results
@@ -0,0 +1,95 @@
+"""
+Latency, throughput and query counts of the key API endpoints.
+
+Each endpoint is driven in-process through DRF's APIClient as a typical
+benchmark buyer or seller, with the catalogue cache off so every request
+reaches the database. Queries are counted per request with the same
+execute wrapper the metrics middleware uses, so `queries_max` above
+`queries_min` on a list endpoint points at an N+1. Seed production-sized
+data with `python manage.py seed_data` first; otherwise `--rows` orders
+(100000 by default) are seeded.
+"""
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import BENCH_PREFIX, TOWN_COORDINATES, api_client, bench_user, ensure_order_history
+from ..metrics import QueryTimer
+from ..models import GasInventory, Order
+
+# name -> (role, method, URL name, query parameters or body)
+ENDPOINTS = {
+    'catalogue': ('BUYER', 'get', 'v1-gas-list', {'page_size': 20}),
+    'catalogue_filtered': ('BUYER', 'get', 'v1-gas-list',
+                           {'brand': 'TOTAL', 'max_price': 5000, 'ordering': 'unit_price'}),
+    'catalogue_search': ('BUYER', 'get', 'v1-gas-list', {'search': 'Nakuru'}),
+    'catalogue_near': ('BUYER', 'get', 'v1-gas-list',
+                       {'near': '{},{}'.format(*TOWN_COORDINATES['Nairobi']), 'radius_km': 10}),
+    'buyer_orders': ('BUYER', 'get', 'order-my-orders', {}),
+    'order_detail': ('BUYER', 'get', 'order-detail', {}),
+    'seller_orders': ('SELLER', 'get', 'v1-seller-orders', {}),
+    'seller_analytics': ('SELLER', 'get', 'v1-seller-analytics', {}),
+    'invoices': ('BUYER', 'get', 'invoice-list', {}),
+    'payments': ('BUYER', 'get', 'payment-list', {}),
+    'ratings': ('SELLER', 'get', 'rating-list', {}),
+    'place_order': ('BUYER', 'post', 'v1-orders', {}),
+}
+
+
+def requests_for(users):
+    """ (name, client, method, url, data) for every endpoint, filling in ids from the buyer's own orders. """
+    buyer = users['BUYER']
+    order = Order.objects.filter(buyer=buyer).order_by('-pk').first()
+    in_stock = GasInventory.objects.filter(seller__username__startswith=BENCH_PREFIX, quantity__gt=0).first()
+    clients = {role: api_client(user) for role, user in users.items()}
+
+    for name, (role, method, url_name, data) in ENDPOINTS.items():
+        if name == 'order_detail':
+            url = reverse(url_name, args=[order.pk])
+        else:
+            url = reverse(url_name)
+        if name == 'place_order':
+            data = {
+                'gas_inventory': in_stock.pk, 'quantity': 1,
+                'delivery_address': 'Benchmark Estate', 'contact_phone': '0700000000',
+            }
+        yield name, clients[role], method, url, data
+
+
+def run_endpoint(client, method, url, data, iterations):
+    timer = QueryTimer()
+    counts = []
+    send = getattr(client, method)
+
+    def request():
+        before = timer.queries
+        response = send(url, data, format='json') if method == 'post' else send(url, data)
+        assert response.status_code < 300, (url, response.status_code)
+        counts.append(timer.queries - before)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        samples = measure(request, iterations)
+    counts = counts[-iterations:]
+    return {
+        **summarize(samples),
+        'queries_min': min(counts),
+        'queries_max': max(counts),
+        'queries_mean': round(sum(counts) / len(counts), 2),
+    }
+
+
+@scenario('endpoints')
+def endpoints(options):
+    ensure_order_history(options['rows'] or 100000, stdout=options['stdout'])
+    users = {'BUYER': bench_user('BUYER'), 'SELLER': bench_user('SELLER')}
+
+    results = {}
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+        for name, client, method, url, data in requests_for(users):
+            results[name] = run_endpoint(client, method, url, data, options['iterations'])
+    return results
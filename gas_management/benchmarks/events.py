@@ -0,0 +1,90 @@
+"""
+Cost of idle order event streams and how fast one event fans out to them.
+
+Opens `--rows` streams (5000 by default) for one benchmark buyer against the
+stream's ASGI app on a single event loop, as one ASGI worker would hold
+them. `bytes_per_stream` is the Python heap each open stream holds, traced
+with tracemalloc, including the small stand-in for the server's side. Each iteration then dispatches one event from another
+thread, as a committing request would, and times until every stream has
+written it.
+"""
+import asyncio
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import scenario, summarize
+from .fixtures import bench_user
+from ..events import broker
+from ..streams import ORDER_EVENTS_PATH, order_events
+
+
+class StreamClient:
+    """ The ASGI server side of one stream: counts events written and disconnects on demand. """
+
+    def __init__(self, scope, arrived):
+        self.scope = scope
+        self.arrived = arrived
+        self.requested = False
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b''}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message.get('body', b'').startswith(b'event:'):
+            self.arrived()
+
+
+async def run_streams(user_id, token, count, iterations):
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': ORDER_EVENTS_PATH, 'query_string': b'',
+        'headers': [(b'authorization', f'Bearer {token}'.encode())],
+    }
+    loop = asyncio.get_running_loop()
+    state = {'arrived': 0, 'done': asyncio.Event()}
+
+    def arrived():
+        state['arrived'] += 1
+        if state['arrived'] == count:
+            state['done'].set()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    clients = [StreamClient(scope, arrived) for _ in range(count)]
+    tasks = [asyncio.ensure_future(order_events(scope, client.receive, client.send)) for client in clients]
+    while broker.connections() < count:
+        await asyncio.sleep(0.01)
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    samples = []
+    for index in range(iterations):
+        state['arrived'] = 0
+        state['done'].clear()
+        started = time.perf_counter()
+        await loop.run_in_executor(None, broker.dispatch, [user_id], {'order': index, 'status': 'APPROVED'})
+        await state['done'].wait()
+        samples.append(time.perf_counter() - started)
+
+    for client in clients:
+        client.disconnected.set()
+    await asyncio.gather(*tasks)
+    return {
+        'streams': count,
+        'bytes_per_stream': round(held / count),
+        'fan_out': summarize(samples),
+    }
+
+
+@scenario('event_stream')
+def event_stream(options):
+    user = bench_user('BUYER')
+    token = str(AccessToken.for_user(user))
+    return async_to_sync(run_streams)(user.pk, token, options['rows'] or 5000, options['iterations'])
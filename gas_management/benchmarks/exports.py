@@ -0,0 +1,52 @@
+"""
+Order export: time to first row, throughput and memory growth.
+
+The response is consumed chunk by chunk the way a WSGI server would, and
+peak RSS is sampled before and after so a constant-memory stream shows up
+as a flat delta however many rows are exported.
+"""
+import resource
+import time
+
+from django.urls import reverse
+
+from . import scenario
+from .fixtures import api_client, bench_user, ensure_orders
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@scenario('export')
+def export(options):
+    ensure_orders(options['rows'] or 1000000, stdout=options['stdout'])
+    client = api_client(bench_user('ADMIN'))
+
+    results = {}
+    for export_format in ('csv', 'ndjson'):
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        response = client.get(reverse('order-export'), {'export_format': export_format})
+        assert response.status_code == 200, response.status_code
+
+        first_row = None
+        rows = size = 0
+        for chunk in response.streaming_content:
+            rows += 1
+            size += len(chunk)
+            # The CSV header is sent before the query runs, so time the first data row
+            if first_row is None and rows == (2 if export_format == 'csv' else 1):
+                first_row = time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+
+        results[export_format] = {
+            'rows': rows - (1 if export_format == 'csv' else 0),
+            'megabytes': round(size / 1024 / 1024, 1),
+            'first_row_ms': round(first_row * 1000, 1),
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(rows / elapsed),
+            'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+        }
+    return results
@@ -0,0 +1,337 @@
+"""
+Bulk data builders shared by the benchmark scenarios.
+
+Everything created here belongs to users whose username starts with
+`BENCH_PREFIX`, so seeded rows can be told apart from (and removed without
+touching) real data.
+"""
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Max
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..geo import encode
+from ..models import UserProfile, GasInventory, Order, Invoice, Payment, Rating
+
+BENCH_PREFIX = 'bench-'
+BATCH_SIZE = 10000
+
+# Town centres; seeded depots are scattered around them
+TOWN_COORDINATES = {
+    'Nairobi': (-1.2864, 36.8172), 'Mombasa': (-4.0435, 39.6682), 'Kisumu': (-0.0917, 34.7680),
+    'Nakuru': (-0.3031, 36.0800), 'Eldoret': (0.5143, 35.2698), 'Thika': (-1.0333, 37.0693),
+    'Malindi': (-3.2192, 40.1169), 'Kitale': (1.0157, 35.0062), 'Garissa': (-0.4532, 39.6461),
+    'Kakamega': (0.2827, 34.7519), 'Nyeri': (-0.4201, 36.9476), 'Machakos': (-1.5177, 37.2634),
+    'Meru': (0.0463, 37.6559), 'Embu': (-0.5389, 37.4596), 'Naivasha': (-0.7172, 36.4310),
+    'Kericho': (-0.3689, 35.2863),
+}
+TOWNS = list(TOWN_COORDINATES)
+# Standard deviation of a depot's offset from its town centre, in degrees (about 11 km)
+TOWN_SPREAD = 0.1
+DISTRICTS = ['CBD', 'Industrial Area', 'Westlands', 'Market', 'Bus Park', 'Estate', 'Junction', 'Stage']
+ORDER_STATUSES = ['PENDING', 'APPROVED', 'DELIVERED', 'DELIVERED', 'DELIVERED', 'REJECTED', 'CANCELLED']
+# Orders older than a few days have all been settled one way or another
+SETTLED_STATUSES = ['DELIVERED'] * 8 + ['REJECTED', 'CANCELLED']
+UNSETTLED_DAYS = 3
+PAYMENT_METHODS = ['M-Pesa', 'M-Pesa', 'M-Pesa', 'Card', 'Cash']
+# Share of buyers who place half of all orders
+REGULAR_BUYERS = 0.2
+RATING_SHARE = 0.6
+RATING_WEIGHTS = [3, 4, 10, 35, 48]
+COMMENTS = ['', '', 'Fast delivery', 'Good service', 'Cylinder was dented', 'Delivered late', 'Will order again']
+WEIGHTS = [Decimal('3.0'), Decimal('6.0'), Decimal('13.0'), Decimal('22.5'), Decimal('50.0')]
+
+
+def bench_user(role, index=0):
+    """ Return (creating if needed) a benchmark user with the given role. """
+    username = f'{BENCH_PREFIX}{role.lower()}-{index}'
+    user, created = User.objects.get_or_create(username=username)
+    if created:
+        UserProfile.objects.create(user=user, role=role)
+    return user
+
+
+def api_client(user):
+    """ An in-process API client authenticated as `user` and addressed to an allowed host. """
+    host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+    client = APIClient(SERVER_NAME=host)
+    client.force_authenticate(user=user)
+    return client
+
+
+def ensure_users(role, count):
+    """ Make sure `count` benchmark users with `role` exist and return their ids. """
+    prefix = f'{BENCH_PREFIX}{role.lower()}-'
+    existing = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    missing = [User(username=f'{prefix}{i}') for i in range(count) if f'{prefix}{i}' not in existing]
+    for start in range(0, len(missing), BATCH_SIZE):
+        User.objects.bulk_create(missing[start:start + BATCH_SIZE])
+    if missing:
+        # Stale statistics can plan the anti-join below as a nested loop
+        # over every new user, which takes minutes at 50k users
+        analyze(User._meta.db_table)
+        analyze(UserProfile._meta.db_table)
+
+    users = User.objects.filter(username__startswith=prefix, profile__isnull=True)
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id, role=role) for user_id in users.values_list('id', flat=True)],
+        batch_size=BATCH_SIZE,
+    )
+    return list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True)[:count])
+
+
+def random_location(rng, town=None):
+    return f'{town or rng.choice(TOWNS)} {rng.choice(DISTRICTS)} Depot {rng.randint(1, 400)}'
+
+
+def random_point(rng, town):
+    """ Coordinates and geohash of a random depot around `town`. """
+    town_lat, town_lon = TOWN_COORDINATES[town]
+    latitude = round(town_lat + rng.gauss(0, TOWN_SPREAD), 6)
+    longitude = round(town_lon + rng.gauss(0, TOWN_SPREAD), 6)
+    return {'latitude': latitude, 'longitude': longitude, 'geohash': encode(latitude, longitude)}
+
+
+def build_inventory(rng, seller_ids):
+    town = rng.choice(TOWNS)
+    return GasInventory(
+        seller_id=rng.choice(seller_ids),
+        brand=rng.choice(GasInventory.GAS_BRAND_CHOICES)[0],
+        weight_kg=rng.choice(WEIGHTS),
+        # Roughly one row in ten is sold out, as in production
+        quantity=0 if rng.random() < 0.1 else rng.randint(1, 200),
+        unit_price=Decimal(rng.randint(800, 12000)),
+        location=random_location(rng, town),
+        **random_point(rng, town),
+    )
+
+
+def ensure_inventory(rows, sellers=1000, seed=42, stdout=None):
+    """
+    Top the benchmark inventory up to `rows` rows, adding to `sellers`
+    sellers. Rows of every benchmark seller count, so a scenario run after
+    seed_data with more sellers does not seed the volume a second time.
+    """
+    seller_ids = ensure_users('SELLER', sellers)
+    existing = GasInventory.objects.filter(seller__username__startswith=BENCH_PREFIX).count()
+    rng = random.Random(seed + existing)
+    for start in range(existing, rows, BATCH_SIZE):
+        size = min(BATCH_SIZE, rows - start)
+        GasInventory.objects.bulk_create([build_inventory(rng, seller_ids) for _ in range(size)])
+        if stdout is not None:
+            stdout.write(f'  seeded {start + size}/{rows} inventory rows')
+    analyze('gas_management_gasinventory')
+    return seller_ids
+
+
+def ensure_coordinates(seed=42, stdout=None):
+    """
+    Place benchmark inventory seeded before rows carried coordinates
+    around the town named in its location.
+    """
+    rng = random.Random(seed)
+    unplaced = GasInventory.objects.filter(seller__username__startswith=BENCH_PREFIX, latitude__isnull=True)
+    total = unplaced.count()
+    done = 0
+    while True:
+        batch = list(unplaced.order_by('pk').only('pk', 'location')[:BATCH_SIZE])
+        if not batch:
+            break
+        for inventory in batch:
+            town = inventory.location.split(' ', 1)[0]
+            for name, value in random_point(rng, town if town in TOWN_COORDINATES else TOWNS[0]).items():
+                setattr(inventory, name, value)
+        GasInventory.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'], batch_size=1000)
+        done += len(batch)
+        if stdout is not None:
+            stdout.write(f'  placed {done}/{total} inventory rows')
+    if total:
+        analyze('gas_management_gasinventory')
+
+
+def ensure_orders(rows, buyers=5000, seed=42, stdout=None):
+    """
+    Top the benchmark orders up to `rows`, placed by `buyers` buyers against
+    benchmark inventory. Orders of every benchmark buyer count, as in
+    ensure_inventory().
+    """
+    buyer_ids = ensure_users('BUYER', buyers)
+    inventory = list(
+        GasInventory.objects.filter(seller__username__startswith=BENCH_PREFIX)
+        .order_by('pk').values_list('pk', 'unit_price')[:20000]
+    )
+    if not inventory:
+        ensure_inventory(20000, stdout=stdout)
+        return ensure_orders(rows, buyers, seed, stdout)
+
+    existing = Order.objects.filter(buyer__username__startswith=BENCH_PREFIX).count()
+    rng = random.Random(seed + existing)
+    for start in range(existing, rows, BATCH_SIZE):
+        size = min(BATCH_SIZE, rows - start)
+        batch = []
+        for _ in range(size):
+            inventory_id, unit_price = rng.choice(inventory)
+            quantity = rng.randint(1, 4)
+            batch.append(Order(
+                gas_inventory_id=inventory_id,
+                buyer_id=rng.choice(buyer_ids),
+                quantity=quantity,
+                total_price=unit_price * quantity,
+                status=rng.choice(ORDER_STATUSES),
+                delivery_address=random_location(rng),
+                contact_phone=f'07{rng.randint(0, 99999999):08d}',
+            ))
+        Order.objects.bulk_create(batch)
+        if stdout is not None:
+            stdout.write(f'  seeded {start + size}/{rows} orders')
+    analyze('gas_management_order')
+    return buyer_ids
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create() keep the auto_now/auto_now_add timestamps it is given,
+    so seeded history can be spread over past days.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if isinstance(field, DateTimeField) and (field.auto_now or field.auto_now_add)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def bulk_insert(model, objects):
+    """ bulk_create() `objects`, reading their ids back where the backend cannot return them. """
+    last_id = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects)
+    if objects and objects[0].pk is None:
+        ids = model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)
+        for obj, pk in zip(objects, ids):
+            obj.pk = pk
+    return objects
+
+
+def seeded_invoice_number(order_id):
+    # Longer than generate_invoice_number()'s, so the two can never collide
+    return f'INV-S{order_id:010d}'
+
+
+def build_history(rng, order, now):
+    """ The invoice, payment and rating an order of this status and age would have. """
+    invoice = payment = rating = None
+    if order.status in ('APPROVED', 'DELIVERED'):
+        approved_at = min(now, order.created_at + timedelta(minutes=rng.randint(5, 600)))
+        paid = order.status == 'DELIVERED' or rng.random() < 0.5
+        paid_at = min(now, approved_at + timedelta(minutes=rng.randint(10, 2880)))
+        invoice = Invoice(
+            order=order,
+            invoice_number=seeded_invoice_number(order.pk),
+            is_paid=paid,
+            payment_date=paid_at if paid else None,
+            admin_approval=paid,
+            admin_approval_date=paid_at if paid else None,
+            created_at=approved_at,
+        )
+        if paid:
+            payment = Payment(
+                invoice=invoice,
+                amount=order.total_price,
+                status='COMPLETED',
+                transaction_id=f'BENCH{order.pk:012d}',
+                payment_method=rng.choice(PAYMENT_METHODS),
+                created_at=paid_at,
+                updated_at=paid_at,
+            )
+    if order.status == 'DELIVERED' and rng.random() < RATING_SHARE:
+        rating = Rating(
+            order=order,
+            rating=rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+            comment=rng.choice(COMMENTS),
+            created_at=min(now, order.updated_at + timedelta(hours=rng.randint(1, 120))),
+        )
+    return invoice, payment, rating
+
+
+def ensure_order_history(rows, buyers=50000, days=365, seed=42, stdout=None):
+    """
+    Top the benchmark buyers' orders up to `rows`, placed over the last
+    `days` days against all benchmark inventory, each with the invoice,
+    payment and rating its status implies. A fifth of the buyers place half
+    the orders. Each batch commits whole, so an interrupted run resumes cleanly.
+    """
+    buyer_ids = ensure_users('BUYER', buyers)
+    regulars = buyer_ids[:max(1, int(len(buyer_ids) * REGULAR_BUYERS))]
+    # Arrays of ids and prices in cents keep a million rows to a few megabytes
+    inventory_ids, prices = array('q'), array('q')
+    for pk, unit_price in (
+        GasInventory.objects.filter(seller__username__startswith=BENCH_PREFIX)
+        .order_by('pk').values_list('pk', 'unit_price').iterator(chunk_size=BATCH_SIZE)
+    ):
+        inventory_ids.append(pk)
+        prices.append(int(unit_price * 100))
+    if not inventory_ids:
+        ensure_inventory(20000, stdout=stdout)
+        return ensure_order_history(rows, buyers, days, seed, stdout)
+
+    existing = Order.objects.filter(buyer__username__startswith=BENCH_PREFIX).count()
+    rng = random.Random(seed + existing)
+    now = timezone.now()
+    for start in range(existing, rows, BATCH_SIZE):
+        size = min(BATCH_SIZE, rows - start)
+        orders = []
+        for _ in range(size):
+            index = rng.randrange(len(inventory_ids))
+            quantity = rng.randint(1, 4)
+            created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            age_days = (now - created_at).days
+            orders.append(Order(
+                gas_inventory_id=inventory_ids[index],
+                buyer_id=rng.choice(regulars if rng.random() < 0.5 else buyer_ids),
+                quantity=quantity,
+                total_price=Decimal(prices[index] * quantity).scaleb(-2),
+                status=rng.choice(ORDER_STATUSES if age_days < UNSETTLED_DAYS else SETTLED_STATUSES),
+                delivery_address=random_location(rng),
+                contact_phone=f'07{rng.randint(0, 99999999):08d}',
+                created_at=created_at,
+                updated_at=min(now, created_at + timedelta(hours=rng.randint(1, 72))),
+            ))
+        orders.sort(key=lambda order: order.created_at)
+
+        with transaction.atomic(), explicit_timestamps(Order, Invoice, Payment, Rating):
+            bulk_insert(Order, orders)
+            history = [build_history(rng, order, now) for order in orders]
+            bulk_insert(Invoice, [invoice for invoice, _, _ in history if invoice])
+            payments = [payment for _, payment, _ in history if payment]
+            for payment in payments:
+                # The invoice had no id yet when the payment was built
+                payment.invoice_id = payment.invoice.pk
+            Payment.objects.bulk_create(payments)
+            Rating.objects.bulk_create([rating for _, _, rating in history if rating])
+        if stdout is not None:
+            stdout.write(f'  seeded {start + size}/{rows} orders with invoices, payments and ratings')
+    for table in ('order', 'invoice', 'payment', 'rating'):
+        analyze(f'gas_management_{table}')
+    return buyer_ids
+
+
+def analyze(table):
+    """ Refresh planner statistics after a bulk load so plans reflect the new volume. """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {table}')
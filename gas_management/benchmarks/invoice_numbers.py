@@ -0,0 +1,35 @@
+"""
+Cost of numbering one invoice: a value from the process's reserved block
+against a nextval() round trip per invoice, with the queries per 1,000
+numbers each makes.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from . import measure, scenario, summarize
+from ..invoice_numbers import SEQUENCE, BlockAllocator, format_invoice_number
+
+
+def round_trip_number():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SEQUENCE])
+        return format_invoice_number(cursor.fetchone()[0])
+
+
+@scenario('invoice_numbers')
+def invoice_numbers(options):
+    allocator = BlockAllocator()
+
+    def block_number():
+        return format_invoice_number(allocator.take(1)[0])
+
+    results = {}
+    for label, number in (('round_trip', round_trip_number), ('reserved_block', block_number)):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(1000):
+                number()
+        results[label] = {
+            **summarize(measure(number, options['iterations'])),
+            'queries_per_1000': len(queries),
+        }
+    return results
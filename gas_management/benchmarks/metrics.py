@@ -0,0 +1,51 @@
+"""
+Per-request cost of the metrics middleware.
+
+Times the same cheap request (a cached catalogue page, so the database is
+not the bottleneck) with MetricsMiddleware installed and removed, and the
+rendering of /metrics. The two variants alternate over several rounds so
+drift in the machine's load affects both alike.
+"""
+from django.conf import settings
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import api_client, bench_user, ensure_inventory
+from ..metrics import render
+
+MIDDLEWARE = 'gas_management.metrics.MetricsMiddleware'
+ROUNDS = 5
+
+
+def time_requests(user, iterations):
+    # A fresh client loads the middleware chain from the current settings
+    client = api_client(user)
+    url = reverse('v1-gas-list')
+
+    def fetch():
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    return measure(fetch, iterations, warmup=20)
+
+
+@scenario('metrics')
+def metrics(options):
+    ensure_inventory(options['rows'] or 10000, stdout=options['stdout'])
+    user = bench_user('BUYER')
+    iterations = max(1, options['iterations'] // ROUNDS)
+
+    without, with_metrics = [], []
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=300):
+        for _ in range(ROUNDS):
+            with override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE if name != MIDDLEWARE]):
+                without += time_requests(user, iterations)
+            with_metrics += time_requests(user, iterations)
+    without, with_metrics = summarize(without), summarize(with_metrics)
+    return {
+        'without_middleware': without,
+        'with_middleware': with_metrics,
+        'overhead_p50_ms': round(with_metrics['p50_ms'] - without['p50_ms'], 3),
+        'render': summarize(measure(render, options['iterations'])),
+    }
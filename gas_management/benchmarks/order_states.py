@@ -0,0 +1,70 @@
+"""
+One order status change: locked read plus save() versus the compare-and-swap.
+
+Each iteration rejects a fresh pending order (loaded untimed, as a view's
+get_object() would) either the way the order actions used to, re-reading the
+status under SELECT ... FOR UPDATE and saving every column, or with
+order_states.transition(), which also appends the change to the history.
+"""
+import time
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from . import scenario, summarize
+from .fixtures import ensure_users
+from ..models import GasInventory, Order
+from ..order_states import transition
+
+
+def locked_save(order):
+    with transaction.atomic():
+        order.status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+        assert order.status == 'PENDING'
+        order.status = 'REJECTED'
+        order.save()
+
+
+def compare_and_swap(order):
+    with transaction.atomic():
+        transition(order, 'REJECTED')
+
+
+def run(change, orders):
+    samples = []
+    for order in orders:
+        started = time.perf_counter()
+        change(order)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+@scenario('order_transitions')
+def order_transitions(options):
+    iterations = options['iterations']
+    seller_id = ensure_users('SELLER', 1)[0]
+    buyer_id = ensure_users('BUYER', 1)[0]
+    inventory = GasInventory.objects.create(
+        seller_id=seller_id, brand='MERU', weight_kg=Decimal('13.0'), quantity=1,
+        unit_price=Decimal('4500'), location='Bench'
+    )
+    first_id = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    Order.objects.bulk_create([
+        Order(gas_inventory=inventory, buyer_id=buyer_id, quantity=1, total_price=Decimal('4500'),
+              delivery_address='Bench', contact_phone='0700000000')
+        for _ in range(2 * iterations + 2)
+    ])
+    orders = list(Order.objects.filter(pk__gt=first_id, gas_inventory=inventory).order_by('pk'))
+
+    results = {}
+    for label, change in (('locked_save', locked_save), ('compare_and_swap', compare_and_swap)):
+        batch, orders = orders[:iterations + 1], orders[iterations + 1:]
+        with CaptureQueriesContext(connection) as queries:
+            change(batch[0])
+        results[label] = {
+            **summarize(run(change, batch[1:])),
+            # SAVEPOINT and RELEASE statements are not counted
+            'queries': sum(1 for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']),
+        }
+    return results
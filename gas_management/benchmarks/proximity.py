@@ -0,0 +1,75 @@
+"""
+Proximity search latency through the geohash index versus a bounding-box scan.
+
+The endpoint pass times `GET /v1/gas/?near=...&radius_km=...` end to end
+with the catalogue cache off. The scan pass ranks the same circle from a
+plain latitude/longitude box filter, which no index serves, to show what
+the geohash ranges save. `rows_in_cells` is how many in-stock rows the
+full-radius geohash ranges hold; the widening search reads far fewer
+wherever stock is dense.
+"""
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import TOWN_COORDINATES, api_client, bench_user, ensure_coordinates, ensure_inventory
+from ..geo import KM_PER_DEGREE, cell_ranges, distance_expression, search_bands
+from ..models import GasInventory
+
+# (label, point, radius_km)
+PROXIMITY_QUERIES = [
+    ('nairobi_2km', TOWN_COORDINATES['Nairobi'], 2),
+    ('nairobi_10km', TOWN_COORDINATES['Nairobi'], 10),
+    ('nakuru_5km', TOWN_COORDINATES['Nakuru'], 5),
+    ('between_towns_25km', (-2.5, 38.5), 25),
+]
+
+
+def rows_in_cells(lat, lon, radius_km):
+    """ Rows the geohash ranges hand to the distance ranking for one query. """
+    total = 0
+    band = radius_km / KM_PER_DEGREE
+    in_stock = GasInventory.objects.filter(quantity__gt=0, latitude__gte=lat - band, latitude__lte=lat + band)
+    for low, high in cell_ranges(lat, lon, radius_km):
+        total += in_stock.filter(geohash__gte=low, geohash__lt=high).count()
+    return total
+
+
+def box_scan(lat, lon, radius_km, limit):
+    lat_band, lon_band = search_bands(lat, radius_km)
+    return list(
+        GasInventory.objects.filter(
+            quantity__gt=0,
+            latitude__range=(lat - lat_band, lat + lat_band),
+            longitude__range=(lon - lon_band, lon + lon_band),
+        )
+        .annotate(distance_km=distance_expression(lat, lon))
+        .filter(distance_km__lte=radius_km)
+        .order_by('distance_km', 'pk')
+        .values_list('pk', 'distance_km')[:limit]
+    )
+
+
+@scenario('nearby')
+def nearby(options):
+    stdout = options['stdout']
+    ensure_inventory(options['rows'] or 1000000, stdout=stdout)
+    ensure_coordinates(stdout=stdout)
+
+    client = api_client(bench_user('BUYER'))
+    url = reverse('v1-gas-list')
+    results = {}
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+        for label, (lat, lon), radius_km in PROXIMITY_QUERIES:
+            params = {'near': f'{lat},{lon}', 'radius_km': radius_km}
+
+            def fetch():
+                response = client.get(url, params)
+                assert response.status_code == 200, response.status_code
+
+            results[label] = {
+                'rows_in_cells': rows_in_cells(lat, lon, radius_km),
+                'geohash_endpoint': summarize(measure(fetch, options['iterations'])),
+                'box_scan': summarize(measure(lambda: box_scan(lat, lon, radius_km, 50), options['iterations'])),
+            }
+    return results
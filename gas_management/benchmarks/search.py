@@ -0,0 +1,52 @@
+"""
+Catalogue `search` latency with ranked full-text search versus `icontains`.
+
+Both passes send the same queries to `GET /v1/gas/?search=...` with the
+catalogue cache off; the second turns CATALOGUE_FULL_TEXT_SEARCH off, which
+is the unranked ILIKE search every backend falls back to. Each query also
+reports how many rows its first page held, since the ILIKE search finds
+nothing for a misspelt term.
+"""
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import measure, scenario, summarize
+from .fixtures import api_client, bench_user, ensure_inventory
+
+SEARCH_QUERIES = {
+    'town': {'search': 'nairobi'},
+    'town_newest_first': {'search': 'nairobi', 'ordering': '-date_added'},
+    'town_and_district': {'search': 'nairobi westlands'},
+    'prefix': {'search': 'nair'},
+    'typo': {'search': 'nairboi'},
+    'rare': {'search': 'kisumu junction depot 377'},
+    'brand_or_town': {'search': 'meru'},
+}
+
+
+def run_search(client, iterations):
+    url = reverse('v1-gas-list')
+    results = {}
+    for name, params in SEARCH_QUERIES.items():
+        def fetch():
+            response = client.get(url, params)
+            assert response.status_code == 200, response.status_code
+            return response
+
+        results[name] = {
+            'first_page_rows': len(fetch().data['results']),
+            **summarize(measure(fetch, iterations)),
+        }
+    return results
+
+
+@scenario('search')
+def search(options):
+    ensure_inventory(options['rows'] or 1000000, stdout=options['stdout'])
+    client = api_client(bench_user('BUYER'))
+
+    with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+        full_text = run_search(client, options['iterations'])
+        with override_settings(CATALOGUE_FULL_TEXT_SEARCH=False):
+            icontains = run_search(client, options['iterations'])
+    return {'full_text': full_text, 'icontains': icontains}
@@ -0,0 +1,79 @@
+"""
+Cost of turning 1,000 rows into JSON, serializer versus projection.
+
+For the catalogue (GasInventorySerializer) and seller orders
+(OrderSerializer), times DRF's path (model instances through the
+serializer, rendered by JSONRenderer) against the projected one (values()
+rows through a Projection, rendered by ProjectedJSONRenderer), with the rows
+already fetched and then again including the query. Both must produce the
+same bytes, which is checked before anything is timed.
+"""
+from types import SimpleNamespace
+
+from rest_framework.renderers import JSONRenderer
+
+from . import measure, scenario, summarize
+from .fixtures import BENCH_PREFIX, ensure_orders
+from ..models import GasInventory, Order
+from ..projections import projection_for
+from ..renderers import ProjectedJSONRenderer
+from ..serializers import GasInventorySerializer, OrderSerializer
+
+ROWS = 1000
+
+
+def paths(serializer_class, queryset):
+    projection = projection_for(serializer_class)
+    stock, fast = JSONRenderer(), ProjectedJSONRenderer()
+
+    def serializer(instances):
+        return stock.render(serializer_class(instances, many=True).data)
+
+    def projection_path(rows):
+        items, plain = projection.serialize(rows)
+        return fast.render(items, renderer_context={'response': SimpleNamespace(projected=plain)})
+
+    def fetch_instances():
+        return list(queryset)
+
+    def fetch_rows():
+        return list(projection.queryset(queryset, ('-pk',)))
+
+    return serializer, projection_path, fetch_instances, fetch_rows
+
+
+def compare_paths(serializer_class, queryset, iterations):
+    serializer, projection_path, fetch_instances, fetch_rows = paths(serializer_class, queryset)
+    instances, rows = fetch_instances(), fetch_rows()
+    assert serializer(instances) == projection_path(rows), 'projected output differs from the serializer'
+
+    results = {
+        'serializer': summarize(measure(lambda: serializer(instances), iterations)),
+        'projection': summarize(measure(lambda: projection_path(rows), iterations)),
+        'serializer_with_query': summarize(measure(lambda: serializer(fetch_instances()), iterations)),
+        'projection_with_query': summarize(measure(lambda: projection_path(fetch_rows()), iterations)),
+    }
+    results['speedup'] = round(results['serializer']['p50_ms'] / results['projection']['p50_ms'], 1)
+    results['speedup_with_query'] = round(
+        results['serializer_with_query']['p50_ms'] / results['projection_with_query']['p50_ms'], 1
+    )
+    return results
+
+
+@scenario('serialization')
+def serialization(options):
+    ensure_orders(options['rows'] or 20000, stdout=options['stdout'])
+    iterations = max(1, options['iterations'] // 4)
+    inventory = (
+        GasInventory.objects.select_related('seller')
+        .filter(seller__username__startswith=BENCH_PREFIX).order_by('-pk')[:ROWS]
+    )
+    orders = (
+        Order.objects.select_related('buyer', 'gas_inventory__seller')
+        .filter(buyer__username__startswith=BENCH_PREFIX).order_by('-pk')[:ROWS]
+    )
+    return {
+        'rows': ROWS,
+        'catalogue': compare_paths(GasInventorySerializer, inventory, iterations),
+        'orders': compare_paths(OrderSerializer, orders, iterations),
+    }
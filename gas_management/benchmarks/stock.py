@@ -0,0 +1,80 @@
+"""
+Approval throughput when every approval takes stock from one inventory row.
+
+THREADS worker threads approve `--rows` pending orders (1000 by default) of
+one unit each against an inventory row holding a quarter of them, so most
+approvals find the row locked by another and a late majority find it empty
+and get 409. The run checks that exactly the stocked number were approved.
+"""
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.db import connections
+from django.urls import reverse
+
+from . import scenario, summarize
+from .fixtures import api_client, bench_user, ensure_users
+from ..models import GasInventory, Order
+
+THREADS = 10
+
+
+@scenario('stock_contention')
+def stock_contention(options):
+    orders = options['rows'] or 1000
+    stock = max(1, orders // 4)
+    buyer_id = ensure_users('BUYER', 1)[0]
+    inventory = GasInventory.objects.create(
+        seller_id=ensure_users('SELLER', 1)[0], brand='MERU', weight_kg=Decimal('13.0'), quantity=stock,
+        unit_price=Decimal('4500'), location='Bench'
+    )
+    Order.objects.bulk_create([
+        Order(gas_inventory=inventory, buyer_id=buyer_id, quantity=1, total_price=Decimal('4500'),
+              delivery_address='Bench', contact_phone='0700000000')
+        for _ in range(orders)
+    ])
+    order_ids = list(Order.objects.filter(gas_inventory=inventory).values_list('pk', flat=True))
+    admin = bench_user('ADMIN')
+
+    samples = [[] for _ in range(THREADS)]
+    statuses = [[] for _ in range(THREADS)]
+    barrier = threading.Barrier(THREADS + 1)
+
+    def work(index):
+        client = api_client(admin)
+        barrier.wait()
+        for order_id in order_ids[index::THREADS]:
+            started = time.perf_counter()
+            response = client.post(reverse('order-approve', args=[order_id]))
+            samples[index].append(time.perf_counter() - started)
+            statuses[index].append(response.status_code)
+        connections.close_all()
+
+    # Each 409 would otherwise log a "Conflict" warning
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        threads = [threading.Thread(target=work, args=(index,)) for index in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        request_logger.setLevel(level)
+
+    outcomes = [code for codes in statuses for code in codes]
+    inventory.refresh_from_db()
+    assert inventory.quantity == 0 and outcomes.count(200) == stock, (inventory.quantity, outcomes.count(200))
+    return {
+        'threads': THREADS,
+        'stock': stock,
+        'approved': outcomes.count(200),
+        'conflicts': outcomes.count(409),
+        'approve': summarize([duration for durations in samples for duration in durations], elapsed),
+    }
@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'gas_management:catalogue:version'
+# Seconds a cached catalogue page lives; 0 turns the cache off
+DEFAULT_TIMEOUT = 300
+
+# Query parameters that change what the catalogue returns. Anything else is
+# left out of the key so junk parameters cannot fan out the cache.
+KEY_PARAMS = (
+    'brand', 'weight', 'location', 'min_price', 'max_price', 'seller',
+    'search', 'ordering', 'cursor', 'page_size', 'near', 'radius_km',
+)
+# Matched case-insensitively by the catalogue filters
+CASE_INSENSITIVE_PARAMS = ('brand', 'location')
+
+
+class CacheStats:
+    """ Per-process hit and miss counters for the catalogue cache. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = CacheStats()
+
+
+def cache_timeout():
+    return getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _initial_version():
+    # Seeded from the clock rather than 1, so that if the version key is ever
+    # evicted the new series cannot collide with pages cached under the old one
+    return int(time.time() * 1000)
+
+
+def catalogue_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """ Orphan every cached catalogue page at once by moving to a new key version. """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, _initial_version(), None)
+
+
+def invalidate_catalogue():
+    """
+    Bump the catalogue version once the current transaction commits.
+
+    Bumping earlier would let a concurrent reader re-cache the
+    not-yet-committed old rows under the new version.
+    """
+    transaction.on_commit(bump_catalogue_version)
+
+
+def catalogue_filters(query_params):
+    """
+    The catalogue parameters in `query_params`, normalised: stripped,
+    lowercased where matched case-insensitively, and `weight` as a float
+    string. Blank and unparseable values are left out. The catalogue filters
+    and the cache key both read these, so requests sharing a key always
+    select the same rows.
+    """
+    params = {}
+    for name in KEY_PARAMS:
+        value = query_params.get(name)
+        if value is None:
+            continue
+        value = value.strip()
+        if not value:
+            continue
+        if name in CASE_INSENSITIVE_PARAMS:
+            value = value.lower()
+        elif name == 'weight':
+            # The weight filter accepts "6", "6.0" and "6kg" alike
+            try:
+                value = str(float(value.lower().replace('kg', '').strip()))
+            except ValueError:
+                continue
+        params[name] = value
+    return params
+
+
+def catalogue_key(request):
+    """ Cache key for a catalogue request: its path plus the normalised, sorted filter set. """
+    params = sorted(catalogue_filters(request.query_params).items())
+    raw = f'{request.get_host()}{request.path}?{urlencode(params)}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'gas_management:catalogue:{catalogue_version()}:{digest}'
@@ -0,0 +1,73 @@
+"""
+Conditional GET for inventory and order resources.
+
+A response's validators are taken from the rows it is built from: the
+primary key and change timestamps of each (`GasInventory.last_updated`,
+`Order.updated_at` and the `last_updated` of the inventory an order shows).
+Every write path moves those timestamps, queryset updates included, so
+while they stand still the output does too and a client that already holds
+it gets a 304 before anything is serialized.
+
+A list's ETag covers the page actually returned: the rows in order, their
+timestamps and whether a next or previous page exists, which is what its
+links are built from. An aggregate over the whole filtered set (latest
+timestamp plus row count) would cost a scan of every matching row on each
+request; the page is already fetched.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _value(row, path):
+    if isinstance(row, dict):
+        return row[path]
+    for attr in path.split('__'):
+        row = getattr(row, attr)
+    return row
+
+
+def rows_version(rows, fields, *extra):
+    """
+    A digest of the id and the timestamp `fields` (values() paths, walked
+    attribute by attribute on model instances) of each of `rows`, in order,
+    plus anything in `extra` the output depends on.
+    """
+    digest = hashlib.md5(repr(extra).encode())
+    for row in rows:
+        digest.update(repr([_value(row, field) for field in ('id',) + tuple(fields)]).encode())
+    return digest.hexdigest()
+
+
+def last_modified(rows, fields):
+    """ The latest of `fields` across `rows`, or None if there are none. """
+    stamps = [_value(row, field) for row in rows for field in fields]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    return max(stamps) if stamps else None
+
+
+def entity_tag(request, version):
+    """ The ETag of `version` as rendered for `request`, which differs by negotiated media type. """
+    media_type = getattr(request, 'accepted_media_type', '')
+    return quote_etag(hashlib.md5(f'{version}:{media_type}'.encode()).hexdigest())
+
+
+def not_modified(request, etag, modified=None):
+    """
+    The 304 (or 412) `request`'s If-None-Match / If-Modified-Since headers
+    call for against these validators, or None when the full response is due.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(modified.timestamp()) if modified else None
+    )
+    if response is not None:
+        set_validators(response, etag, modified)
+    return response
+
+
+def set_validators(response, etag, modified=None):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified.timestamp())
+    return response
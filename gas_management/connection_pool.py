@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_MIN_SIZE = 2
+DEFAULT_MAX_SIZE = 10
+# Seconds a connection is used before it is replaced, so server-side memory
+# and any stale state are shed regularly
+DEFAULT_MAX_AGE = 1800
+# Seconds an idle connection above MIN_SIZE is kept before it is closed
+DEFAULT_MAX_IDLE = 300
+# Seconds a checkout waits for a free connection before failing
+DEFAULT_TIMEOUT = 10
+# A connection idle this many seconds is pinged before it is handed out
+DEFAULT_CHECK_AFTER = 30
+
+
+class PoolTimeout(Exception):
+    """ Raised when no connection became free within the pool's timeout. """
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of database connections for one process.
+
+    `connect()` opens a new DB-API connection. `is_idle(conn)` is a cheap
+    local test that a returned connection is open and outside any
+    transaction, and `ping(conn)` a round trip proving it still works; the
+    ping is only spent on connections that sat idle for CHECK_AFTER seconds.
+    Idle connections are handed out newest first, so a quiet pool shrinks
+    back to MIN_SIZE as the rest pass MAX_IDLE.
+    """
+
+    def __init__(self, connect, is_idle, ping, options=None, label='default'):
+        options = options or {}
+        self.label = label
+        self.min_size = options.get('MIN_SIZE', DEFAULT_MIN_SIZE)
+        self.max_size = max(1, options.get('MAX_SIZE', DEFAULT_MAX_SIZE), self.min_size)
+        self.max_age = options.get('MAX_AGE', DEFAULT_MAX_AGE)
+        self.max_idle = options.get('MAX_IDLE', DEFAULT_MAX_IDLE)
+        self.timeout = options.get('TIMEOUT', DEFAULT_TIMEOUT)
+        self.check_after = options.get('CHECK_AFTER', DEFAULT_CHECK_AFTER)
+        self.pid = os.getpid()
+        self.closed = False
+
+        self._connect = connect
+        self._is_idle = is_idle
+        self._ping = ping
+        self._cond = threading.Condition()
+        # (connection, idle since), oldest on the left
+        self._idle = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._counters = dict.fromkeys(
+            ('checkouts', 'opened', 'closed', 'recycled', 'failed_checks', 'waits', 'timeouts'), 0
+        )
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def prefill(self):
+        """ Open connections up to MIN_SIZE; failures are left for checkouts to report. """
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                self._forget(None)
+                return
+            self._put(conn)
+
+    def acquire(self):
+        """ Check out a healthy connection, opening one if the pool is not full. """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                conn, idle_since = self._take_or_reserve(deadline)
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._forget(None)
+                    raise
+            elif not self._usable(conn, idle_since):
+                continue
+            with self._cond:
+                self._counters['checkouts'] += 1
+            return conn
+
+    def release(self, conn):
+        """ Return a checked-out connection, closing it if it is broken or too old. """
+        if self._expired(conn):
+            self._forget(conn, 'recycled')
+        elif not self._is_idle(conn):
+            self._forget(conn, 'failed_checks')
+        elif self.closed:
+            self._forget(conn)
+        else:
+            self._put(conn)
+
+    def discard(self, conn):
+        """ Close a checked-out connection instead of returning it. """
+        self._forget(conn)
+
+    def close(self):
+        """ Close every idle connection; checked-out ones close when released. """
+        with self._cond:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._forget(conn)
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._counters['checkouts']
+            return {
+                'size': self._size,
+                'in_use': self._size - len(self._idle),
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self._counters,
+                'wait_ms_total': round(self._wait_total * 1000, 3),
+                'wait_ms_max': round(self._wait_max * 1000, 3),
+                'wait_ms_mean': round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+            }
+
+    def _take_or_reserve(self, deadline):
+        # Called holding the lock. Returns (idle connection, idle since), or
+        # (None, None) with a slot reserved for a new connection; waits
+        # while the pool is full.
+        started, waited = time.monotonic(), False
+        while not self._idle and self._size >= self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._counters['timeouts'] += 1
+                self._record_wait(time.monotonic() - started)
+                raise PoolTimeout(
+                    f'No database connection became free within {self.timeout}s '
+                    f'({self.max_size} in use).'
+                )
+            waited = True
+            self._cond.wait(remaining)
+        if waited:
+            self._counters['waits'] += 1
+            self._record_wait(time.monotonic() - started)
+        if self._idle:
+            return self._idle.pop()
+        self._size += 1
+        return None, None
+
+    def _record_wait(self, seconds):
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+
+    def _usable(self, conn, idle_since):
+        if self._expired(conn):
+            self._forget(conn, 'recycled')
+            return False
+        if not self._is_idle(conn):
+            self._forget(conn, 'failed_checks')
+            return False
+        if time.monotonic() - idle_since >= self.check_after:
+            try:
+                self._ping(conn)
+            except Exception:
+                self._forget(conn, 'failed_checks')
+                return False
+        return True
+
+    def _expired(self, conn):
+        opened_at = self._opened_at.get(id(conn))
+        return opened_at is None or time.monotonic() - opened_at >= self.max_age
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._opened_at[id(conn)] = time.monotonic()
+            self._counters['opened'] += 1
+        return conn
+
+    def _put(self, conn):
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            self._idle.append((conn, now))
+            # Shrink towards MIN_SIZE from the longest idle end
+            while len(self._idle) > 1 and self._size - len(stale) > self.min_size:
+                oldest, idle_since = self._idle[0]
+                if now - idle_since < self.max_idle:
+                    break
+                self._idle.popleft()
+                stale.append(oldest)
+            self._cond.notify()
+        for oldest in stale:
+            self._forget(oldest)
+
+    def _forget(self, conn, reason=None):
+        # Close a connection the pool no longer tracks (None for a reserved
+        # slot that failed to open) and free its slot for a waiting thread
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self._cond:
+            if conn is not None:
+                self._opened_at.pop(id(conn), None)
+                self._counters['closed'] += 1
+            if reason is not None:
+                self._counters[reason] += 1
+            self._size -= 1
+            self._cond.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools inherited across fork. Their sockets are shared with the parent, so
+# they are kept referenced and never closed from the child.
+_inherited = []
+
+
+def get_pool(key, create):
+    """ This process's pool for `key`, made with `create()` and prefilled on first use. """
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid == os.getpid():
+            return pool
+        if pool is not None:
+            _inherited.append(pool)
+        pool = _pools[key] = create()
+    pool.prefill()
+    return pool
+
+
+def close_pools():
+    """ Close and forget every pool in this process, e.g. before dropping a database. """
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """ Statistics for each of this process's pools, by pool label. """
+    return {pool.label: pool.stats() for pool in list(_pools.values()) if pool.pid == os.getpid()}
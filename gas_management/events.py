@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUS_EVENT = 'order_status'
+DEFAULT_BACKEND = 'gas_management.events.LocalBackend'
+# Events a stream may fall behind by before it is closed
+DEFAULT_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    One stream's pending events, owned by the event loop serving it.
+
+    Lighter than an asyncio.Queue and a task per wait: an idle stream holds
+    one future and one timer.
+    """
+    __slots__ = ('user_id', 'loop', 'maxsize', 'events', 'waiter', 'overflowed', 'closed')
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.maxsize = maxsize
+        self.events = []
+        self.waiter = None
+        self.overflowed = False
+        self.closed = False
+
+    def deliver(self, event):
+        # Runs on self.loop. A stream this far behind is closed rather than
+        # buffered without bound; its client reconnects and re-reads my_orders.
+        if self.overflowed or self.closed:
+            return
+        if len(self.events) >= self.maxsize:
+            self.overflowed = True
+        else:
+            self.events.append(event)
+        self.wake()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next_events(self, timeout):
+        """ Wait up to `timeout` seconds for events and return those pending, possibly none. """
+        if not self.events and not self.closed:
+            self.waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, self.wake)
+            try:
+                await self.waiter
+            finally:
+                timer.cancel()
+                self.waiter = None
+        events, self.events = self.events, []
+        return events
+
+
+def _deliver(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+class OrderEventBroker:
+    """
+    Routes order events to the streams open in this process, by user id.
+
+    Streams subscribe from the event loop serving them; dispatch() may be
+    called from any thread and hands each event to the owning loop, so an
+    idle stream holds no thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def subscribe(self, user_id, maxsize=DEFAULT_QUEUE_SIZE):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._streams.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self._streams.get(subscription.user_id)
+            if streams is not None:
+                streams.discard(subscription)
+                if not streams:
+                    del self._streams[subscription.user_id]
+
+    def connections(self):
+        with self._lock:
+            return sum(len(streams) for streams in self._streams.values())
+
+    def dispatch(self, user_ids, event):
+        # One wakeup per event loop however many of its streams receive the event
+        targets = {}
+        with self._lock:
+            for user_id in set(user_ids):
+                for subscription in self._streams.get(user_id, ()):
+                    targets.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in targets.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, subscriptions, event)
+            except RuntimeError:
+                # The loop closed under streams that had not unsubscribed yet
+                pass
+
+
+class LocalBackend:
+    """
+    Delivers events to the streams held by the publishing process once its
+    transaction commits. Enough for a single ASGI process serving both the
+    API and the stream.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, messages):
+        """ Send a list of (user_ids, event) pairs if the current transaction commits. """
+        def deliver():
+            for user_ids, event in messages:
+                self.broker.dispatch(user_ids, event)
+
+        transaction.on_commit(deliver)
+
+    def listen(self):
+        """ Called before a stream subscribes; backends that receive from elsewhere start here. """
+
+
+class PostgresNotifyBackend(LocalBackend):
+    """
+    Fans events out to every process through PostgreSQL NOTIFY, so a
+    transition made by any web or worker process reaches streams held by
+    any ASGI worker. NOTIFY is transactional: listeners only hear it if the
+    publishing transaction commits. Each process with open streams holds
+    one extra connection, LISTENing from a daemon thread.
+    """
+    channel = 'gas_management_order_events'
+    # NOTIFY payloads must stay under 8000 bytes
+    max_payload = 7500
+    reconnect_delay = 5
+
+    def __init__(self, broker):
+        super().__init__(broker)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def payloads(self, messages):
+        payloads, batch, size = [], [], 2
+        for user_ids, event in messages:
+            item = json.dumps([list(user_ids), event], cls=DjangoJSONEncoder)
+            if batch and size + len(item) + 1 > self.max_payload:
+                payloads.append(f"[{','.join(batch)}]")
+                batch, size = [], 2
+            batch.append(item)
+            size += len(item) + 1
+        if batch:
+            payloads.append(f"[{','.join(batch)}]")
+        return payloads
+
+    def publish(self, messages):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                [self.channel, self.payloads(messages)],
+            )
+
+    def listen(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='order-events-listener', daemon=True)
+                self._thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.listen_once()
+            except Exception:
+                logger.exception('Order event listener lost its connection; reconnecting')
+            time.sleep(self.reconnect_delay)
+
+    def listen_once(self):
+        import psycopg2
+
+        database = connections['default']
+        listener = psycopg2.connect(**database.get_connection_params())
+        try:
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            while True:
+                if select.select([listener], [], [], self.reconnect_delay) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    for user_ids, event in json.loads(listener.notifies.pop(0).payload):
+                        self.broker.dispatch(user_ids, event)
+        finally:
+            listener.close()
+
+
+broker = OrderEventBroker()
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    """ The ORDER_EVENTS_BACKEND instance for this process, feeding the shared broker. """
+    path = getattr(settings, 'ORDER_EVENTS_BACKEND', DEFAULT_BACKEND)
+    backend = _backends.get(path)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.setdefault(path, import_string(path)(broker))
+    return backend
+
+
+def status_event(order_id, status, previous_status):
+    return {
+        'order': order_id,
+        'status': status,
+        'previous_status': previous_status,
+        'at': timezone.now().isoformat(),
+    }
+
+
+def publish_order_status(order, previous_status):
+    """
+    Tell an order's buyer and seller that it moved from `previous_status`
+    to its current status. Call inside the transaction making the change;
+    nothing is delivered unless it commits.
+    """
+    recipients = (order.buyer_id, order.gas_inventory.seller_id)
+    get_backend().publish([(recipients, status_event(order.pk, order.status, previous_status))])
+
+
+def publish_status_changes(order_ids, status, previous_status):
+    """ publish_order_status() for a batch of orders that made the same transition, in one query. """
+    if not order_ids:
+        return
+    rows = Order.objects.filter(pk__in=order_ids).values_list('pk', 'buyer_id', 'gas_inventory__seller_id')
+    get_backend().publish([
+        ((buyer_id, seller_id), status_event(order_id, status, previous_status))
+        for order_id, buyer_id, seller_id in rows
+    ])
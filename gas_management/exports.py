@@ -0,0 +1,173 @@
+import csv
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Flat projections exported in place of the nested serializers: (column, ORM path)
+ORDER_COLUMNS = [
+    ('id', 'id'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('buyer_id', 'buyer_id'),
+    ('buyer_name', 'buyer__username'),
+    ('seller_id', 'gas_inventory__seller_id'),
+    ('seller_name', 'gas_inventory__seller__username'),
+    ('gas_inventory_id', 'gas_inventory_id'),
+    ('brand', 'gas_inventory__brand'),
+    ('weight_kg', 'gas_inventory__weight_kg'),
+    ('quantity', 'quantity'),
+    ('total_price', 'total_price'),
+    ('delivery_address', 'delivery_address'),
+    ('contact_phone', 'contact_phone'),
+]
+INVOICE_COLUMNS = [
+    ('id', 'id'),
+    ('invoice_number', 'invoice_number'),
+    ('created_at', 'created_at'),
+    ('order_id', 'order_id'),
+    ('order_status', 'order__status'),
+    ('buyer_name', 'order__buyer__username'),
+    ('seller_name', 'order__gas_inventory__seller__username'),
+    ('total_price', 'order__total_price'),
+    ('is_paid', 'is_paid'),
+    ('payment_date', 'payment_date'),
+    ('admin_approval', 'admin_approval'),
+    ('admin_approval_date', 'admin_approval_date'),
+]
+PAYMENT_COLUMNS = [
+    ('id', 'id'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('invoice_id', 'invoice_id'),
+    ('invoice_number', 'invoice__invoice_number'),
+    ('order_id', 'invoice__order_id'),
+    ('buyer_name', 'invoice__order__buyer__username'),
+    ('amount', 'amount'),
+    ('payment_method', 'payment_method'),
+    ('transaction_id', 'transaction_id'),
+]
+# Invoices have no status column; their export status is derived from is_paid
+INVOICE_STATUS_FILTERS = {
+    'PAID': {'is_paid': True},
+    'UNPAID': {'is_paid': False},
+}
+
+
+class ExportError(Exception):
+    """ Raised for export query parameters that cannot be applied. """
+
+
+class Echo:
+    """ A file-like object whose write() hands the line straight back, for csv.writer. """
+
+    def write(self, value):
+        return value
+
+
+def parse_bound(value):
+    """
+    Parse a date or datetime query parameter into (aware datetime, whole_day).
+    `whole_day` is True for a bare date, which a caller using it as an upper
+    bound should extend to the end of that day.
+    """
+    try:
+        parsed = parse_datetime(value)
+        whole_day = parsed is None
+        if whole_day:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+    except ValueError:
+        raise ExportError(f"'{value}' is not a valid date or datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, whole_day
+
+
+def filter_export(queryset, params, status_filters=None):
+    """
+    Apply the export filters: `date_from` and `date_to` bound created_at
+    (inclusive) and `status` matches the row status, or one of
+    `status_filters` when the model has no status column.
+    """
+    date_from = params.get('date_from')
+    if date_from:
+        queryset = queryset.filter(created_at__gte=parse_bound(date_from)[0])
+    date_to = params.get('date_to')
+    if date_to:
+        bound, whole_day = parse_bound(date_to)
+        if whole_day:
+            queryset = queryset.filter(created_at__lt=bound + datetime.timedelta(days=1))
+        else:
+            queryset = queryset.filter(created_at__lte=bound)
+
+    status = params.get('status')
+    if status:
+        status = status.upper()
+        if status_filters is None:
+            queryset = queryset.filter(status=status)
+        elif status in status_filters:
+            queryset = queryset.filter(**status_filters[status])
+        else:
+            raise ExportError(f"status must be one of {', '.join(status_filters)}.")
+    return queryset
+
+
+def _rows(queryset, fields):
+    # Outside a transaction Django declares the server-side cursor WITH HOLD,
+    # which PostgreSQL materialises in full when the declaring statement
+    # commits. Holding a transaction open while streaming keeps the cursor
+    # lazy, so rows are produced only as the client reads them.
+    with transaction.atomic():
+        yield from queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(
+            [value.isoformat() if isinstance(value, datetime.datetime) else value for value in row]
+        )
+
+
+def _ndjson_lines(header, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + '\n'
+
+
+def stream_export(queryset, columns, export_format, filename):
+    """
+    Stream `queryset` as CSV or NDJSON with constant memory.
+
+    Rows come from a flat values_list() projection read through
+    iterator(), which uses a server-side cursor on PostgreSQL, and are
+    encoded one at a time as the client consumes the response. Nothing is
+    queried until the response starts being sent.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"export_format must be one of {', '.join(EXPORT_FORMATS)}.")
+
+    header = [name for name, _ in columns]
+    rows = _rows(queryset.order_by('pk'), [path for _, path in columns])
+    lines = _csv_lines(header, rows) if export_format == 'csv' else _ndjson_lines(header, rows)
+
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    # Ask proxies such as nginx not to buffer, so the first bytes leave immediately
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,191 @@
+import math
+
+from django.db.models import ExpressionWrapper, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+# Bits of precision per axis. 26 + 26 interleaved bits fit comfortably in a
+# BIGINT and resolve positions to well under a metre.
+GEOHASH_BITS = 26
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 200
+# Upper bound on the geohash cells one proximity query reads
+MAX_CELLS = 32
+# Proximity search starts this wide and widens by SEARCH_GROWTH until it has a full page
+INITIAL_SEARCH_KM = 1.0
+SEARCH_GROWTH = 4
+
+
+class GeoQueryError(Exception):
+    """ Raised for proximity query parameters that cannot be applied. """
+
+
+def _spread(value):
+    # Move bit i of a 26-bit value to bit 2i (the usual Morton "magic bits")
+    value &= 0x3FFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    value = (value | (value << 1)) & 0x5555555555555555
+    return value
+
+
+def _interleave(lat_cell, lon_cell):
+    # Longitude takes the higher bit of each pair, as in a textual geohash
+    return (_spread(lon_cell) << 1) | _spread(lat_cell)
+
+
+def _grid(lat, lon):
+    """ Integer grid coordinates of a point at full precision. """
+    scale = 1 << GEOHASH_BITS
+    lat_cell = min(int((lat + 90.0) / 180.0 * scale), scale - 1)
+    lon_cell = min(int((lon + 180.0) / 360.0 * scale), scale - 1)
+    return lat_cell, lon_cell
+
+
+def encode(latitude, longitude):
+    """
+    Geohash of a point as an integer, or None without coordinates.
+
+    Interleaving the latitude and longitude bits makes every geohash cell a
+    contiguous integer range, so the cells around a point can be read with
+    a handful of range scans over an ordinary B-tree index.
+    """
+    if latitude is None or longitude is None:
+        return None
+    return _interleave(*_grid(float(latitude), float(longitude)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """ Great-circle distance between two points in kilometres. """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def search_bands(lat, radius_km):
+    """ Half-height and half-width in degrees of the box around a search circle. """
+    lat_band = radius_km / KM_PER_DEGREE
+    reach = min(89.9, abs(lat) + lat_band)
+    lon_band = min(180.0, radius_km / (KM_PER_DEGREE * math.cos(math.radians(reach))))
+    return lat_band, lon_band
+
+
+def _cell_spans(lat, lon, lat_band, lon_band, depth):
+    """
+    The inclusive cell index ranges a box covers on a grid with `depth`
+    interleaved bits, longitude taking the odd one out.
+    """
+    lat_size, lon_size = 1 << (depth // 2), 1 << ((depth + 1) // 2)
+    lat_low = max(0, int((lat - lat_band + 90.0) / 180.0 * lat_size))
+    lat_high = min(lat_size - 1, int((lat + lat_band + 90.0) / 180.0 * lat_size))
+    lon_low = math.floor((lon - lon_band + 180.0) / 360.0 * lon_size)
+    lon_high = math.floor((lon + lon_band + 180.0) / 360.0 * lon_size)
+    if lon_high - lon_low + 1 >= lon_size:
+        lon_low, lon_high = 0, lon_size - 1
+    return (lat_low, lat_high), (lon_low, lon_high), lat_size, lon_size
+
+
+def cell_ranges(lat, lon, radius_km, max_cells=MAX_CELLS):
+    """
+    Sorted, merged [low, high) geohash ranges covering a circle around a point.
+
+    Uses the finest grid on which the circle's bounding box touches at most
+    `max_cells` cells, so the scanned area stays close to the box itself.
+    """
+    lat_band, lon_band = search_bands(lat, radius_km)
+    depth = 2 * GEOHASH_BITS
+    while depth:
+        (lat_low, lat_high), (lon_low, lon_high), lat_size, lon_size = _cell_spans(
+            lat, lon, lat_band, lon_band, depth
+        )
+        if (lat_high - lat_low + 1) * (lon_high - lon_low + 1) <= max_cells:
+            break
+        depth -= 1
+    else:
+        return [(0, 1 << (2 * GEOHASH_BITS))]
+
+    lat_shift, lon_shift = GEOHASH_BITS - depth // 2, GEOHASH_BITS - (depth + 1) // 2
+    width = 1 << (2 * GEOHASH_BITS - depth)
+    corners = sorted(
+        _interleave(lat_cell << lat_shift, (lon_cell % lon_size) << lon_shift)
+        for lat_cell in range(lat_low, lat_high + 1)
+        for lon_cell in range(lon_low, lon_high + 1)
+    )
+    ranges = []
+    for low in corners:
+        if ranges and ranges[-1][1] == low:
+            ranges[-1][1] = low + width
+        else:
+            ranges.append([low, low + width])
+    return [tuple(bounds) for bounds in ranges]
+
+
+def parse_near(near, radius_km=None):
+    """ Parse the `near=lat,lon` and `radius_km` query parameters into (lat, lon, radius_km). """
+    try:
+        lat, lon = (float(part) for part in near.split(','))
+    except ValueError:
+        raise GeoQueryError('near must be "latitude,longitude".')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise GeoQueryError('near is outside the valid latitude and longitude range.')
+
+    if radius_km in (None, ''):
+        return lat, lon, DEFAULT_RADIUS_KM
+    try:
+        radius_km = float(radius_km)
+    except ValueError:
+        radius_km = -1
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise GeoQueryError(f'radius_km must be a number greater than 0 and at most {MAX_RADIUS_KM}.')
+    return lat, lon, radius_km
+
+
+def distance_expression(lat, lon):
+    """ Haversine distance in kilometres from a point to each row's coordinates, as an ORM expression. """
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    row_lat, row_lon = Radians('latitude'), Radians('longitude')
+    a = (
+        Power(Sin((row_lat - Value(lat_r)) / 2), 2)
+        + Value(math.cos(lat_r)) * Cos(row_lat) * Power(Sin((row_lon - Value(lon_r)) / 2), 2)
+    )
+    return ExpressionWrapper(
+        Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0)))), output_field=FloatField()
+    )
+
+
+def _ranked_within(queryset, lat, lon, radius_km, limit):
+    cells = Q()
+    for low, high in cell_ranges(lat, lon, radius_km):
+        cells |= Q(geohash__gte=low, geohash__lt=high)
+    band = radius_km / KM_PER_DEGREE
+    ranked = (
+        queryset.filter(cells, latitude__gte=lat - band, latitude__lte=lat + band)
+        .annotate(distance_km=distance_expression(lat, lon))
+        .order_by('distance_km', 'pk')[:limit]
+    )
+    # Rows in the covering cells but outside the circle sort after every row
+    # inside it, so trimming the short ranked list is enough
+    return [item for item in ranked if item.distance_km <= radius_km]
+
+
+def nearest(queryset, lat, lon, radius_km, limit):
+    """
+    The `limit` rows of `queryset` closest to a point and within
+    `radius_km`, nearest first, each annotated with `distance_km`.
+
+    Candidates come from range scans over the geohash index, and the
+    database ranks only those by haversine distance. The search starts at
+    a small radius and widens until it has `limit` rows or reaches
+    `radius_km`: once a circle holds `limit` rows nothing outside it can be
+    nearer, so in dense areas the wide circle's rows are never read.
+    """
+    search_km = min(radius_km, INITIAL_SEARCH_KM)
+    while True:
+        page = _ranked_within(queryset, lat, lon, search_km, limit)
+        if len(page) >= limit or search_km >= radius_km:
+            return page
+        search_km = min(radius_km, search_km * SEARCH_GROWTH)
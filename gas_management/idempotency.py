@@ -0,0 +1,152 @@
+"""
+Idempotency-Key support for writes clients retry.
+
+A client that may resend a POST (placing an order, marking an invoice paid)
+sends an `Idempotency-Key` header, unique per operation. The first request
+claims the key by inserting an IdempotencyKey row in the same transaction as
+its write, and stores its response there. A retry with the same key gets
+that response back, marked `Idempotent-Replayed: true`, without running the
+write again: from the cache, or failing that one lookup on the key's unique
+index.
+
+A duplicate sent while the first is still running blocks on that unique
+index until the first transaction ends, then replays its response, or
+claims the key itself if the first rolled back. Keys are honoured for
+IDEMPOTENCY_KEY_TTL seconds and removed in bulk by purge_idempotency_keys.
+"""
+import datetime
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Seconds a key is honoured before it may be purged and reused
+DEFAULT_TTL = 24 * 60 * 60
+PURGE_BATCH_SIZE = 5000
+# Responses from here up are not stored, so a retry runs the write again
+UNSTORED_STATUS = 500
+
+
+def key_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+
+
+def _cutoff():
+    return timezone.now() - datetime.timedelta(seconds=key_ttl())
+
+
+def _cache_key(user_id, key):
+    return f'gas_management:idempotency:{user_id}:{hashlib.md5(key.encode()).hexdigest()}'
+
+
+def request_fingerprint(request):
+    """ A digest of the method, path and body, so a key reused for a different request is caught. """
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def stored_response(user_id, key):
+    """ The (fingerprint, status code, data) stored under a live key, or None. """
+    stored = cache.get(_cache_key(user_id, key))
+    if stored is None:
+        stored = IdempotencyKey.objects.filter(
+            user_id=user_id, key=key, created_at__gte=_cutoff()
+        ).values_list('fingerprint', 'status_code', 'response').first()
+        if stored is not None:
+            stored = (stored[0], stored[1], json.loads(stored[2]))
+            cache.set(_cache_key(user_id, key), stored, key_ttl())
+    return stored
+
+
+def _replay(stored, fingerprint):
+    stored_fingerprint, status_code, data = stored
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {"detail": f"This {HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(data, status=status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def _claim(user_id, key, fingerprint):
+    """
+    Insert the key's row and return it, or return what a request that
+    claimed the key first stored, waiting for its transaction if need be.
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user_id=user_id, key=key, fingerprint=fingerprint)
+        except IntegrityError:
+            stored = stored_response(user_id, key)
+            if stored is not None:
+                return stored
+            # The row in the way has expired but not been purged yet
+            IdempotencyKey.objects.filter(user_id=user_id, key=key, created_at__lt=_cutoff()).delete()
+
+
+def idempotent(handler):
+    """ Let a write view method be retried safely with an Idempotency-Key header. """
+
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        if not key.strip() or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user_id = request.user.pk
+        fingerprint = request_fingerprint(request)
+        stored = stored_response(user_id, key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        with transaction.atomic():
+            record = _claim(user_id, key, fingerprint)
+            if not isinstance(record, IdempotencyKey):
+                return _replay(record, fingerprint)
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code >= UNSTORED_STATUS:
+                record.delete()
+                return response
+            # Stored as it renders, so first responses and replays are the same bytes
+            record.status_code, record.response = response.status_code, json.dumps(response.data, cls=JSONEncoder)
+            record.save(update_fields=['status_code', 'response'])
+            data = json.loads(record.response)
+            transaction.on_commit(lambda: cache.set(
+                _cache_key(user_id, key), (fingerprint, response.status_code, data), key_ttl()
+            ))
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(batch_size=PURGE_BATCH_SIZE):
+    """ Delete keys older than IDEMPOTENCY_KEY_TTL, `batch_size` per statement; returns the number deleted. """
+    cutoff = _cutoff()
+    purged = 0
+    while True:
+        batch = list(
+            IdempotencyKey.objects.filter(created_at__lt=cutoff)
+            .order_by('created_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
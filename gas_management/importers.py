@@ -0,0 +1,210 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .catalogue_cache import invalidate_catalogue
+from .geo import encode
+from .models import GasInventory
+from .ratings import seller_rating_fields
+
+IMPORT_FIELDS = ('brand', 'weight_kg', 'quantity', 'unit_price', 'location')
+# May be left out or blank; a row gives both or neither
+OPTIONAL_IMPORT_FIELDS = ('latitude', 'longitude')
+# Form fields carry the same choices, max_digits and min_value rules as the
+# model, independent of which database backend is in use
+IMPORT_FORM_FIELDS = {
+    name: GasInventory._meta.get_field(name).formfield() for name in IMPORT_FIELDS + OPTIONAL_IMPORT_FIELDS
+}
+CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines')
+
+
+class ImportFormatError(Exception):
+    """ Raised when an upload cannot be read as CSV or NDJSON at all. """
+
+
+def read_rows(stream, content_type):
+    """
+    Yield (line_number, row_dict) pairs from a byte stream without reading it
+    into memory. `content_type` picks the format; NDJSON lines that are not
+    JSON objects are yielded as exceptions so the caller can report them.
+    A body that is not UTF-8, or CSV the csv module cannot parse, raises
+    ImportFormatError part way through.
+    """
+    try:
+        yield from _read_rows(codecs.iterdecode(stream, 'utf-8-sig'), content_type)
+    except UnicodeDecodeError:
+        raise ImportFormatError('Upload must be UTF-8 text')
+
+
+def _read_rows(lines, content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+
+    if media_type in CSV_CONTENT_TYPES:
+        reader = csv.DictReader(lines)
+        try:
+            missing = set(IMPORT_FIELDS) - set(reader.fieldnames or ())
+            if missing:
+                raise ImportFormatError(f"CSV header is missing: {', '.join(sorted(missing))}")
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as exc:
+            # An unbalanced quote, for one, runs on until the field size limit
+            raise ImportFormatError(f'CSV could not be parsed at line {reader.line_num}: {exc}')
+    elif media_type in NDJSON_CONTENT_TYPES:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('Each line must be a JSON object')
+            except ValueError as exc:
+                yield line_number, exc
+            else:
+                yield line_number, row
+    else:
+        raise ImportFormatError('Upload must be text/csv or application/x-ndjson')
+
+
+def clean_row(row):
+    """ Validate one row with the model's own form field rules; return (values, errors). """
+    if isinstance(row, Exception):
+        return None, {'non_field_errors': [str(row)]}
+
+    values, errors = {}, {}
+    for name, field in IMPORT_FORM_FIELDS.items():
+        try:
+            values[name] = field.clean(row.get(name))
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    if not errors and (values['latitude'] is None) != (values['longitude'] is None):
+        errors['non_field_errors'] = ['latitude and longitude must be given together.']
+    return (None, errors) if errors else (values, None)
+
+
+def restock_inventory(restocks):
+    """
+    Apply (inventory_id, added_quantity, unit_price) triples with one UPDATE per batch.
+
+    Quantities are added in SQL (`quantity = quantity + CASE id ... END`), so
+    no read-modify-write race is possible and rows need no lock. The statement
+    is assembled directly because bulk_update() builds an ORM expression per
+    row, which dominates the cost at import volumes.
+    """
+    if not restocks:
+        return
+    table = connection.ops.quote_name(GasInventory._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    # Five parameters per row: two per CASE plus one in the IN list
+    batch_size = min(500, (connection.features.max_query_params or 2500) // 5 - 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(restocks), batch_size):
+            batch = restocks[start:start + batch_size]
+            whens = ' '.join(['WHEN %s THEN %s'] * len(batch))
+            placeholders = ', '.join(['%s'] * len(batch))
+            params = [value for inventory_id, quantity, _ in batch for value in (inventory_id, quantity)]
+            params += [value for inventory_id, _, price in batch for value in (inventory_id, price)]
+            params += [now]
+            params += [inventory_id for inventory_id, _, _ in batch]
+            cursor.execute(
+                f'UPDATE {table} SET quantity = quantity + (CASE id {whens} END), '
+                f'unit_price = (CASE id {whens} END), last_updated = %s '
+                f'WHERE id IN ({placeholders})',
+                params,
+            )
+
+
+class InventoryImport:
+    """
+    Create or restock a seller's inventory from a stream of rows.
+
+    Rows are matched to existing stock on (brand, weight_kg, location). A
+    match is restocked (quantity added, unit price replaced) and anything
+    else is created. Work is applied in chunks with set-based UPDATEs and
+    bulk_create, so memory stays flat however large the upload is. Invalid
+    rows are reported and skipped; they never abort the rest of the batch.
+    """
+
+    def __init__(self, seller, chunk_size=CHUNK_SIZE):
+        self.seller = seller
+        self.chunk_size = chunk_size
+        self.rating_fields = seller_rating_fields(seller.pk)
+        self.created = 0
+        self.restocked = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = iter(rows)
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.apply_chunk(chunk)
+            if self.created or self.restocked:
+                invalidate_catalogue()
+        return self.summary()
+
+    def apply_chunk(self, chunk):
+        # Merge duplicate keys inside the chunk so each row is written once
+        pending = {}
+        for line_number, row in chunk:
+            values, errors = clean_row(row)
+            if errors:
+                self.record_error(line_number, errors)
+                continue
+            key = (values['brand'], values['weight_kg'], values['location'])
+            if key in pending:
+                pending[key]['quantity'] += values['quantity']
+                pending[key]['unit_price'] = values['unit_price']
+            else:
+                pending[key] = values
+
+        if not pending:
+            return
+
+        existing = GasInventory.objects.filter(
+            seller=self.seller,
+            location__in={key[2] for key in pending},
+        ).values_list('id', 'brand', 'weight_kg', 'location')
+
+        restocks = []
+        for inventory_id, brand, weight_kg, location in existing:
+            values = pending.pop((brand, weight_kg, location), None)
+            if values is not None:
+                restocks.append((inventory_id, values['quantity'], values['unit_price']))
+
+        restock_inventory(restocks)
+        # bulk_create() skips save(), so the geohash is filled in here
+        GasInventory.objects.bulk_create([
+            GasInventory(
+                seller=self.seller, geohash=encode(values['latitude'], values['longitude']),
+                **self.rating_fields, **values
+            )
+            for values in pending.values()
+        ])
+        self.restocked += len(restocks)
+        self.created += len(pending)
+
+    def record_error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'errors': errors})
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'restocked': self.restocked,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
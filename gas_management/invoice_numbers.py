@@ -0,0 +1,96 @@
+"""
+Invoice numbers: `INV-` and a ten-digit sequence value, e.g. INV-0000012345.
+
+On PostgreSQL the values come from the sequence SEQUENCE, which advances a
+whole block per nextval() (its INCREMENT BY, set by migration 0012). Each
+process reserves a block with one round trip and hands its values out from
+memory, so an invoice, or a bulk_create() of many, costs no query of its
+own. A sequence is not transactional and takes no row lock, so processes
+never wait on one another, and a value once reserved is never issued again,
+even if the transaction that reserved it rolls back.
+
+Numbers are unique and increase within each process. Across processes they
+interleave block by block, and values left in a block when a process exits
+are skipped, so the series has gaps. Invoices numbered before this keep
+their `INV-` plus eight hex characters (twelve characters in all), and
+seeded ones `INV-S` plus ten digits; neither can equal a new number.
+
+Other backends (the SQLite test database) have no sequences: there each
+batch of numbers advances the InvoiceNumberSequence row inside the caller's
+transaction, one UPDATE per batch.
+"""
+import os
+import threading
+
+from django.db import connection, transaction
+from django.db.models import F
+
+SEQUENCE = 'gas_management_invoice_number_seq'
+PREFIX = 'INV-'
+DIGITS = 10
+
+
+def format_invoice_number(value):
+    return f'{PREFIX}{value:0{DIGITS}d}'
+
+
+def _counter_values(count):
+    from .models import InvoiceNumberSequence
+
+    with transaction.atomic():
+        if not InvoiceNumberSequence.objects.filter(pk=1).update(last_value=F('last_value') + count):
+            InvoiceNumberSequence.objects.create(pk=1, last_value=count)
+        last = InvoiceNumberSequence.objects.values_list('last_value', flat=True).get(pk=1)
+    return list(range(last - count + 1, last + 1))
+
+
+class BlockAllocator:
+    """ Hands out sequence values from blocks reserved with one nextval() each; one per process. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._pid = None
+
+    def _reserve(self):
+        # The block size is the sequence's own increment, so it cannot disagree with it
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s), increment_by FROM pg_sequences '
+                'WHERE schemaname = current_schema() AND sequencename = %s',
+                [SEQUENCE, SEQUENCE]
+            )
+            start, block_size = cursor.fetchone()
+        return start, start + block_size
+
+    def take(self, count):
+        """ `count` fresh values, in increasing order. """
+        if not count:
+            return []
+        if connection.vendor != 'postgresql':
+            return _counter_values(count)
+        values = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # A worker forked after its parent reserved a block must not reuse it
+                self._next = self._end = 0
+                self._pid = os.getpid()
+            while len(values) < count:
+                if self._next >= self._end:
+                    self._next, self._end = self._reserve()
+                taken = min(count - len(values), self._end - self._next)
+                values.extend(range(self._next, self._next + taken))
+                self._next += taken
+        return values
+
+
+allocator = BlockAllocator()
+
+
+def next_invoice_numbers(count):
+    """ `count` fresh invoice numbers, in increasing order, for bulk_create(). """
+    return [format_invoice_number(value) for value in allocator.take(count)]
+
+
+def next_invoice_number():
+    return next_invoice_numbers(1)[0]
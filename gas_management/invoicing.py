@@ -0,0 +1,63 @@
+from django.db import transaction
+
+from .models import Order, Invoice, InvoiceOutbox
+from .invoice_numbers import next_invoice_numbers
+
+DRAIN_BATCH_SIZE = 500
+# Orders cancelled or rejected before their outbox entry was drained get no invoice
+INVOICEABLE_STATUSES = ('APPROVED', 'DELIVERED')
+
+
+def queue_invoices(order_ids):
+    """
+    Record that the given newly approved orders need invoices.
+
+    Call inside the transaction that moves the orders to APPROVED: the
+    outbox rows commit or roll back with the approval. The invoices
+    themselves are created by `drain_invoice_outbox --follow`, never on the
+    approving request, so invoicing adds nothing to its latency and cannot
+    fail an approval that has already committed.
+    """
+    if not order_ids:
+        return
+    InvoiceOutbox.objects.bulk_create(
+        [InvoiceOutbox(order_id=order_id) for order_id in order_ids],
+        ignore_conflicts=True,
+    )
+
+
+def drain_batch(batch_size=DRAIN_BATCH_SIZE):
+    """ Turn up to `batch_size` outbox entries into invoices with one bulk_create; returns entries handled. """
+    with transaction.atomic():
+        # skip_locked lets concurrent drains split the backlog instead of queueing on each other
+        entries = list(
+            InvoiceOutbox.objects.select_for_update(skip_locked=True)
+            .order_by('pk')
+            .values_list('pk', 'order_id')[:batch_size]
+        )
+        if not entries:
+            return 0
+
+        order_ids = [order_id for _, order_id in entries]
+        invoiceable = set(
+            Order.objects.filter(pk__in=order_ids, status__in=INVOICEABLE_STATUSES, invoice__isnull=True)
+            .values_list('pk', flat=True)
+        )
+        invoiced = [order_id for order_id in order_ids if order_id in invoiceable]
+        # One block reservation at most numbers the whole batch
+        Invoice.objects.bulk_create([
+            Invoice(order_id=order_id, invoice_number=invoice_number)
+            for order_id, invoice_number in zip(invoiced, next_invoice_numbers(len(invoiced)))
+        ])
+        InvoiceOutbox.objects.filter(pk__in=[pk for pk, _ in entries]).delete()
+    return len(entries)
+
+
+def drain_outbox(batch_size=DRAIN_BATCH_SIZE):
+    """ Drain the whole outbox in batches; returns the number of entries handled. """
+    drained = 0
+    while True:
+        handled = drain_batch(batch_size)
+        drained += handled
+        if handled < batch_size:
+            return drained
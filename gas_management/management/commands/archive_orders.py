@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from gas_management.archive import ARCHIVE_BATCH_SIZE, archive_after_days, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move settled orders older than ORDER_ARCHIVE_AFTER_DAYS, with their invoices and payments, into the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Archive orders created more than this many days ago (default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help='Orders moved per transaction')
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        days = archive_after_days() if days is None else days
+        archived = archive_orders(days, options['batch_size'])
+        self.stdout.write(f'Archived {archived} orders older than {days} days')
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gas_management.benchmarks import compare, environment, load_scenarios
+
+
+class Command(BaseCommand):
+    help = 'Run a performance benchmark scenario against the configured database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', help='Scenario name; use "list" to see them all')
+        parser.add_argument('--rows', type=int, default=None,
+                            help='Seeded row count for the scenario (scenario-specific default)')
+        parser.add_argument('--iterations', type=int, default=200,
+                            help='Timed iterations per measurement')
+        parser.add_argument('--output', default=None,
+                            help='Also write the results as JSON to this path')
+        parser.add_argument('--compare', default=None, metavar='BASELINE',
+                            help='Compare the results with a JSON file written earlier by --output')
+
+    def handle(self, *args, **options):
+        scenarios = load_scenarios()
+        if options['scenario'] == 'list':
+            for name in sorted(scenarios):
+                self.stdout.write(name)
+            return
+
+        try:
+            run = scenarios[options['scenario']]
+        except KeyError:
+            raise CommandError(
+                f"Unknown scenario '{options['scenario']}'. Choose from: {', '.join(sorted(scenarios))}"
+            )
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {exc}")
+            if baseline.get('scenario') != options['scenario']:
+                raise CommandError(f"Baseline is for scenario '{baseline.get('scenario')}', not '{options['scenario']}'.")
+
+        options['stdout'] = self.stdout
+        results = {
+            'scenario': options['scenario'],
+            'environment': environment(),
+            'options': {'rows': options['rows'], 'iterations': options['iterations']},
+            'results': run(options),
+        }
+        report = json.dumps(results, indent=2, default=str)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+
+        if baseline is not None:
+            self.stdout.write(f"Compared with {options['compare']} (revision {baseline.get('environment', {}).get('revision')}):")
+            for change in compare(baseline.get('results', {}), results['results']):
+                pct = 'n/a' if change['change_pct'] is None else f"{change['change_pct']:+.1f}%"
+                verdict = 'better' if change['better'] else ('worse' if change['current'] != change['baseline'] else 'same')
+                self.stdout.write(
+                    f"  {change['figure']}: {change['baseline']} -> {change['current']} ({pct}, {verdict})"
+                )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from gas_management.invoicing import DRAIN_BATCH_SIZE, drain_outbox
+from gas_management.models import InvoiceOutbox
+
+
+class Command(BaseCommand):
+    help = 'Create invoices for approved orders still waiting in the invoice outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DRAIN_BATCH_SIZE,
+                            help='Outbox entries turned into invoices per transaction')
+        parser.add_argument('--follow', action='store_true',
+                            help='Keep running, draining new entries as approvals queue them')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between drains with --follow')
+
+    def handle(self, *args, **options):
+        if not options['follow']:
+            backlog = InvoiceOutbox.objects.count()
+            drained = drain_outbox(options['batch_size'])
+            self.stdout.write(f'Drained {drained} of {backlog} queued invoice entries')
+            return
+
+        try:
+            while True:
+                try:
+                    drained = drain_outbox(options['batch_size'])
+                except DatabaseError as exc:
+                    # Entries stay queued for the next pass
+                    self.stderr.write(f'Invoice outbox drain failed: {exc}')
+                else:
+                    if drained:
+                        self.stdout.write(f'Drained {drained} queued invoice entries')
+                # As at the end of a request: a broken connection is replaced
+                # and the pool gets its connection back between passes
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
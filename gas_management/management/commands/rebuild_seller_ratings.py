@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from gas_management.ratings import rebuild_seller_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute sellers' rating totals from ratings and copy them onto their inventory."
+
+    def handle(self, *args, **options):
+        changed = rebuild_seller_ratings()
+        self.stdout.write(f'Rebuilt seller ratings; {changed} sellers had drifted')
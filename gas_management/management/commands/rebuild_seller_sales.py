@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gas_management.analytics import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the seller daily sales rollup from orders and ratings, repairing any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seller', type=int, action='append', dest='sellers',
+                            help='Only rebuild this seller id (repeatable); default is every seller')
+
+    def handle(self, *args, **options):
+        written, changed = rebuild_sales(options['sellers'])
+        self.stdout.write(f'Rebuilt {written} rollup rows; {changed} had drifted')
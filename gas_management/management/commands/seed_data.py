@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gas_management.analytics import rebuild_sales
+from gas_management.benchmarks.fixtures import ensure_inventory, ensure_order_history
+from gas_management.ratings import rebuild_seller_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed production-sized synthetic data (benchmark users, inventory, and orders with their '
+        'invoices, payments and ratings) with bulk inserts, then rebuild the derived tables. '
+        'Re-running tops the data up to the requested volumes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=10000, help='Benchmark sellers')
+        parser.add_argument('--buyers', type=int, default=50000, help='Benchmark buyers')
+        parser.add_argument('--inventory', type=int, default=1000000, help='Inventory rows')
+        parser.add_argument('--orders', type=int, default=5000000,
+                            help='Orders, with invoices, payments and ratings as their status implies')
+        parser.add_argument('--days', type=int, default=365, help='Days of order history to spread orders over')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiply every volume by this, e.g. 0.01 for a quick local data set')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible data')
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError('--scale must be greater than 0.')
+        volumes = {
+            name: max(1, round(options[name] * options['scale']))
+            for name in ('sellers', 'buyers', 'inventory', 'orders')
+        }
+
+        started = time.perf_counter()
+        self.stdout.write(f"Seeding {volumes['inventory']} inventory rows for {volumes['sellers']} sellers")
+        ensure_inventory(volumes['inventory'], sellers=volumes['sellers'], seed=options['seed'], stdout=self.stdout)
+        self.stdout.write(f"Seeding {volumes['orders']} orders for {volumes['buyers']} buyers")
+        ensure_order_history(volumes['orders'], buyers=volumes['buyers'], days=options['days'],
+                             seed=options['seed'], stdout=self.stdout)
+
+        self.stdout.write('Rebuilding seller ratings and the daily sales rollup')
+        rebuild_seller_ratings()
+        written, _ = rebuild_sales()
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.0f}s; {written} rollup rows')
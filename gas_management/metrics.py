@@ -0,0 +1,199 @@
+import bisect
+import hmac
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from .catalogue_cache import stats as catalogue_cache_stats
+from .connection_pool import pool_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Label for requests that matched no URL pattern, so 404 probes of random
+# paths all share one series
+UNMATCHED_ROUTE = 'unmatched'
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """ A Prometheus histogram kept in this process, with one series per label tuple. """
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (non-cumulative, +Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket
+                le = 'le="{}"'.format(bound if bound == '+Inf' else _number(bound))
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_LABELS = ('route', 'method', 'status')
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to build the response, by route.', REQUEST_LABELS, LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    'http_request_db_queries', 'Database queries run while building the response, by route.',
+    REQUEST_LABELS, QUERY_BUCKETS
+)
+request_db_time = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request, by route.',
+    REQUEST_LABELS, DB_TIME_BUCKETS
+)
+response_size = Histogram(
+    'http_response_size_bytes', 'Response body size, by route; streamed responses are not counted.',
+    REQUEST_LABELS, SIZE_BUCKETS
+)
+HISTOGRAMS = (request_duration, request_queries, request_db_time, response_size)
+
+
+def route_label(request):
+    """ The resolved URL name (or pattern) of a request, never its concrete path. """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name or match.route or UNMATCHED_ROUTE
+
+
+class QueryTimer:
+    """ Execute wrapper that counts queries and adds up their time. """
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """
+    Records latency, database queries and time, and response size for
+    every request, labelled by route name, method and status class so the
+    number of series stays fixed whatever paths are requested. Queries run
+    while a streamed response is being sent are not seen.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        method = request.method if request.method in METHODS else 'other'
+        labels = (route_label(request), method, f'{response.status_code // 100}xx')
+        request_duration.observe(labels, elapsed)
+        request_queries.observe(labels, timer.queries)
+        request_db_time.observe(labels, timer.seconds)
+        if not response.streaming:
+            response_size.observe(labels, len(response.content))
+        return response
+
+
+def _metric(name, documentation, samples, kind='gauge'):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+    lines.extend(f'{name}{labels} {_number(value)}' for labels, value in samples)
+    return lines
+
+
+def render():
+    """ Every metric of this process in the Prometheus text exposition format. """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+
+    cache = catalogue_cache_stats.snapshot()
+    lines.extend(_metric('catalogue_cache_hits_total', 'Catalogue pages served from the cache.',
+                        [('', cache['hits'])], 'counter'))
+    lines.extend(_metric('catalogue_cache_misses_total', 'Catalogue pages built from the database.',
+                        [('', cache['misses'])], 'counter'))
+
+    pools = pool_stats()
+    lines.extend(_metric('db_pool_connections', 'Pooled database connections by state.', [
+        (_labels(('pool', 'state'), (pool, state)), stats[state])
+        for pool, stats in pools.items() for state in ('in_use', 'idle')
+    ]))
+    lines.extend(_metric('db_pool_wait_seconds_total', 'Time requests spent waiting for a pooled connection.', [
+        (_labels(('pool',), (pool,)), stats['wait_ms_total'] / 1000) for pool, stats in pools.items()
+    ], 'counter'))
+    lines.extend(_metric('db_pool_timeouts_total', 'Checkouts that gave up waiting for a pooled connection.', [
+        (_labels(('pool',), (pool,)), stats['timeouts']) for pool, stats in pools.items()
+    ], 'counter'))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Serve this worker process's metrics to Prometheus. With METRICS_TOKEN
+    set, scrapes must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:37
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+TRIGRAM_INDEX = 'gasinv_location_trgm_idx'
+
+
+def create_location_trigram_index(apps, schema_editor):
+    # location__icontains compiles to UPPER(location) LIKE UPPER('%term%'),
+    # which only a trigram GIN index over the same expression can serve.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            # contrib is not installed on this server; the search keeps working unindexed
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON gas_management_gasinventory '
+        'USING gin (UPPER(location) gin_trgm_ops)'
+    )
+
+
+def drop_location_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['-date_added', '-id'], name='gasinv_instock_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['unit_price', 'id'], name='gasinv_instock_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['weight_kg', 'id'], name='gasinv_instock_weight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(fields=['seller', '-date_added', '-id'], name='gasinv_seller_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(django.db.models.functions.text.Upper('brand'), condition=models.Q(('quantity__gt', 0)), name='gasinv_brand_upper_idx'),
+        ),
+        migrations.RunPython(create_location_trigram_index, drop_location_trigram_index),
+    ]
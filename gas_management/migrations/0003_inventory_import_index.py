@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0002_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(fields=['seller', 'location'], name='gasinv_seller_location_idx'),
+        ),
+    ]
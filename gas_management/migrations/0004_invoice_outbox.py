@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0003_inventory_import_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gas_management.order')),
+            ],
+        ),
+    ]
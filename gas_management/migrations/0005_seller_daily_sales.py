@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-17 12:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gas_management', '0004_invoice_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Day the orders were placed')),
+                ('brand', models.CharField(choices=[('JIBU', 'Jibu'), ('MERU', 'Meru'), ('TOTAL', 'Total'), ('OTHER', 'Other')], max_length=20)),
+                ('weight_kg', models.DecimalField(decimal_places=1, max_digits=5)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Seller daily sales',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sellerdailysales',
+            constraint=models.UniqueConstraint(fields=('seller', 'day', 'brand', 'weight_kg'), name='seller_daily_sales_key'),
+        ),
+    ]
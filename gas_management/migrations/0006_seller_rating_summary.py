@@ -0,0 +1,63 @@
+# Generated by Django 3.2.25 on 2026-10-17 12:10
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_seller_ratings(apps, schema_editor):
+    # Same figures as gas_management.ratings.rebuild_seller_ratings(), using historical models
+    UserProfile = apps.get_model('gas_management', 'UserProfile')
+    GasInventory = apps.get_model('gas_management', 'GasInventory')
+    Rating = apps.get_model('gas_management', 'Rating')
+    totals = (
+        Rating.objects.values('order__gas_inventory__seller_id')
+        .annotate(rating_count=Count('pk'), rating_sum=Sum('rating'))
+        .values_list('order__gas_inventory__seller_id', 'rating_count', 'rating_sum')
+    )
+    for seller_id, rating_count, rating_sum in totals:
+        UserProfile.objects.filter(user_id=seller_id).update(rating_count=rating_count, rating_sum=rating_sum)
+        GasInventory.objects.filter(seller_id=seller_id).update(
+            seller_rating=(Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            seller_rating_count=rating_count,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0005_seller_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasinventory',
+            name='seller_rating',
+            field=models.DecimalField(decimal_places=2, default=0, help_text="Seller's average rating; 0 until first rated", max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='gasinventory',
+            name='seller_rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['seller_rating', 'id'], name='gasinv_instock_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['seller_rating_count', 'id'], name='gasinv_instock_ratingcnt_idx'),
+        ),
+        migrations.RunPython(populate_seller_ratings, migrations.RunPython.noop),
+    ]
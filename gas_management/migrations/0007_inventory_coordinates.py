@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-17 12:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0006_seller_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasinventory',
+            name='geohash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='gasinventory',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='gasinventory',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='gasinventory',
+            index=models.Index(condition=models.Q(('geohash__isnull', False), ('quantity__gt', 0)), fields=['geohash', 'latitude', 'longitude', 'id'], name='gasinv_instock_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-17 12:32
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+SEARCH_INDEX = 'gasinv_instock_search_idx'
+SEARCH_FUNCTION = 'gas_management_inventory_search_vector'
+SEARCH_TRIGGER = 'gasinv_search_vector_trg'
+
+# Location words weigh more than the brand. The 'simple' configuration only
+# lower-cases, since place names must not be stemmed as English words.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce({row}location, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}brand, '')), 'B')"
+)
+# Words worth offering as spelling corrections: three or more characters, not bare numbers
+LEXEME_FILTER_SQL = "length(word) BETWEEN 3 AND 100 AND word ~ '[[:alpha:]]'"
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Fires for every INSERT and for UPDATEs that set brand or location, which
+    # includes Model.save(); stock movements update quantity alone and skip it
+    schema_editor.execute(f"""
+        CREATE OR REPLACE FUNCTION {SEARCH_FUNCTION}() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+            INSERT INTO gas_management_searchlexeme (word)
+                SELECT word FROM unnest(tsvector_to_array(NEW.search_vector)) AS word
+                WHERE {LEXEME_FILTER_SQL}
+                ON CONFLICT DO NOTHING;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    schema_editor.execute(
+        f'CREATE TRIGGER {SEARCH_TRIGGER} BEFORE INSERT OR UPDATE OF brand, location '
+        f'ON gas_management_gasinventory FOR EACH ROW EXECUTE FUNCTION {SEARCH_FUNCTION}()'
+    )
+    schema_editor.execute(
+        f"UPDATE gas_management_gasinventory SET search_vector = {SEARCH_VECTOR_SQL.format(row='')}"
+    )
+    schema_editor.execute(f"""
+        INSERT INTO gas_management_searchlexeme (word)
+        SELECT word FROM ts_stat('SELECT search_vector FROM gas_management_gasinventory')
+        WHERE {LEXEME_FILTER_SQL}
+        ON CONFLICT DO NOTHING
+    """)
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON gas_management_gasinventory '
+        'USING gin (search_vector) WHERE quantity > 0'
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+    schema_editor.execute(f'DROP TRIGGER IF EXISTS {SEARCH_TRIGGER} ON gas_management_gasinventory')
+    schema_editor.execute(f'DROP FUNCTION IF EXISTS {SEARCH_FUNCTION}()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0007_inventory_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchLexeme',
+            fields=[
+                ('word', models.CharField(max_length=100, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='gasinventory',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
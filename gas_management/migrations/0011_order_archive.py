@@ -0,0 +1,106 @@
+# Generated by Django 3.2.25 on 2026-10-17 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Each archive table with the columns its plain indexes cover. On PostgreSQL
+# every key must include the partition key, so the primary key becomes
+# (id, created_at) and the one-to-one columns lose their unique constraints.
+ARCHIVE_TABLES = {
+    'gas_management_archivedorder': [('created_at', 'id'), ('buyer_id', 'created_at', 'id'), ('gas_inventory_id',)],
+    'gas_management_archivedinvoice': [('order_id',), ('invoice_number',)],
+    'gas_management_archivedpayment': [('invoice_id',)],
+    'gas_management_archivedrating': [('order_id',)],
+}
+
+
+def partition_archive_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # The tables are new and empty, so each is swapped for a partitioned copy;
+    # monthly partitions are created on demand by archive.ensure_partitions()
+    for table, indexes in ARCHIVE_TABLES.items():
+        schema_editor.execute(
+            f'CREATE TABLE {table}_new (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        schema_editor.execute(f'DROP TABLE {table}')
+        schema_editor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        schema_editor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)')
+        for columns in indexes:
+            schema_editor.execute(
+                f'CREATE INDEX {table}_{"_".join(columns)}_idx ON {table} ({", ".join(columns)})'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gas_management', '0010_order_status_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedInvoice',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('invoice_number', models.CharField(db_index=True, max_length=20)),
+                ('is_paid', models.BooleanField()),
+                ('payment_date', models.DateTimeField(null=True)),
+                ('admin_approval', models.BooleanField()),
+                ('admin_approval_date', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending Approval'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=10)),
+                ('delivery_address', models.TextField()),
+                ('contact_phone', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('buyer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('gas_inventory', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gas_management.gasinventory')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRating',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rating', models.IntegerField(choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)])),
+                ('comment', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('order', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='rating', to='gas_management.archivedorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], max_length=10)),
+                ('transaction_id', models.CharField(max_length=100, null=True)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('invoice', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='payment', to='gas_management.archivedinvoice')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedinvoice',
+            name='order',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='invoice', to='gas_management.archivedorder'),
+        ),
+        migrations.RunPython(partition_archive_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-17 14:28
+
+from django.db import migrations, models
+
+
+SEQUENCE = 'gas_management_invoice_number_seq'
+# Invoice numbers each process reserves per nextval(); see invoice_numbers.
+# ALTER SEQUENCE ... INCREMENT BY changes it without a code change.
+BLOCK_SIZE = 100
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} INCREMENT BY {BLOCK_SIZE} MINVALUE 1 START 1')
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP SEQUENCE IF EXISTS {SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gas_management', '0011_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -1,6 +1,13 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
-import uuid
+from django.utils import timezone
+
+from .geo import encode
+from .invoice_numbers import next_invoice_number
 
 class UserProfile(models.Model):
     """ User Profile model to extend the default User model with additional fields."""
@@ -14,6 +21,9 @@ class UserProfile(models.Model):
     role = models.CharField(max_length=10, choices=USER_ROLES)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+    # Running totals over every rating of the user's orders as a seller
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f'{self.user.username} ({self.role})'
@@ -35,6 +45,23 @@ class GasInventory(models.Model):
     location = models.CharField(max_length=100)
     date_added = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
+    # Copied from the seller's profile so the catalogue can sort on reputation without a join
+    seller_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0,
+                                        help_text="Seller's average rating; 0 until first rated")
+    seller_rating_count = models.PositiveIntegerField(default=0)
+    latitude = models.FloatField(null=True, blank=True,
+                                 validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True,
+                                  validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Integer geohash of (latitude, longitude), maintained by save(); see geo.encode
+    geohash = models.BigIntegerField(null=True, blank=True, editable=False)
+    # Weighted location and brand lexemes, maintained by a database trigger on
+    # PostgreSQL (migration 0008) and unused elsewhere; see search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        self.geohash = encode(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f'{self.brand} - {self.weight_kg}kg ({self.quantity} units) at {self.location}'
@@ -42,6 +69,30 @@ class GasInventory(models.Model):
     class Meta:
         verbose_name_plural = 'Gas Inventories'
         ordering = ['-date_added']
+        indexes = [
+            # The catalogue only ever lists in-stock rows, so these are partial
+            # indexes over quantity > 0 matching each supported ordering
+            # (with id as the pagination tiebreaker).
+            models.Index(fields=['-date_added', '-id'], name='gasinv_instock_recent_idx',
+                         condition=Q(quantity__gt=0)),
+            models.Index(fields=['unit_price', 'id'], name='gasinv_instock_price_idx',
+                         condition=Q(quantity__gt=0)),
+            models.Index(fields=['weight_kg', 'id'], name='gasinv_instock_weight_idx',
+                         condition=Q(quantity__gt=0)),
+            models.Index(fields=['seller_rating', 'id'], name='gasinv_instock_rating_idx',
+                         condition=Q(quantity__gt=0)),
+            models.Index(fields=['seller_rating_count', 'id'], name='gasinv_instock_ratingcnt_idx',
+                         condition=Q(quantity__gt=0)),
+            # Proximity search reads whole geohash ranges; carrying the
+            # coordinates lets it rank candidates from the index alone
+            models.Index(fields=['geohash', 'latitude', 'longitude', 'id'], name='gasinv_instock_geohash_idx',
+                         condition=Q(quantity__gt=0, geohash__isnull=False)),
+            models.Index(fields=['seller', '-date_added', '-id'], name='gasinv_seller_recent_idx'),
+            # Bulk import matches a seller's existing stock by location
+            models.Index(fields=['seller', 'location'], name='gasinv_seller_location_idx'),
+            # brand__iexact compiles to UPPER(brand) = UPPER(%s)
+            models.Index(Upper('brand'), name='gasinv_brand_upper_idx', condition=Q(quantity__gt=0)),
+        ]
 
 class Order(models.Model):
     """ Model to manage orders placed by buyers for gas inventory."""
@@ -69,6 +120,27 @@ class Order(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+# Order statuses as stored in OrderStatusChange, which keeps them in two bytes
+ORDER_STATUS_CODES = {status: code for code, (status, _) in enumerate(Order.STATUS_CHOICES, 1)}
+
+class OrderStatusChange(models.Model):
+    """ One transition of an order's status, appended by order_states and never updated."""
+    STATUS_CODE_CHOICES = [(code, status) for status, code in ORDER_STATUS_CODES.items()]
+    
+    # No database constraints: the history outlives archived or deleted orders and users
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_changes')
+    from_status = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES)
+    to_status = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES)
+    actor = models.ForeignKey(User, null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f'Order #{self.order_id}: {self.get_from_status_display()} -> {self.get_to_status_display()}'
+
+def generate_invoice_number():
+    """ A fresh invoice number; bulk_create() skips save(), so batch callers use invoice_numbers.next_invoice_numbers(). """
+    return next_invoice_number()
+
 class Invoice(models.Model):
     """ Model to manage invoices generated for orders."""
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='invoice')
@@ -82,12 +154,24 @@ class Invoice(models.Model):
     def save(self, *args, **kwargs):
         if not self.invoice_number:
             # Generate a unique invoice number when first created
-            self.invoice_number = f'INV-{uuid.uuid4().hex[:8].upper()}'
+            self.invoice_number = generate_invoice_number()
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f'Invoice #{self.invoice_number} - {self.order.gas_inventory.brand}'
 
+class InvoiceOutbox(models.Model):
+    """ Invoice work recorded in the same transaction as an order's approval and drained after commit."""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f'Pending invoice for Order #{self.order_id}'
+
+class InvoiceNumberSequence(models.Model):
+    """ The last invoice number issued, on databases without sequences (see invoice_numbers)."""
+    last_value = models.BigIntegerField(default=0)
+
 class Payment(models.Model):
     """ Model to manage payments made for invoices."""
     PAYMENT_STATUS_CHOICES = [
@@ -116,3 +200,117 @@ class Rating(models.Model):
     
     def __str__(self):
         return f'Rating: {self.rating}/5 for Order #{self.order.id}'
+
+class SellerDailySales(models.Model):
+    """ Daily sales rollup per seller, brand and weight, kept current as orders change state."""
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField(help_text='Day the orders were placed')
+    brand = models.CharField(max_length=20, choices=GasInventory.GAS_BRAND_CHOICES)
+    weight_kg = models.DecimalField(max_digits=5, decimal_places=1)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f'{self.seller_id} {self.day} {self.brand} {self.weight_kg}kg: {self.orders} orders'
+    
+    class Meta:
+        verbose_name_plural = 'Seller daily sales'
+        constraints = [
+            # Also the index the dashboard reads by (seller, day range)
+            models.UniqueConstraint(fields=['seller', 'day', 'brand', 'weight_kg'], name='seller_daily_sales_key'),
+        ]
+
+class IdempotencyKey(models.Model):
+    """ The response to a write sent with an Idempotency-Key header, replayed when the client retries it."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # Digest of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    # Both set in the transaction that claimed the key, so never seen empty.
+    # The response is JSON text, not a JSONField, since jsonb reorders keys.
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f'{self.user_id} {self.key}: {self.status_code}'
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_per_user'),
+        ]
+
+# Archive of settled orders, moved out of the live tables by archive.archive_orders.
+# The columns match the live tables' plus archived_at. On PostgreSQL each
+# table is range-partitioned by month of created_at (migration 0011), which
+# cannot carry a unique or foreign key constraint on id alone, so none of the
+# relations below are enforced by the database and ids are copied, not generated.
+
+class ArchivedOrder(models.Model):
+    """ An order, as it was when archived."""
+    id = models.BigIntegerField(primary_key=True)
+    gas_inventory = models.ForeignKey(GasInventory, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    buyer = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    quantity = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    delivery_address = models.TextField()
+    contact_phone = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f'Archived order #{self.id} ({self.status})'
+
+class ArchivedInvoice(models.Model):
+    """ An archived order's invoice."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.DO_NOTHING, db_constraint=False, related_name='invoice')
+    invoice_number = models.CharField(max_length=20, db_index=True)
+    is_paid = models.BooleanField()
+    payment_date = models.DateTimeField(null=True)
+    admin_approval = models.BooleanField()
+    admin_approval_date = models.DateTimeField(null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f'Archived invoice #{self.invoice_number}'
+
+class ArchivedPayment(models.Model):
+    """ The payment of an archived invoice."""
+    id = models.BigIntegerField(primary_key=True)
+    invoice = models.OneToOneField(ArchivedInvoice, on_delete=models.DO_NOTHING, db_constraint=False, related_name='payment')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=10, choices=Payment.PAYMENT_STATUS_CHOICES)
+    transaction_id = models.CharField(max_length=100, null=True)
+    payment_method = models.CharField(max_length=50)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f'Archived payment of {self.amount} for invoice {self.invoice_id}'
+
+class ArchivedRating(models.Model):
+    """ The rating of an archived order, still counted in its seller's totals."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.DO_NOTHING, db_constraint=False, related_name='rating')
+    rating = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f'Archived rating: {self.rating}/5 for order {self.order_id}'
+
+class SearchLexeme(models.Model):
+    """ Distinct words indexed for catalogue search, used to correct misspelt search terms."""
+    word = models.CharField(max_length=100, primary_key=True)
+    
+    def __str__(self):
+        return self.word
@@ -0,0 +1,103 @@
+"""
+The order status state machine.
+
+Every status change is a single compare-and-swap,
+`UPDATE ... SET status = <to> WHERE id = <id> AND status = <from>`: of two
+requests moving the same order at once only one matches the row, and the
+other sees no row updated, re-reads the status and either moves on from it
+or fails. No lock is taken beforehand and no other column is rewritten.
+The swap row-locks the order until the surrounding transaction ends, so
+side effects written after it (stock, the sales rollup) commit or roll back
+with it, orders locked before inventory as everywhere else.
+
+Each change is appended to OrderStatusChange. On PostgreSQL the update and
+the append are one statement, so a transition is one round trip.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ORDER_STATUS_CODES, Order, OrderStatusChange
+
+# The statuses each status may move to. There are no cycles, so a
+# transition re-reads a status that lost a race at most once per status.
+TRANSITIONS = {
+    'PENDING': ('APPROVED', 'REJECTED', 'CANCELLED'),
+    'APPROVED': ('DELIVERED', 'CANCELLED'),
+}
+
+
+class InvalidTransition(Exception):
+    """ Raised when an order's current status cannot move to the requested one. """
+
+    def __init__(self, order_id, status, target):
+        self.order_id = order_id
+        self.status = status
+        self.target = target
+        super().__init__(f'Order {order_id} cannot move from {status} to {target}')
+
+
+def can_transition(status, target):
+    return target in TRANSITIONS.get(status, ())
+
+
+def _swap_sql():
+    order = connection.ops.quote_name(Order._meta.db_table)
+    history = connection.ops.quote_name(OrderStatusChange._meta.db_table)
+    return (
+        f'WITH moved AS ('
+        f'UPDATE {order} SET status = %s, updated_at = %s WHERE id = %s AND status = %s RETURNING id'
+        f') INSERT INTO {history} (order_id, from_status, to_status, actor_id, changed_at) '
+        f'SELECT id, %s, %s, %s, %s FROM moved'
+    )
+
+
+def _swap(order_id, expected, target, actor_id, now):
+    """ Move one order from `expected` to `target` and record it; False if its status was no longer `expected`. """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(_swap_sql(), [
+                target, now, order_id, expected,
+                ORDER_STATUS_CODES[expected], ORDER_STATUS_CODES[target], actor_id, now,
+            ])
+            return cursor.rowcount == 1
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, status=expected).update(status=target, updated_at=now):
+            return False
+        record_transitions([order_id], expected, target, actor_id, now)
+        return True
+
+
+def transition(order, target, actor=None):
+    """
+    Move `order` from the status last read into it to `target`, and return
+    the status it actually moved from.
+
+    If another request changed the order first, the move is retried from
+    the new status when that allows it; otherwise, or if the order is gone,
+    InvalidTransition is raised. On success the instance's status and
+    updated_at are brought up to date. Call inside the transaction of any
+    side effects of the change.
+    """
+    status = order.status
+    now = timezone.now()
+    actor_id = getattr(actor, 'pk', actor)
+    while True:
+        if not can_transition(status, target):
+            raise InvalidTransition(order.pk, status, target)
+        if _swap(order.pk, status, target, actor_id, now):
+            break
+        status = Order.objects.filter(pk=order.pk).values_list('status', flat=True).first()
+    order.status, order.updated_at = target, now
+    return status
+
+
+def record_transitions(order_ids, from_status, to_status, actor_id=None, changed_at=None):
+    """ Append the same transition of many orders to the history with one INSERT. """
+    changed_at = changed_at or timezone.now()
+    OrderStatusChange.objects.bulk_create([
+        OrderStatusChange(
+            order_id=order_id, from_status=ORDER_STATUS_CODES[from_status], to_status=ORDER_STATUS_CODES[to_status],
+            actor_id=actor_id, changed_at=changed_at,
+        )
+        for order_id in order_ids
+    ])
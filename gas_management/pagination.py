@@ -0,0 +1,180 @@
+import json
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the full ordering tuple instead of
+    the first ordering field plus an offset.
+
+    The primary key is always appended as a tiebreaker, so every row has a
+    unique position and each page is a single indexed range scan
+    (`WHERE (a, id) < (:a, :id) ORDER BY a, id LIMIT n`) no matter how deep
+    the client pages. No `COUNT(*)` is ever issued.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-pk',)
+    tiebreaker = 'pk'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view))
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            # Follow the direction of the leading field so the composite
+            # index on (field, id) can be walked in one direction.
+            prefix = '-' if ordering[0].startswith('-') else ''
+            ordering.append(prefix + self.tiebreaker)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.position_fields = _ordering_fields(queryset, self.ordering)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._seek_filter(current_position, reverse))
+
+        # Fetch one extra row to find out whether there is a following page.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # An empty page past the end has no anchor row; restart from the top.
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            position = tokens.get('p', [None])[0]
+            if position is not None:
+                position = json.loads(position)
+                if not isinstance(position, list) or len(position) != len(self.ordering):
+                    raise ValueError('Cursor does not match the requested ordering')
+                # Values that cannot be compared with their column would only
+                # fail once the seek filter reaches the database
+                position = [
+                    value if value is None or field is None else field.to_python(value)
+                    for field, value in zip(self.position_fields, position)
+                ]
+        except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        if cursor.position is not None:
+            tokens['p'] = json.dumps(cursor.position, separators=(',', ':'))
+
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            attr_name = field.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[attr_name]
+            else:
+                value = getattr(instance, attr_name)
+            position.append(None if value is None else str(value))
+        return position
+
+    def _seek_filter(self, position, reverse):
+        """
+        Build the row-value comparison `(f1, f2, ...) > (p1, p2, ...)` as the
+        equivalent OR-of-ANDs, honouring the direction of each field.
+        """
+        seek = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            attr_name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            seek |= Q(**equal, **{'%s__%s' % (attr_name, lookup): value})
+            equal[attr_name] = value
+        return seek
+
+
+def _ordering_fields(queryset, ordering):
+    """ The model field or annotation output field behind each ordering term, or None if unknown. """
+    fields = []
+    for term in ordering:
+        name = term.lstrip('-')
+        if name in queryset.query.annotations:
+            fields.append(queryset.query.annotations[name].output_field)
+            continue
+        try:
+            fields.append(queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name))
+        except FieldDoesNotExist:
+            fields.append(None)
+    return fields
+
+
+def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+class InventoryCursorPagination(KeysetCursorPagination):
+    """Newest stock first, matching `GasInventory.Meta.ordering`."""
+    ordering = ('-date_added', '-pk')
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """Newest first for orders, invoices, payments and ratings."""
+    ordering = ('-created_at', '-pk')
@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from .models import UserProfile
+from .authentication import get_principal
 
 class IsBuyer(permissions.BasePermission):
     """
@@ -10,11 +10,7 @@ class IsBuyer(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
             
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            return profile.role == 'BUYER'
-        except UserProfile.DoesNotExist:
-            return False
+        return get_principal(request).role == 'BUYER'
 
 class IsSeller(permissions.BasePermission):
     """
@@ -25,22 +21,14 @@ class IsSeller(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
             
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            return profile.role == 'SELLER'
-        except UserProfile.DoesNotExist:
-            return False
+        return get_principal(request).role == 'SELLER'
 
 class IsAdmin(permissions.BasePermission):
     """
     Custom permission to only allow admins to approve orders and invoices.
     """
     def has_permission(self, request, view):
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            return profile.role == 'ADMIN'
-        except UserProfile.DoesNotExist:
-            return False
+        return get_principal(request).role == 'ADMIN'
 
 class IsSellerOrReadOnly(permissions.BasePermission):
     """
@@ -59,21 +47,20 @@ class IsBuyerOrSellerOrAdmin(permissions.BasePermission):
     Permission to allow only the buyer, seller, or admin to access the order.
     """
     def has_object_permission(self, request, view, obj):
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            
-            # Admin can access anything
-            if profile.role == 'ADMIN':
-                return True
-                
-            # Buyer can access their own orders
-            if obj.buyer == request.user:
-                return True
-                
-            # Seller can access orders for their inventory
-            if obj.gas_inventory.seller == request.user:
-                return True
-                
+        principal = get_principal(request)
+        if principal.role is None:
             return False
-        except UserProfile.DoesNotExist:
-            return False
\ No newline at end of file
+            
+        # Admin can access anything
+        if principal.is_admin:
+            return True
+            
+        # Buyer can access their own orders
+        if obj.buyer_id == request.user.pk:
+            return True
+            
+        # Seller can access orders for their inventory
+        if obj.gas_inventory.seller_id == request.user.pk:
+            return True
+            
+        return False
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+PostgreSQL database backend that keeps connections in a per-process pool.
+
+Set ENGINE to 'gas_management.postgresql_pool' and size the pool with the
+optional POOL dict of the database settings (see gas_management.connection_pool
+for the keys and defaults). Leave CONN_MAX_AGE at 0: Django then "closes" the
+connection at the end of every request, which hands it back to the pool.
+"""
+from functools import partial
+
+import psycopg2.extras
+from psycopg2 import extensions
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+from ..connection_pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+
+def _connect(conn_params):
+    connection = base.Database.connect(**conn_params)
+    # As the stock backend does, so JSONField values skip a decode round trip
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def _is_idle(connection):
+    return not connection.closed and connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not connection.autocommit:
+        connection.rollback()
+
+
+def _pool_key(conn_params):
+    return tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+
+
+def _pool_label(conn_params):
+    return '{}@{}:{}/{}'.format(
+        conn_params.get('user', ''), conn_params.get('host', ''),
+        conn_params.get('port', ''), conn_params['database'],
+    )
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # Pooled connections to a database block DROP DATABASE and its use as a template
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(_pool_key(conn_params), partial(
+            ConnectionPool, partial(_connect, conn_params), _is_idle, _ping,
+            self.settings_dict.get('POOL'), _pool_label(conn_params),
+        ))
+        try:
+            connection = self.pool.acquire()
+        except PoolTimeout as exc:
+            raise base.Database.OperationalError(str(exc)) from exc
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Django keeps this connection object, marked unusable, until the
+            # block exits, so it cannot go back to the pool
+            self.pool.discard(self.connection)
+            return
+        if not self.connection.closed and not _is_idle(self.connection):
+            try:
+                self.connection.rollback()
+            except base.Database.Error:
+                pass
+        # A connection still broken after that is closed rather than pooled
+        self.pool.release(self.connection)
@@ -0,0 +1,157 @@
+"""
+Read-only list output built from a `values()` projection.
+
+Serializing a page of model instances through `ModelSerializer` spends
+most of its time in per-field machinery rather than in the database. A
+`Projection` compiles a serializer's readable fields once into the
+`values()` paths they read and a formatter for each, then builds the same
+dicts the serializer would from plain rows: decimals quantized and
+stringified, datetimes in ISO 8601, relations as primary keys.
+"""
+import decimal
+import math
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+_projections = {}
+_lock = threading.Lock()
+
+
+def plain_float(value):
+    """
+    Whether a float prints the same from every JSON encoder: finite and
+    without an exponent, which encoders spell differently.
+    """
+    return value == 0 or (math.isfinite(value) and 1e-4 <= abs(value) < 1e16)
+
+
+def _decimal_formatter(field):
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def format_decimal(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return format(value.quantize(quantum, rounding=rounding, context=context), 'f')
+    return format_decimal
+
+
+def _format_datetime(value, zone):
+    value = value.astimezone(zone).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _formatter(field):
+    """ A function turning a database value into the field's output, or None when it is passed through as is. """
+    if isinstance(field, (serializers.ReadOnlyField, serializers.PrimaryKeyRelatedField,
+                          serializers.IntegerField, serializers.CharField,
+                          serializers.ChoiceField, serializers.BooleanField)):
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None:
+            return field.to_representation
+        return None
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.DecimalField):
+        if (field.decimal_places is None or field.localize or getattr(field, 'normalize_output', False)
+                or not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)):
+            return field.to_representation
+        return _decimal_formatter(field)
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if settings.USE_TZ and not hasattr(field, 'timezone') and str(output_format).lower() == ISO_8601:
+            return _format_datetime
+    return field.to_representation
+
+
+class Projection:
+    """
+    The list output of one serializer class, built from `values()` rows.
+
+    Plain, related and read-only fields are supported. A
+    SerializerMethodField must be described in the serializer's
+    `projected_method_fields` as a dict of output keys to `values()` paths,
+    whose raw values make up its output, as the method would return them.
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class(context={})
+        method_fields = getattr(serializer_class, 'projected_method_fields', {})
+        self.paths = []
+        # (output name, values() path or {key: path}, formatter)
+        self.accessors = []
+        self.float_fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in method_fields:
+                    raise ImproperlyConfigured(
+                        f'{serializer_class.__name__}.projected_method_fields has no entry for "{name}".'
+                    )
+                self.paths.extend(method_fields[name].values())
+                self.accessors.append((name, dict(method_fields[name]), None))
+                continue
+            if field.source == '*' or isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{name} cannot be built from a values() projection.'
+                )
+            path = '__'.join(field.source_attrs)
+            formatter = _formatter(field)
+            if formatter is float:
+                self.float_fields.append(name)
+            self.paths.append(path)
+            self.accessors.append((name, path, formatter))
+
+    def queryset(self, queryset, ordering=(), extra=()):
+        """
+        `queryset` as values() rows carrying every projected path, the
+        `ordering` fields a cursor needs and any `extra` paths.
+        """
+        paths = list(dict.fromkeys(self.paths + [field.lstrip('-') for field in ordering] + list(extra)))
+        return queryset.values(*paths)
+
+    def serialize(self, rows):
+        """
+        The serializer's output for each row, and whether every float in it
+        is plain, so any JSON encoder renders it the same.
+        """
+        # The active time zone is looked up once per page, not per value
+        zone = timezone.get_current_timezone()
+        accessors = [
+            (name, path, partial(_format_datetime, zone=zone) if formatter is _format_datetime else formatter)
+            for name, path, formatter in self.accessors
+        ]
+        items = []
+        for row in rows:
+            item = {}
+            for name, path, formatter in accessors:
+                if type(path) is dict:
+                    item[name] = {key: row[source] for key, source in path.items()}
+                    continue
+                value = row[path]
+                item[name] = value if value is None or formatter is None else formatter(value)
+            items.append(item)
+        plain = all(
+            item[name] is None or plain_float(item[name]) for item in items for name in self.float_fields
+        )
+        return items, plain
+
+
+def projection_for(serializer_class):
+    """ The compiled Projection of `serializer_class`, shared by every request. """
+    projection = _projections.get(serializer_class)
+    if projection is None:
+        with _lock:
+            projection = _projections.get(serializer_class)
+            if projection is None:
+                projection = _projections[serializer_class] = Projection(serializer_class)
+    return projection
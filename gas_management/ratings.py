@@ -0,0 +1,81 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .catalogue_cache import invalidate_catalogue
+from .models import ArchivedRating, UserProfile, GasInventory, Rating
+
+
+def average_rating(rating_sum, rating_count):
+    """ The average stored on inventory rows: two decimal places, 0 when unrated. """
+    if not rating_count:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def seller_rating_fields(seller_id):
+    """ The seller_rating/seller_rating_count values a new inventory row of `seller_id` should carry. """
+    totals = UserProfile.objects.filter(user_id=seller_id).values_list('rating_sum', 'rating_count').first()
+    rating_sum, rating_count = totals or (0, 0)
+    return {'seller_rating': average_rating(rating_sum, rating_count), 'seller_rating_count': rating_count}
+
+
+def _copy_to_inventory(seller_id, rating_sum, rating_count):
+    # Only rows whose copy is out of date are written, and those get a new
+    # last_updated like any other change to what the catalogue shows
+    rating = average_rating(rating_sum, rating_count)
+    GasInventory.objects.filter(seller_id=seller_id).exclude(
+        seller_rating=rating, seller_rating_count=rating_count,
+    ).update(seller_rating=rating, seller_rating_count=rating_count, last_updated=timezone.now())
+
+
+def record_seller_rating(seller_id, count_delta, sum_delta):
+    """
+    Adjust a seller's rating totals and copy the new average onto their inventory.
+
+    The totals change in SQL, which also locks the profile row until the
+    surrounding transaction ends, so concurrent ratings of one seller
+    serialise and each copies a consistent average.
+    """
+    UserProfile.objects.filter(user_id=seller_id).update(
+        rating_count=F('rating_count') + count_delta,
+        rating_sum=F('rating_sum') + sum_delta,
+    )
+    rating_sum, rating_count = UserProfile.objects.filter(user_id=seller_id).values_list(
+        'rating_sum', 'rating_count'
+    ).get()
+    _copy_to_inventory(seller_id, rating_sum, rating_count)
+    invalidate_catalogue()
+
+
+def rebuild_seller_ratings():
+    """
+    Recompute every seller's rating totals from the Rating table and the
+    ratings of archived orders, and re-copy them onto inventory. Returns the
+    number of sellers whose totals changed.
+    """
+    totals = {}
+    for ratings in (Rating.objects.all(), ArchivedRating.objects.all()):
+        for seller_id, rating_count, rating_sum in (
+            ratings.values('order__gas_inventory__seller_id')
+            .annotate(rating_count=Count('pk'), rating_sum=Sum('rating'))
+            .values_list('order__gas_inventory__seller_id', 'rating_count', 'rating_sum')
+        ):
+            stored_sum, stored_count = totals.get(seller_id, (0, 0))
+            totals[seller_id] = (stored_sum + rating_sum, stored_count + rating_count)
+    changed = 0
+    with transaction.atomic():
+        profiles = UserProfile.objects.select_for_update().filter(role='SELLER').values_list(
+            'user_id', 'rating_sum', 'rating_count'
+        )
+        for seller_id, stored_sum, stored_count in profiles:
+            rating_sum, rating_count = totals.get(seller_id, (0, 0))
+            if (stored_sum, stored_count) != (rating_sum, rating_count):
+                changed += 1
+                UserProfile.objects.filter(user_id=seller_id).update(rating_sum=rating_sum, rating_count=rating_count)
+            # Inventory is re-copied even for unchanged sellers, since it can drift on its own
+            _copy_to_inventory(seller_id, rating_sum, rating_count)
+    invalidate_catalogue()
+    return changed
@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+
+from .projections import plain_float
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+
+def _default(value):
+    # DRF's encoder writes decimals as floats; anything else, or a float
+    # orjson would spell differently, goes back to the stock renderer
+    if isinstance(value, Decimal):
+        number = float(value)
+        if plain_float(number):
+            return number
+    raise TypeError
+
+
+class ProjectedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes responses built from a Projection (marked
+    `response.projected`) with orjson when it is installed. Projected data
+    holds only strings, numbers and dicts, which orjson writes byte for byte
+    as the stdlib encoder does with DRF's compact, UTF-8 settings; every
+    other response, or a request for indented output, renders as before.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response')
+        if (orjson is None or data is None or not getattr(response, 'projected', False)
+                or not self.compact or self.ensure_ascii or not self.strict
+                or self.get_indent(accepted_media_type, renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=_default)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
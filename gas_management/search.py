@@ -0,0 +1,112 @@
+import bisect
+import difflib
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from rest_framework import filters
+
+from .models import SearchLexeme
+
+SEARCH_CONFIG = 'simple'
+LEXICON_KEY = 'gas_management:search:lexicon'
+# New words reach the spelling lexicon within this many seconds
+LEXICON_TIMEOUT = 300
+# Terms shorter than this are only ever prefix-matched, never corrected
+MIN_CORRECTABLE_LENGTH = 4
+MAX_CORRECTIONS = 3
+# difflib similarity ratio a lexicon word needs to count as a correction
+CORRECTION_CUTOFF = 0.75
+
+WORD_RE = re.compile(r'\w+')
+
+
+def full_text_enabled(queryset):
+    return (
+        getattr(settings, 'CATALOGUE_FULL_TEXT_SEARCH', True)
+        and connections[queryset.db].vendor == 'postgresql'
+    )
+
+
+def search_lexicon():
+    """ The sorted spelling lexicon, shared through the cache. """
+    words = cache.get(LEXICON_KEY)
+    if words is None:
+        words = sorted(SearchLexeme.objects.values_list('word', flat=True))
+        cache.set(LEXICON_KEY, words, LEXICON_TIMEOUT)
+    return words
+
+
+def _has_prefix(words, prefix):
+    index = bisect.bisect_left(words, prefix)
+    return index < len(words) and words[index].startswith(prefix)
+
+
+def corrections(word, words):
+    """ Lexicon words a misspelt `word` most likely meant, best first. """
+    if len(word) < MIN_CORRECTABLE_LENGTH or _has_prefix(words, word):
+        return []
+    # A typo rarely changes a word's length by more than two letters
+    nearby = [candidate for candidate in words if abs(len(candidate) - len(word)) <= 2]
+    return difflib.get_close_matches(word, nearby, n=MAX_CORRECTIONS, cutoff=CORRECTION_CUTOFF)
+
+
+def build_tsquery(terms, words):
+    """
+    A raw tsquery that requires every term. Each term matches any word it
+    begins, and a term matching no indexed word also accepts its closest
+    spelling corrections: ["nairboi", "west"] becomes
+    "(nairboi:* | nairobi) & west:*".
+    """
+    clauses = []
+    for term in terms:
+        for word in WORD_RE.findall(term.lower()):
+            options = [f'{word}:*'] + corrections(word, words)
+            clauses.append(options[0] if len(options) == 1 else f"({' | '.join(options)})")
+    return ' & '.join(clauses)
+
+
+class CatalogueSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search for the catalogue's `search` parameter.
+
+    On PostgreSQL the terms are matched against the trigger-maintained
+    `search_vector` column through its GIN index, with prefix matching and
+    spelling correction, and results are annotated with `search_rank`.
+    Without an explicit `ordering` the best matches come first. Elsewhere,
+    or with CATALOGUE_FULL_TEXT_SEARCH off, it is DRF's SearchFilter:
+    unranked `icontains` over `search_fields`.
+    """
+
+    def ranked(self, request, queryset):
+        # Terms without a single word character (say "-") have no lexemes
+        # and keep matching literally through icontains
+        words = any(WORD_RE.search(term) for term in self.get_search_terms(request))
+        return words and full_text_enabled(queryset)
+
+    def filter_queryset(self, request, queryset, view):
+        if not self.ranked(request, queryset):
+            return super().filter_queryset(request, queryset, view)
+
+        raw = build_tsquery(self.get_search_terms(request), search_lexicon())
+        query = SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+        # ts_rank() is a float4 that reaches Python rounded to its shortest
+        # text form; as a double it round-trips exactly through the cursor
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(search_rank=rank)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        The ordering the cursor paginator should use: an explicit `ordering`
+        wins, then relevance for a ranked search, then the paginator's default.
+        """
+        ordering = filters.OrderingFilter().get_ordering(request, queryset, view)
+        if ordering:
+            return ordering
+        if self.ranked(request, queryset):
+            return ('-search_rank',)
+        return None
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import UserProfile, GasInventory, Order, Invoice, Payment, Rating
+from .models import (
+    UserProfile, GasInventory, Order, OrderStatusChange, Invoice, Payment, Rating,
+    ArchivedOrder, ArchivedInvoice, ArchivedPayment, ArchivedRating,
+)
+from .ratings import seller_rating_fields
 
 class UserSerializer(serializers.ModelSerializer):
     """ Serializer for User model to include basic user information. """
@@ -23,11 +27,22 @@ class GasInventorySerializer(serializers.ModelSerializer):
     class Meta:
         model = GasInventory
         fields = ['id', 'brand', 'weight_kg', 'quantity', 'unit_price', 
-                 'seller', 'seller_name', 'location', 'date_added', 'last_updated']
-        read_only_fields = ['seller']
+                 'seller', 'seller_name', 'seller_rating', 'seller_rating_count',
+                 'location', 'latitude', 'longitude', 'date_added', 'last_updated']
+        read_only_fields = ['seller', 'seller_rating', 'seller_rating_count']
+    
+    def validate(self, attrs):
+        # A partial update may send one coordinate; the other comes from the stored row
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError('latitude and longitude must be given together.')
+        return attrs
     
     def create(self, validated_data):
         validated_data['seller'] = self.context['request'].user
+        # New stock starts with the seller's current reputation
+        validated_data.update(seller_rating_fields(validated_data['seller'].pk))
         return super().create(validated_data)
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -43,6 +58,16 @@ class OrderSerializer(serializers.ModelSerializer):
                  'delivery_address', 'contact_phone', 'created_at', 'updated_at']
         read_only_fields = ['buyer', 'total_price', 'status']
     
+    # The values() paths get_gas_details reads, for the projected list mode; see projections
+    projected_method_fields = {
+        'gas_details': {
+            'brand': 'gas_inventory__brand',
+            'weight_kg': 'gas_inventory__weight_kg',
+            'unit_price': 'gas_inventory__unit_price',
+            'location': 'gas_inventory__location',
+        },
+    }
+    
     def get_gas_details(self, obj):
         return {
             'brand': obj.gas_inventory.brand,
@@ -62,6 +87,15 @@ class OrderSerializer(serializers.ModelSerializer):
         
         return super().create(validated_data)
 
+class OrderStatusChangeSerializer(serializers.ModelSerializer):
+    """ Serializer for one entry of an order's status history. """
+    from_status = serializers.CharField(source='get_from_status_display')
+    to_status = serializers.CharField(source='get_to_status_display')
+    
+    class Meta:
+        model = OrderStatusChange
+        fields = ['from_status', 'to_status', 'actor', 'changed_at']
+
 class InvoiceSerializer(serializers.ModelSerializer):
     """ Serializer for Invoice model to manage invoices related to orders. """
     order_details = OrderSerializer(source='order', read_only=True)
@@ -92,6 +126,39 @@ class RatingSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'buyer_name', 'seller_name', 'rating', 'comment', 'created_at']
         read_only_fields = ['created_at']
 
+class ArchivedPaymentSerializer(serializers.ModelSerializer):
+    """ Serializer for the payment of an archived invoice. """
+    
+    class Meta:
+        model = ArchivedPayment
+        fields = ['id', 'amount', 'status', 'transaction_id', 'payment_method', 'created_at', 'updated_at']
+
+class ArchivedInvoiceSerializer(serializers.ModelSerializer):
+    """ Serializer for an archived order's invoice, with its payment if one was made. """
+    payment = ArchivedPaymentSerializer(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = ArchivedInvoice
+        fields = ['id', 'invoice_number', 'is_paid', 'payment_date', 'admin_approval',
+                  'admin_approval_date', 'created_at', 'payment']
+
+class ArchivedRatingSerializer(serializers.ModelSerializer):
+    """ Serializer for the rating of an archived order. """
+    
+    class Meta:
+        model = ArchivedRating
+        fields = ['id', 'rating', 'comment', 'created_at']
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """ Read-only serializer for an archived order with its invoice, payment and rating. """
+    invoice = ArchivedInvoiceSerializer(read_only=True, allow_null=True)
+    rating = ArchivedRatingSerializer(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'gas_inventory', 'buyer', 'quantity', 'total_price', 'status', 'delivery_address',
+                  'contact_phone', 'created_at', 'updated_at', 'archived_at', 'invoice', 'rating']
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """ Serializer for user registration including additional fields for user profile. """
     password = serializers.CharField(write_only=True)
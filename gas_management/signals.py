@@ -1,15 +1,26 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.utils import timezone
-from .models import Order, Invoice
+from .models import UserProfile, GasInventory
+from .authentication import invalidate_identity, mark_role_changed
+from .catalogue_cache import invalidate_catalogue
 
-@receiver(post_save, sender=Order)
-def create_invoice_when_order_approved(sender, instance, created, **kwargs):
-    # Only create invoice when order is approved
-    if instance.status == 'APPROVED' and not Invoice.objects.filter(order=instance).exists():
-        Invoice.objects.create(
-            order=instance,
-            amount=instance.total_amount,
-            due_date=timezone.now() + timezone.timedelta(days=7),
-            admin_approval=False
-        )
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_role_claims(sender, instance, created=False, **kwargs):
+    # Tokens issued before a role change must no longer be trusted for their role claim
+    if not created:
+        mark_role_changed(instance.user_id)
+    invalidate_identity(instance.user_id)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes; ids can also be reused after a delete
+    invalidate_identity(instance.pk)
+
+@receiver(post_save, sender=GasInventory)
+@receiver(post_delete, sender=GasInventory)
+def invalidate_cached_catalogue(sender, instance, **kwargs):
+    # Queryset .update() and bulk_create() bypass this; their callers invalidate explicitly
+    invalidate_catalogue()
@@ -0,0 +1,62 @@
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .catalogue_cache import invalidate_catalogue
+from .models import GasInventory
+
+
+class InsufficientStock(Exception):
+    """ Raised when a stock movement would take an inventory row below zero. """
+
+    def __init__(self, inventory_id, requested):
+        self.inventory_id = inventory_id
+        self.requested = requested
+        super().__init__(f'Gas inventory {inventory_id} has fewer than {requested} units in stock')
+
+
+def take_stock(inventory_id, quantity):
+    """
+    Remove `quantity` units from an inventory row in a single conditional UPDATE.
+
+    The database checks and decrements in one statement
+    (`SET quantity = quantity - n WHERE quantity >= n`), so concurrent
+    callers can never oversell. Call it inside the same transaction as the
+    status change it pays for so both commit or roll back together.
+    """
+    updated = GasInventory.objects.filter(pk=inventory_id, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity,
+        last_updated=timezone.now(),
+    )
+    if not updated:
+        raise InsufficientStock(inventory_id, quantity)
+    invalidate_catalogue()
+
+
+def return_stock(inventory_id, quantity):
+    """ Put `quantity` units back on an inventory row, e.g. when an approved order is cancelled. """
+    GasInventory.objects.filter(pk=inventory_id).update(
+        quantity=F('quantity') + quantity,
+        last_updated=timezone.now(),
+    )
+    invalidate_catalogue()
+
+
+def take_stock_many(quantities):
+    """
+    Remove stock from several inventory rows in one UPDATE.
+
+    `quantities` maps inventory id to the units to take. Unlike take_stock()
+    this does not check the amounts itself: the caller must already hold row
+    locks on those inventory rows and have allocated against the locked
+    quantities (the quantity column's CHECK constraint is the backstop).
+    """
+    if not quantities:
+        return
+    GasInventory.objects.filter(pk__in=quantities).update(
+        quantity=F('quantity') - Case(
+            *[When(pk=inventory_id, then=Value(quantity)) for inventory_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        ),
+        last_updated=timezone.now(),
+    )
+    invalidate_catalogue()
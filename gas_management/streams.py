@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .events import DEFAULT_QUEUE_SIZE, ORDER_STATUS_EVENT, broker, get_backend
+
+ORDER_EVENTS_PATH = '/api/v1/events/orders/'
+DEFAULT_KEEPALIVE = 15
+# Milliseconds a disconnected EventSource waits before reconnecting
+RECONNECT_MS = 5000
+
+
+class StreamAuthError(Exception):
+    """ Raised when a stream request carries no usable access token. """
+
+
+def _raw_token(scope):
+    # EventSource cannot set headers, so browsers pass the token as ?token=
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+                return parts[1]
+            raise StreamAuthError('Authorization header must contain two space-delimited values.')
+    tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+    if tokens:
+        return tokens[0]
+    raise StreamAuthError('Authentication credentials were not provided.')
+
+
+def _is_active(user_id):
+    return User.objects.filter(pk=user_id, is_active=True).exists()
+
+
+async def authenticate(scope):
+    """ The user id of a valid access token on the request, with one query to check the account is active. """
+    try:
+        token = AccessToken(_raw_token(scope))
+    except TokenError:
+        raise StreamAuthError('Given token not valid for any token type')
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None or not await sync_to_async(_is_active)(user_id):
+        raise StreamAuthError('User not found or inactive.')
+    return user_id, token['exp']
+
+
+def encode_event(event):
+    return f'event: {ORDER_STATUS_EVENT}\ndata: {json.dumps(event)}\n\n'.encode()
+
+
+async def _respond(send, status, detail):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
+
+
+async def _disconnected(receive, subscription):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    subscription.close()
+
+
+async def order_events(scope, receive, send):
+    """
+    ASGI app streaming the caller's order status changes as Server-Sent Events.
+
+    Every approve, reject, cancel and delivery of an order the caller buys
+    or sells arrives as an `order_status` event. An idle stream is this
+    coroutine and one waiting on `receive`, with a comment sent every
+    ORDER_EVENTS_KEEPALIVE seconds to keep proxies from closing it. The
+    stream ends when the access token expires or the stream falls too far
+    behind; the client reconnects with a fresh token.
+    """
+    if scope['method'] != 'GET':
+        await _respond(send, 405, f'Method "{scope["method"]}" not allowed.')
+        return
+    try:
+        user_id, expires_at = await authenticate(scope)
+    except StreamAuthError as exc:
+        await _respond(send, 401, str(exc))
+        return
+
+    keepalive = getattr(settings, 'ORDER_EVENTS_KEEPALIVE', DEFAULT_KEEPALIVE)
+    get_backend().listen()
+    subscription = broker.subscribe(user_id, getattr(settings, 'ORDER_EVENTS_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+    disconnect = asyncio.ensure_future(_disconnected(receive, subscription))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Stop nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': f'retry: {RECONNECT_MS}\n\n'.encode(), 'more_body': True})
+
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                break
+            events = await subscription.next_events(min(keepalive, remaining))
+            if subscription.closed:
+                return
+            body = b''.join(encode_event(event) for event in events) or b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            if subscription.overflowed:
+                break
+
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnect.cancel()
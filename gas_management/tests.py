@@ -1,9 +1,60 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import re
+import math
+import os
+import tempfile
+import threading
+from base64 import b64encode
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import UserProfile, GasInventory, Order, Invoice
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from .models import (
+    UserProfile, GasInventory, Order, Invoice, InvoiceOutbox, Payment, Rating, SellerDailySales, SearchLexeme,
+    IdempotencyKey, OrderStatusChange, ArchivedOrder, ArchivedInvoice, ArchivedPayment, ArchivedRating
+)
+from .stock import InsufficientStock, take_stock
+from .invoicing import drain_batch, drain_outbox
+from .invoice_numbers import BlockAllocator, SEQUENCE, next_invoice_numbers
+from .catalogue_cache import stats as catalogue_cache_stats
+from .geo import cell_ranges, encode, haversine_km
+from .search import build_tsquery
+from .events import broker
+from .connection_pool import ConnectionPool, PoolTimeout
+from .metrics import Histogram
+from .benchmarks import compare
+from .benchmarks.fixtures import ensure_inventory, ensure_orders
+from .projections import Projection
+from .ratings import rebuild_seller_ratings, record_seller_rating
+from .authentication import user_cache
+from .idempotency import purge_expired_keys
+from .order_states import InvalidTransition, transition
+from . import archive
+from .archive import archive_orders
+from .analytics import rebuild_sales
+from .serializers import GasInventorySerializer, OrderSerializer, InvoiceSerializer
+from .streams import ORDER_EVENTS_PATH
+from backend.asgi import application as asgi_application
 
 class EndpointTests(TestCase):
     def setUp(self):
@@ -39,32 +90,34 @@ class EndpointTests(TestCase):
         # Create a test invoice for the order
         self.invoice = Invoice.objects.create(
             order=self.order,
-            amount=2000,
             admin_approval=False,
             is_paid=False
         )
         
         # Setup API client
         self.client = APIClient()
+        cache.clear()
         
     def test_gas_inventory_list(self):
         """Test that gas inventory listing works"""
+        self.client.force_authenticate(user=self.buyer_user)
         url = reverse('v1-gas-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Should have our test inventory
+        self.assertEqual(len(response.data['results']), 1)  # Should have our test inventory
         
     def test_gas_inventory_filter(self):
         """Test filtering gas inventory by brand"""
+        self.client.force_authenticate(user=self.buyer_user)
         url = reverse('v1-gas-list')
         response = self.client.get(url, {'brand': 'TestBrand'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
         
         # Test with a non-existent brand
         response = self.client.get(url, {'brand': 'NonExistentBrand'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
         
     def test_order_creation_buyer(self):
         """Test that a buyer can create an order"""
@@ -73,6 +126,8 @@ class EndpointTests(TestCase):
         data = {
             'gas_inventory': self.inventory.id,
             'quantity': 1,
+            'delivery_address': '12 Moi Avenue',
+            'contact_phone': '0700000000',
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -212,4 +267,2497 @@ class EndpointTests(TestCase):
         
         # Verify the invoice has not been marked as paid
         self.invoice.refresh_from_db()
-        self.assertFalse(self.invoice.is_paid) 
\ No newline at end of file
+        self.assertFalse(self.invoice.is_paid)
+
+
+# These exercise the database path, which the catalogue cache would otherwise hide
+@override_settings(CATALOGUE_CACHE_TIMEOUT=0)
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        for i in range(7):
+            GasInventory.objects.create(
+                seller=self.seller_user,
+                brand='JIBU',
+                weight_kg=6.0,
+                quantity=5,
+                unit_price=1000 + (i % 2) * 500,
+                location=f'Depot {i}'
+            )
+        # Identical timestamps force the paginator onto the id tiebreaker
+        GasInventory.objects.update(date_added=timezone.now())
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        
+    def walk(self, url, params):
+        """Follow `next` links and return every id seen, page by page."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data['next']:
+                return pages, response
+            response = self.client.get(response.data['next'])
+            
+    def test_pages_cover_every_row_once(self):
+        """Test that walking the cursor visits each row exactly once in order"""
+        pages, _ = self.walk(reverse('v1-gas-list'), {'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        
+        ids = [item_id for page in pages for item_id in page]
+        expected = list(GasInventory.objects.order_by('-date_added', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        
+    def test_ordering_param_uses_id_tiebreaker(self):
+        """Test that client orderings with duplicate values still page cleanly"""
+        pages, _ = self.walk(reverse('v1-gas-list'), {'page_size': 2, 'ordering': 'unit_price'})
+        ids = [item_id for page in pages for item_id in page]
+        expected = list(GasInventory.objects.order_by('unit_price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        
+    def test_previous_link_returns_prior_page(self):
+        """Test that the previous cursor walks back to the same rows"""
+        url = reverse('v1-gas-list')
+        first = self.client.get(url, {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']]
+        )
+        self.assertIsNone(back.data['previous'])
+        
+    def test_no_count_query(self):
+        """Test that paginated listings never run COUNT(*)"""
+        url = reverse('v1-gas-list')
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(url, {'page_size': 3})
+            self.client.get(first.data['next'])
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+        
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is rejected"""
+        response = self.client.get(reverse('v1-gas-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        # Well-formed, but holding values the ordering's columns cannot take
+        for position in ('["garbage",1]', '["2024-01-01T00:00:00+00:00","x"]', '[{},1]'):
+            cursor = b64encode(urlencode({'p': position}).encode()).decode()
+            response = self.client.get(reverse('v1-gas-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+    def test_custom_actions_are_paginated(self):
+        """Test that my_orders and seller_orders return cursor pages"""
+        inventory = GasInventory.objects.first()
+        for _ in range(4):
+            Order.objects.create(
+                buyer=self.buyer_user,
+                gas_inventory=inventory,
+                quantity=1,
+                total_price=1000
+            )
+        pages, _ = self.walk(reverse('order-my-orders'), {'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 1])
+        
+        self.client.force_authenticate(user=self.seller_user)
+        pages, _ = self.walk(reverse('v1-seller-orders'), {'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 1])
+
+
+@override_settings(CATALOGUE_CACHE_TIMEOUT=0)
+class QueryBudgetTests(TestCase):
+    """Each listing must issue a fixed number of queries however many rows it returns."""
+    
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        self.client = APIClient()
+        
+    def add_rows(self, count):
+        for _ in range(count):
+            inventory = GasInventory.objects.create(
+                seller=self.seller_user,
+                brand='MERU',
+                weight_kg=13.0,
+                quantity=10,
+                unit_price=4500,
+                location='Mombasa'
+            )
+            order = Order.objects.create(
+                buyer=self.buyer_user,
+                gas_inventory=inventory,
+                quantity=1,
+                total_price=4500,
+                status='DELIVERED'
+            )
+            invoice = Invoice.objects.create(order=order, is_paid=True)
+            Payment.objects.create(invoice=invoice, amount=4500, status='COMPLETED', payment_method='Cash')
+            Rating.objects.create(order=order, rating=4)
+            
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), len(response.data['results'])
+        
+    def assertFixedBudget(self, user, url):
+        self.client.force_authenticate(user=user)
+        self.add_rows(2)
+        small, small_rows = self.count_queries(url)
+        self.add_rows(10)
+        large, large_rows = self.count_queries(url)
+        self.assertGreater(large_rows, small_rows)
+        self.assertEqual(small, large, f'{url} issues more queries as rows grow')
+        
+    def test_inventory_list(self):
+        self.assertFixedBudget(self.buyer_user, reverse('v1-gas-list'))
+        
+    def test_my_inventory(self):
+        self.assertFixedBudget(self.seller_user, reverse('gas-inventory-my-inventory'))
+        
+    def test_order_list(self):
+        self.assertFixedBudget(self.admin_user, reverse('order-list'))
+        
+    def test_my_orders(self):
+        self.assertFixedBudget(self.buyer_user, reverse('order-my-orders'))
+        
+    def test_seller_orders(self):
+        self.assertFixedBudget(self.seller_user, reverse('v1-seller-orders'))
+        
+    def test_invoice_list(self):
+        self.assertFixedBudget(self.buyer_user, reverse('invoice-list'))
+        
+    def test_payment_list(self):
+        self.assertFixedBudget(self.admin_user, reverse('payment-list'))
+        
+    def test_rating_list(self):
+        self.assertFixedBudget(self.seller_user, reverse('rating-list'))
+
+
+class RolePrincipalTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.admin_profile = UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user,
+            brand='TOTAL',
+            weight_kg=6.0,
+            quantity=10,
+            unit_price=1000,
+            location='Kisumu'
+        )
+        self.order = Order.objects.create(
+            buyer=self.buyer_user,
+            gas_inventory=self.inventory,
+            quantity=2,
+            total_price=2000
+        )
+        Invoice.objects.create(order=self.order)
+        self.client = APIClient()
+        cache.clear()
+        
+    def login(self, username):
+        response = self.client.post(reverse('login'), {'username': username, 'password': 'password123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        return response.data
+        
+    def profile_queries(self, queries):
+        return [q for q in queries.captured_queries if 'gas_management_userprofile' in q['sql']]
+        
+    def test_access_token_carries_role(self):
+        """Test that login embeds the role claim in the access token"""
+        tokens = self.login('admin')
+        self.assertEqual(AccessToken(tokens['access'])['role'], 'ADMIN')
+        
+    def test_refreshed_token_keeps_role(self):
+        """Test that refreshed access tokens keep the role claim"""
+        tokens = self.login('seller')
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(AccessToken(response.data['access'])['role'], 'SELLER')
+        
+    def test_approve_with_role_claim_skips_profile_lookup(self):
+        """Test that a token-authenticated approval never queries UserProfile"""
+        self.login('admin')
+        url = reverse('order-approve', args=[self.order.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.profile_queries(queries), [])
+        
+    def test_role_resolved_once_without_claim(self):
+        """Test that the profile fallback runs at most once per request"""
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse('order-approve', args=[self.order.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.profile_queries(queries)), 1)
+        
+    def test_role_change_invalidates_claim(self):
+        """Test that a demoted admin cannot keep approving with an old token"""
+        self.login('admin')
+        self.admin_profile.role = 'BUYER'
+        self.admin_profile.save()
+        
+        # As a buyer who is not party to the order it is no longer visible at all
+        url = reverse('order-approve', args=[self.order.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'PENDING')
+        
+    def test_refresh_reads_current_role(self):
+        """Test that a refreshed access token carries the role from the database, not the old claim"""
+        tokens = self.login('admin')
+        self.admin_profile.role = 'BUYER'
+        self.admin_profile.save()
+        # As in a process the role-change marker never reached
+        cache.clear()
+        
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(AccessToken(response.data['access'])['role'], 'BUYER')
+        response = self.client.post(reverse('order-approve', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StockMovementTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user,
+            brand='JIBU',
+            weight_kg=6.0,
+            quantity=5,
+            unit_price=1000,
+            location='Nakuru'
+        )
+        self.client = APIClient()
+        
+    def place_order(self, quantity):
+        order = Order.objects.create(
+            buyer=self.buyer_user,
+            gas_inventory=self.inventory,
+            quantity=quantity,
+            total_price=1000 * quantity
+        )
+        Invoice.objects.create(order=order)
+        return order
+        
+    def test_take_stock_is_conditional(self):
+        """Test that take_stock refuses to go below zero"""
+        take_stock(self.inventory.id, 5)
+        with self.assertRaises(InsufficientStock):
+            take_stock(self.inventory.id, 1)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 0)
+        
+    def test_approve_decrements_stock(self):
+        """Test that approval removes the ordered units"""
+        order = self.place_order(3)
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(reverse('order-approve', args=[order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 2)
+        
+    def test_approve_short_stock_conflicts(self):
+        """Test that approving more than is in stock is a 409 and changes nothing"""
+        order = self.place_order(6)
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(reverse('order-approve', args=[order.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        order.refresh_from_db()
+        self.inventory.refresh_from_db()
+        self.assertEqual(order.status, 'PENDING')
+        self.assertEqual(self.inventory.quantity, 5)
+        
+    def test_cancel_approved_returns_stock(self):
+        """Test that cancelling an approved order puts its units back"""
+        order = self.place_order(2)
+        self.client.force_authenticate(user=self.admin_user)
+        self.client.post(reverse('order-approve', args=[order.id]))
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.post(reverse('order-cancel', args=[order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 5)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockContentionTests(TransactionTestCase):
+    """Concurrent approvals against one inventory row must never oversell."""
+    
+    stock = 25
+    orders = 100
+    threads = 10
+    
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=seller_user, role='SELLER')
+        UserProfile.objects.create(user=buyer_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=seller_user,
+            brand='MERU',
+            weight_kg=13.0,
+            quantity=self.stock,
+            unit_price=4500,
+            location='Eldoret'
+        )
+        self.order_ids = []
+        for _ in range(self.orders):
+            order = Order.objects.create(
+                buyer=buyer_user,
+                gas_inventory=self.inventory,
+                quantity=1,
+                total_price=4500
+            )
+            Invoice.objects.create(order=order)
+            self.order_ids.append(order.id)
+            
+    def test_concurrent_approvals_do_not_oversell(self):
+        """Test that only as many orders as there are units get approved"""
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+        lock = threading.Lock()
+        
+        def approve(order_ids):
+            client = APIClient()
+            client.force_authenticate(user=self.admin_user)
+            barrier.wait()
+            try:
+                for order_id in order_ids:
+                    response = client.post(reverse('order-approve', args=[order_id]))
+                    with lock:
+                        outcomes.append(response.status_code)
+            finally:
+                connection.close()
+                
+        workers = [
+            threading.Thread(target=approve, args=(self.order_ids[i::self.threads],))
+            for i in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 0)
+        self.assertEqual(outcomes.count(status.HTTP_200_OK), self.stock)
+        self.assertEqual(outcomes.count(status.HTTP_409_CONFLICT), self.orders - self.stock)
+        self.assertEqual(Order.objects.filter(status='APPROVED').count(), self.stock)
+
+
+class InventoryImportTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        self.existing = GasInventory.objects.create(
+            seller=self.seller_user,
+            brand='JIBU',
+            weight_kg=6.0,
+            quantity=4,
+            unit_price=1000,
+            location='Thika Depot'
+        )
+        self.url = reverse('v1-seller-inventory-import')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.seller_user)
+        
+    def test_csv_creates_restocks_and_reports_errors(self):
+        """Test that a CSV import creates new rows, restocks matches and skips bad rows"""
+        body = (
+            'brand,weight_kg,quantity,unit_price,location\n'
+            'JIBU,6.0,10,1100,Thika Depot\n'
+            'MERU,13,5,4500,Thika Depot\n'
+            'NOPE,13,5,4500,Thika Depot\n'
+            'TOTAL,6,-1,900,Ruiru\n'
+        )
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['restocked'], 1)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [4, 5])
+        self.assertIn('brand', response.data['errors'][0]['errors'])
+        
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.quantity, 14)
+        self.assertEqual(self.existing.unit_price, 1100)
+        self.assertTrue(GasInventory.objects.filter(seller=self.seller_user, brand='MERU').exists())
+        
+    def test_ndjson_import(self):
+        """Test that NDJSON rows are imported and malformed lines are reported"""
+        body = '\n'.join([
+            json.dumps({'brand': 'TOTAL', 'weight_kg': '22.5', 'quantity': 3, 'unit_price': '7000', 'location': 'Ruiru'}),
+            '{not json',
+            json.dumps({'brand': 'TOTAL', 'weight_kg': '22.5', 'quantity': 2, 'unit_price': '7100', 'location': 'Ruiru'}),
+        ])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['failed'], 1)
+        
+        # Duplicate keys in one upload are merged into a single row
+        inventory = GasInventory.objects.get(seller=self.seller_user, location='Ruiru')
+        self.assertEqual(inventory.quantity, 5)
+        self.assertEqual(inventory.unit_price, 7100)
+        
+    def test_large_import_uses_bulk_queries(self):
+        """Test that query count grows with chunks, not rows"""
+        rows = ''.join(f'MERU,13,1,4500,Depot {i}\n' for i in range(5000))
+        body = 'brand,weight_kg,quantity,unit_price,location\n' + rows
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.data['created'], 5000)
+        self.assertLess(len(queries), 100)
+        
+    def test_unreadable_body_rejected(self):
+        """Test that a body that is not UTF-8 or not parseable CSV is a 400 and imports nothing"""
+        header = 'brand,weight_kg,quantity,unit_price,location\n'
+        bodies = [
+            (header + 'MERU,13,5,4500,Thika Depot\n').encode() + b'JIBU,6,1,900,Nyeri \xff\n',
+            header + 'MERU,13,5,4500,Thika Depot\n' + 'JIBU,6,1,900,"Nyeri' + ' Depot' * 30000 + '\n',
+        ]
+        for body in bodies:
+            response = self.client.post(self.url, body, content_type='text/csv')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('detail', response.data)
+        self.assertFalse(GasInventory.objects.filter(brand='MERU').exists())
+        
+    def test_unsupported_format(self):
+        """Test that a body in an unknown format is rejected"""
+        response = self.client.post(self.url, 'brand=JIBU', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_not_seller(self):
+        """Test that only sellers can import inventory"""
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.post(self.url, 'brand,weight_kg,quantity,unit_price,location\n', content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkOrderActionTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user,
+            brand='TOTAL',
+            weight_kg=6.0,
+            quantity=5,
+            unit_price=1000,
+            location='Kisumu'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin_user)
+        
+    def place_orders(self, *quantities, inventory=None):
+        return [
+            Order.objects.create(
+                buyer=self.buyer_user,
+                gas_inventory=inventory or self.inventory,
+                quantity=quantity,
+                total_price=1000 * quantity
+            ).id
+            for quantity in quantities
+        ]
+        
+    def test_bulk_approve_allocates_stock_in_order(self):
+        """Test that a batch approves orders until stock runs out and reports the rest"""
+        first, second, third = self.place_orders(3, 3, 2)
+        Order.objects.filter(pk=third).update(status='DELIVERED')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('order-bulk-approve'), {'ids': [first, second, third, 999999]}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        outcomes = {outcome['id']: outcome for outcome in response.data['results']}
+        self.assertEqual(outcomes[first]['status'], 'APPROVED')
+        self.assertFalse(outcomes[second]['ok'])
+        self.assertEqual(outcomes[second]['detail'], 'Not enough inventory to fulfill this order.')
+        self.assertEqual(outcomes[third]['status'], 'DELIVERED')
+        self.assertFalse(outcomes[999999]['ok'])
+        
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 2)
+        self.assertEqual(Order.objects.get(pk=second).status, 'PENDING')
+        drain_outbox()
+        self.assertEqual(list(Invoice.objects.values_list('order_id', flat=True)), [first])
+        
+    def test_bulk_approve_query_count_is_fixed(self):
+        """Test that a large batch costs the same number of queries as a small one"""
+        other = GasInventory.objects.create(
+            seller=self.seller_user, brand='JIBU', weight_kg=3.0,
+            quantity=1000, unit_price=500, location='Kitale'
+        )
+        small = self.place_orders(1, inventory=other)
+        large = self.place_orders(*[1] * 100, inventory=other)
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.post(reverse('order-bulk-approve'), {'ids': small}, format='json')
+        with CaptureQueriesContext(connection) as large_queries:
+            response = self.client.post(reverse('order-bulk-approve'), {'ids': large}, format='json')
+        drain_outbox()
+        self.assertTrue(all(outcome['ok'] for outcome in response.data['results']))
+        self.assertEqual(len(large_queries), len(small_queries))
+        other.refresh_from_db()
+        self.assertEqual(other.quantity, 899)
+        self.assertEqual(Invoice.objects.count(), 101)
+        
+    def test_bulk_reject(self):
+        """Test that only pending orders in a batch are rejected"""
+        pending, approved = self.place_orders(1, 1)
+        Order.objects.filter(pk=approved).update(status='APPROVED')
+        response = self.client.post(reverse('order-bulk-reject'), {'ids': [pending, approved]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([outcome['ok'] for outcome in response.data['results']], [True, False])
+        self.assertEqual(Order.objects.get(pk=pending).status, 'REJECTED')
+        self.assertEqual(Order.objects.get(pk=approved).status, 'APPROVED')
+        
+    def test_bulk_actions_admin_only(self):
+        """Test that non-admins cannot run batch actions"""
+        order_ids = self.place_orders(1)
+        self.client.force_authenticate(user=self.seller_user)
+        for name in ['order-bulk-approve', 'order-bulk-reject']:
+            response = self.client.post(reverse(name), {'ids': order_ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Order.objects.get(pk=order_ids[0]).status, 'PENDING')
+        
+    def test_bulk_approve_rejects_malformed_ids(self):
+        """Test that the id list is validated"""
+        for body in [{}, {'ids': []}, {'ids': ['1']}, {'ids': 5}]:
+            response = self.client.post(reverse('order-bulk-approve'), body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class InvoiceOutboxTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=seller_user,
+            brand='JIBU',
+            weight_kg=6.0,
+            quantity=10,
+            unit_price=1000,
+            location='Machakos'
+        )
+        self.order = Order.objects.create(
+            buyer=self.buyer_user,
+            gas_inventory=self.inventory,
+            quantity=1,
+            total_price=1000
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin_user)
+        
+    def test_approve_queues_invoice_for_the_drain(self):
+        """Test that approval only queues the invoice, even once committed, and the drain creates it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('order-approve', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(InvoiceOutbox.objects.filter(order=self.order).exists())
+        self.assertFalse(Invoice.objects.filter(order=self.order).exists())
+        
+        drain_outbox()
+        self.assertTrue(Invoice.objects.filter(order=self.order).exists())
+        self.assertFalse(InvoiceOutbox.objects.exists())
+        
+    def test_follow_keeps_draining_through_errors(self):
+        """Test that drain_invoice_outbox --follow survives a failed pass and drains on the next"""
+        Order.objects.filter(pk=self.order.pk).update(status='APPROVED')
+        InvoiceOutbox.objects.create(order=self.order)
+        passes = [DatabaseError('connection lost'), None, KeyboardInterrupt()]
+        real_drain = drain_outbox
+        
+        def drain(batch_size):
+            failure = passes.pop(0)
+            if failure is not None:
+                raise failure
+            return real_drain(batch_size)
+            
+        err = StringIO()
+        with mock.patch('gas_management.management.commands.drain_invoice_outbox.drain_outbox', side_effect=drain), \
+                mock.patch('gas_management.management.commands.drain_invoice_outbox.close_old_connections'), \
+                mock.patch('gas_management.management.commands.drain_invoice_outbox.time.sleep'):
+            call_command('drain_invoice_outbox', '--follow', stdout=StringIO(), stderr=err)
+        self.assertIn('connection lost', err.getvalue())
+        self.assertTrue(Invoice.objects.filter(order=self.order).exists())
+        
+    def test_unrelated_order_saves_skip_invoicing(self):
+        """Test that saving an order outside approval touches no invoice tables"""
+        with CaptureQueriesContext(connection) as queries:
+            self.order.contact_phone = '0711111111'
+            self.order.save()
+        self.assertEqual(len(queries), 1)
+        
+    def test_drain_command_clears_backlog(self):
+        """Test that the drain command invoices approved orders and skips cancelled ones"""
+        cancelled = Order.objects.create(
+            buyer=self.buyer_user, gas_inventory=self.inventory, quantity=1, total_price=1000
+        )
+        Order.objects.filter(pk=self.order.pk).update(status='APPROVED')
+        InvoiceOutbox.objects.create(order=self.order)
+        InvoiceOutbox.objects.create(order=cancelled)
+        Order.objects.filter(pk=cancelled.pk).update(status='CANCELLED')
+        
+        call_command('drain_invoice_outbox', '--batch-size', '1', stdout=StringIO())
+        self.assertFalse(InvoiceOutbox.objects.exists())
+        self.assertEqual(list(Invoice.objects.values_list('order_id', flat=True)), [self.order.id])
+
+
+class CatalogueCacheTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user,
+            brand='MERU',
+            weight_kg=13.0,
+            quantity=3,
+            unit_price=4500,
+            location='Nyeri'
+        )
+        self.url = reverse('v1-gas-list')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        cache.clear()
+        catalogue_cache_stats.reset()
+        
+    def test_repeat_request_is_served_from_cache(self):
+        """Test that an identical catalogue request skips the database"""
+        first = self.client.get(self.url, {'brand': 'meru', 'weight': '13kg'})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url, {'weight': '13.0', 'brand': 'MERU', 'junk': 'x'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        # Only the role lookup for the permission check remains
+        self.assertLessEqual(len(queries), 1)
+        self.assertEqual(catalogue_cache_stats.snapshot()['hits'], 1)
+        self.assertEqual(catalogue_cache_stats.snapshot()['misses'], 1)
+        
+    def test_key_and_filters_normalise_alike(self):
+        """Test that parameters sharing a cache key select the same rows whichever comes first"""
+        padded = self.client.get(self.url, {'brand': ' meru ', 'location': ' NYERI '})
+        self.assertEqual(padded['X-Cache'], 'MISS')
+        self.assertEqual(len(padded.data['results']), 1)
+        
+        plain = self.client.get(self.url, {'brand': 'MERU', 'location': 'nyeri'})
+        self.assertEqual(plain['X-Cache'], 'HIT')
+        with self.settings(CATALOGUE_CACHE_TIMEOUT=0):
+            self.assertEqual(self.client.get(self.url, {'brand': ' meru ', 'location': ' NYERI '}).data, plain.data)
+        
+    def test_inventory_save_invalidates(self):
+        """Test that saving or deleting inventory bumps the cached catalogue"""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.unit_price = 4800
+            self.inventory.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['unit_price'], '4800.00')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.delete()
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+        
+    def test_approve_and_cancel_invalidate(self):
+        """Test that stock moved by approve and cancel is reflected straight away"""
+        order = Order.objects.create(
+            buyer=self.buyer_user, gas_inventory=self.inventory, quantity=3, total_price=13500
+        )
+        self.client.get(self.url)
+        
+        self.client.force_authenticate(user=self.admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order-approve', args=[order.id]))
+        self.client.force_authenticate(user=self.buyer_user)
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order-cancel', args=[order.id]))
+        self.assertEqual(self.client.get(self.url).data['results'][0]['quantity'], 3)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        inventory = GasInventory.objects.create(
+            seller=seller_user,
+            brand='TOTAL',
+            weight_kg=13.0,
+            quantity=50,
+            unit_price=4000,
+            location='Embu'
+        )
+        self.orders = []
+        for day, order_status in [(1, 'PENDING'), (2, 'APPROVED'), (3, 'DELIVERED')]:
+            order = Order.objects.create(
+                buyer=self.buyer_user,
+                gas_inventory=inventory,
+                quantity=1,
+                total_price=4000,
+                status=order_status,
+                delivery_address='5 Kenyatta Road, Embu',
+                contact_phone='0700000000'
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(timezone.datetime(2024, 3, day, 12)))
+            self.orders.append(order)
+        invoice = Invoice.objects.create(order=self.orders[2], is_paid=True)
+        Payment.objects.create(invoice=invoice, amount=4000, status='COMPLETED', payment_method='Cash')
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin_user)
+        
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+        
+    def test_order_csv_export(self):
+        """Test that orders stream as CSV with a header row, oldest first"""
+        response = self.client.get(reverse('order-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = self.read(response).splitlines()
+        self.assertTrue(lines[0].startswith('id,status,created_at'))
+        self.assertEqual(len(lines), 4)
+        # Commas inside values are quoted
+        self.assertIn('"5 Kenyatta Road, Embu"', lines[1])
+        
+    def test_date_and_status_filters(self):
+        """Test that date bounds are inclusive and status narrows the export"""
+        response = self.client.get(reverse('order-export'), {
+            'date_from': '2024-03-02', 'date_to': '2024-03-03', 'export_format': 'ndjson'
+        })
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.orders[1].id, self.orders[2].id])
+        self.assertEqual(rows[0]['brand'], 'TOTAL')
+        
+        response = self.client.get(reverse('order-export'), {'status': 'delivered', 'export_format': 'ndjson'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.orders[2].id])
+        
+    def test_invoice_and_payment_exports(self):
+        """Test the invoice PAID/UNPAID filter and the payment export"""
+        response = self.client.get(reverse('invoice-export'), {'status': 'paid', 'export_format': 'ndjson'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.orders[2].id])
+        
+        response = self.client.get(reverse('payment-export'), {'export_format': 'ndjson'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(rows[0]['amount'], '4000.00')
+        self.assertEqual(rows[0]['buyer_name'], 'buyer')
+        
+    def test_bad_parameters(self):
+        """Test that unknown formats, bad dates and unknown invoice statuses are 400s"""
+        for url, params in [
+            (reverse('order-export'), {'export_format': 'xlsx'}),
+            (reverse('order-export'), {'date_from': '2024-13-01'}),
+            (reverse('invoice-export'), {'status': 'APPROVED'}),
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            
+    def test_admin_only(self):
+        """Test that non-admins cannot export"""
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.get(reverse('order-export'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SellerAnalyticsTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        self.jibu = GasInventory.objects.create(
+            seller=self.seller_user, brand='JIBU', weight_kg=6.0,
+            quantity=100, unit_price=1000, location='Kericho'
+        )
+        self.meru = GasInventory.objects.create(
+            seller=self.seller_user, brand='MERU', weight_kg=13.0,
+            quantity=100, unit_price=4000, location='Kericho'
+        )
+        self.client = APIClient()
+        self.url = reverse('v1-seller-analytics')
+        
+    def place_order(self, inventory, quantity):
+        return Order.objects.create(
+            buyer=self.buyer_user,
+            gas_inventory=inventory,
+            quantity=quantity,
+            total_price=inventory.unit_price * quantity
+        )
+        
+    def approve(self, order):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(reverse('order-approve', args=[order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+    def dashboard(self):
+        self.client.force_authenticate(user=self.seller_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+        
+    def test_rollup_follows_order_transitions(self):
+        """Test that approvals add to the rollup, cancellations subtract and ratings average"""
+        first = self.place_order(self.jibu, 2)
+        second = self.place_order(self.meru, 1)
+        cancelled = self.place_order(self.meru, 3)
+        self.place_order(self.jibu, 5)  # stays pending
+        for order in (first, second, cancelled):
+            self.approve(order)
+        self.client.force_authenticate(user=self.buyer_user)
+        self.client.post(reverse('order-cancel', args=[cancelled.id]))
+        
+        Order.objects.filter(pk=first.pk).update(status='DELIVERED')
+        response = self.client.post(reverse('rating-list'), {'order': first.id, 'rating': 4})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        data = self.dashboard()
+        self.assertEqual(data['totals']['orders'], 2)
+        self.assertEqual(data['totals']['units'], 3)
+        self.assertEqual(data['totals']['revenue'], '6000.00')
+        self.assertEqual(data['totals']['average_rating'], 4.0)
+        self.assertEqual([row['brand'] for row in data['by_brand']], ['JIBU', 'MERU'])
+        self.assertEqual(data['by_brand'][1]['units'], 1)
+        self.assertEqual([row['weight_kg'] for row in data['by_weight']], ['6.0', '13.0'])
+        self.assertEqual(len(data['by_day']), 1)
+        
+    def test_bulk_approve_feeds_rollup(self):
+        """Test that a bulk approval is folded in with the single-order path"""
+        orders = [self.place_order(self.meru, 1) for _ in range(3)]
+        self.client.force_authenticate(user=self.admin_user)
+        self.client.post(reverse('order-bulk-approve'), {'ids': [order.id for order in orders]}, format='json')
+        self.assertEqual(self.dashboard()['totals']['revenue'], '12000.00')
+        
+    def test_dashboard_cost_is_independent_of_history(self):
+        """Test that the dashboard reads the rollup with a fixed number of queries"""
+        self.approve(self.place_order(self.jibu, 1))
+        self.client.force_authenticate(user=self.seller_user)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        for _ in range(20):
+            self.approve(self.place_order(self.jibu, 1))
+        self.client.force_authenticate(user=self.seller_user)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(any('gas_management_order' in query['sql'] for query in large.captured_queries))
+        
+    def test_rebuild_repairs_drift(self):
+        """Test that the rebuild command restores the rollup from the order table"""
+        self.approve(self.place_order(self.jibu, 2))
+        self.approve(self.place_order(self.meru, 1))
+        SellerDailySales.objects.filter(brand='JIBU').update(units=99)
+        SellerDailySales.objects.filter(brand='MERU').delete()
+        
+        out = StringIO()
+        call_command('rebuild_seller_sales', stdout=out)
+        self.assertIn('2 had drifted', out.getvalue())
+        data = self.dashboard()
+        self.assertEqual(data['totals']['units'], 3)
+        self.assertEqual(data['totals']['revenue'], '6000.00')
+        
+    def test_sellers_only_and_window_validation(self):
+        """Test that only sellers see analytics and the date window is checked"""
+        self.client.force_authenticate(user=self.buyer_user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.seller_user)
+        for params in [{'date_from': '2024-02-30'}, {'date_from': '2024-03-02', 'date_to': '2024-03-01'},
+                       {'date_from': '2020-01-01', 'date_to': '2024-01-01'}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SellerRatingTests(TestCase):
+    def setUp(self):
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        self.sellers = []
+        self.inventory = []
+        for name in ['good', 'great']:
+            seller = User.objects.create_user(name, f'{name}@test.com', 'password123')
+            UserProfile.objects.create(user=seller, role='SELLER')
+            self.sellers.append(seller)
+            self.inventory.append([
+                GasInventory.objects.create(
+                    seller=seller, brand='JIBU', weight_kg=weight,
+                    quantity=10, unit_price=1000, location='Nanyuki'
+                )
+                for weight in (6.0, 13.0)
+            ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        cache.clear()
+        
+    def rate(self, seller_index, score):
+        order = Order.objects.create(
+            buyer=self.buyer_user,
+            gas_inventory=self.inventory[seller_index][0],
+            quantity=1,
+            total_price=1000,
+            status='DELIVERED'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('rating-list'), {'order': order.id, 'rating': score})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+        
+    def test_rating_updates_every_inventory_row_of_the_seller(self):
+        """Test that a new rating is copied onto all of the seller's stock"""
+        self.rate(1, 4)
+        self.rate(1, 5)
+        profile = UserProfile.objects.get(user=self.sellers[1])
+        self.assertEqual((profile.rating_count, profile.rating_sum), (2, 9))
+        for inventory in self.inventory[1]:
+            inventory.refresh_from_db()
+            self.assertEqual(str(inventory.seller_rating), '4.50')
+            self.assertEqual(inventory.seller_rating_count, 2)
+            
+        response = self.client.get(reverse('gas-inventory-detail', args=[self.inventory[1][1].id]))
+        self.assertEqual(response.data['seller_rating'], '4.50')
+        self.assertEqual(response.data['seller_rating_count'], 2)
+        
+    def test_catalogue_orders_by_seller_rating_without_joins(self):
+        """Test that sorting by reputation reads only the inventory table"""
+        self.rate(0, 3)
+        self.rate(1, 5)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('v1-gas-list'), {'ordering': '-seller_rating'})
+        sellers = [row['seller'] for row in response.data['results']]
+        self.assertEqual(sellers, [self.sellers[1].id] * 2 + [self.sellers[0].id] * 2)
+        catalogue_sql = [query['sql'] for query in queries.captured_queries if 'gasinventory' in query['sql']]
+        self.assertEqual(len(catalogue_sql), 1)
+        self.assertNotIn('gas_management_rating', catalogue_sql[0])
+        self.assertNotIn('gas_management_userprofile', catalogue_sql[0])
+        
+    def test_rating_edit_and_delete_adjust_totals(self):
+        """Test that changing or removing a rating keeps the totals exact"""
+        rating_id = self.rate(0, 2)
+        self.rate(0, 4)
+        self.client.patch(reverse('rating-detail', args=[rating_id]), {'rating': 5})
+        self.inventory[0][0].refresh_from_db()
+        self.assertEqual(str(self.inventory[0][0].seller_rating), '4.50')
+        
+        self.client.delete(reverse('rating-detail', args=[rating_id]))
+        profile = UserProfile.objects.get(user=self.sellers[0])
+        self.assertEqual((profile.rating_count, profile.rating_sum), (1, 4))
+        
+    def test_new_stock_starts_with_seller_rating(self):
+        """Test that inventory created after ratings carries the current average"""
+        self.rate(0, 4)
+        self.client.force_authenticate(user=self.sellers[0])
+        response = self.client.post(reverse('gas-inventory-list'), {
+            'brand': 'MERU', 'weight_kg': '22.5', 'quantity': 3, 'unit_price': '8000', 'location': 'Nanyuki'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['seller_rating'], '4.00')
+        
+    def test_rebuild_repairs_drift(self):
+        """Test that the rebuild command recomputes totals from the ratings"""
+        self.rate(0, 5)
+        UserProfile.objects.filter(user=self.sellers[0]).update(rating_count=7, rating_sum=7)
+        GasInventory.objects.filter(seller=self.sellers[0]).update(seller_rating=1, seller_rating_count=7)
+        out = StringIO()
+        call_command('rebuild_seller_ratings', stdout=out)
+        self.assertIn('1 sellers had drifted', out.getvalue())
+        self.assertEqual(
+            set(GasInventory.objects.filter(seller=self.sellers[0]).values_list('seller_rating', 'seller_rating_count')),
+            {(5, 1)}
+        )
+
+
+class ProximitySearchTests(TestCase):
+    NAIROBI_CBD = (-1.2864, 36.8172)
+    
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        def stock(location, latitude=None, longitude=None, brand='JIBU', quantity=10):
+            return GasInventory.objects.create(
+                seller=self.seller_user, brand=brand, weight_kg=6.0, quantity=quantity,
+                unit_price=1000, location=location, latitude=latitude, longitude=longitude
+            )
+        self.cbd = stock('Nairobi CBD', -1.2841, 36.8155)
+        self.westlands = stock('Westlands', -1.2676, 36.8108, brand='MERU')
+        self.kilimani = stock('Kilimani', -1.2905, 36.7839)
+        self.sold_out = stock('Ngara', -1.2760, 36.8230, quantity=0)
+        self.thika = stock('Thika', -1.0333, 37.0693)
+        self.unplaced = stock('Nairobi Somewhere')
+        self.url = reverse('v1-gas-list')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        cache.clear()
+        
+    def near(self, **params):
+        return self.client.get(self.url, {'near': '%s,%s' % self.NAIROBI_CBD, **params})
+        
+    def test_near_ranks_in_stock_items_by_distance(self):
+        """Test that proximity search returns in-radius stock, nearest first"""
+        response = self.near(radius_km=10)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [self.cbd.id, self.westlands.id, self.kilimani.id])
+        distances = [item['distance_km'] for item in response.data['results']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertAlmostEqual(distances[0], haversine_km(*self.NAIROBI_CBD, -1.2841, 36.8155), places=3)
+        self.assertIsNone(response.data['next'])
+        
+        # Thika is about 40 km out
+        response = self.near(radius_km=50)
+        self.assertEqual(response.data['results'][-1]['id'], self.thika.id)
+        
+    def test_near_combines_with_filters_and_page_size(self):
+        """Test that catalogue filters and page_size apply to proximity results"""
+        response = self.near(brand='meru')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.westlands.id])
+        response = self.near(page_size=2)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.cbd.id, self.westlands.id])
+        
+    def test_invalid_near_parameters(self):
+        """Test that malformed points and radii are rejected"""
+        for params in [{'near': 'nairobi'}, {'near': '91,10'}, {'near': '1,2', 'radius_km': '0'},
+                       {'near': '1,2', 'radius_km': '5000'}, {'near': '1,2', 'radius_km': 'far'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            
+    def test_geohash_follows_coordinates(self):
+        """Test that saving, updating and importing inventory keep the geohash in step"""
+        self.assertEqual(self.cbd.geohash, encode(-1.2841, 36.8155))
+        self.assertIsNone(self.unplaced.geohash)
+        
+        self.client.force_authenticate(user=self.seller_user)
+        detail = reverse('gas-inventory-detail', args=[self.unplaced.id])
+        response = self.client.patch(detail, {'latitude': -1.3000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(detail, {'latitude': -1.3000, 'longitude': 36.8000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.unplaced.refresh_from_db()
+        self.assertEqual(self.unplaced.geohash, encode(-1.3, 36.8))
+        
+        body = (
+            'brand,weight_kg,quantity,unit_price,location,latitude,longitude\n'
+            'TOTAL,13,5,4500,Ruiru,-1.1466,36.9609\n'
+            'TOTAL,13,5,4500,Juja,-1.1,\n'
+        )
+        response = self.client.post(reverse('v1-seller-inventory-import'), body, content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(GasInventory.objects.get(location='Ruiru').geohash, encode(-1.1466, 36.9609))
+        
+    def test_cell_ranges_cover_the_search_circle(self):
+        """Test that the geohash ranges contain every point within the radius, across the antimeridian too"""
+        for lat, lon, radius_km in [(-1.2864, 36.8172, 5), (0.0, 179.99, 20), (60.17, 24.94, 150)]:
+            ranges = cell_ranges(lat, lon, radius_km)
+            for step in range(36):
+                bearing = step * 10
+                for fraction in (0.5, 0.99):
+                    # Move `fraction * radius_km` along the bearing on a local flat approximation
+                    d_lat = fraction * radius_km * math.cos(math.radians(bearing)) / 111.32
+                    d_lon = fraction * radius_km * math.sin(math.radians(bearing)) / (
+                        111.32 * math.cos(math.radians(lat + d_lat))
+                    )
+                    point = (lat + d_lat, (lon + d_lon + 180) % 360 - 180)
+                    if haversine_km(lat, lon, *point) > radius_km:
+                        continue
+                    geohash = encode(*point)
+                    self.assertTrue(any(low <= geohash < high for low, high in ranges), (lat, lon, point))
+
+
+class CatalogueSearchTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        def stock(brand, location):
+            return GasInventory.objects.create(
+                seller=self.seller_user, brand=brand, weight_kg=6.0, quantity=10,
+                unit_price=1000, location=location
+            )
+        self.meru_town = stock('JIBU', 'Meru Town Depot')
+        self.meru_brand = stock('MERU', 'Nairobi Westlands')
+        self.westlands = stock('TOTAL', 'Nairobi Westlands Stage')
+        self.kisumu = stock('JIBU', 'Kisumu Market')
+        self.url = reverse('v1-gas-list')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        cache.clear()
+        
+    def search(self, term, **params):
+        response = self.client.get(self.url, {'search': term, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+        
+    def test_search_matches_location_and_brand(self):
+        """Test that search finds stock by location or brand on every database"""
+        self.assertEqual(set(self.search('westlands')), {self.meru_brand.id, self.westlands.id})
+        self.assertEqual(set(self.search('meru')), {self.meru_town.id, self.meru_brand.id})
+        self.assertEqual(self.search('mombasa'), [])
+        
+    def test_tsquery_prefixes_and_corrects_terms(self):
+        """Test that each term is prefix-matched and unknown words gain corrections"""
+        words = ['depot', 'kisumu', 'market', 'nairobi', 'westlands']
+        self.assertEqual(build_tsquery(['Nair', 'west'], words), 'nair:* & west:*')
+        self.assertEqual(build_tsquery(['nairboi'], words), '(nairboi:* | nairobi)')
+        self.assertEqual(build_tsquery(['zzzz', '--'], words), 'zzzz:*')
+        
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+    def test_full_text_search_ranks_prefixes_and_typos(self):
+        """Test that PostgreSQL search ranks location matches first and tolerates prefixes and typos"""
+        # A location match outranks a brand match
+        self.assertEqual(self.search('meru'), [self.meru_town.id, self.meru_brand.id])
+        self.assertEqual(set(self.search('nair west')), {self.meru_brand.id, self.westlands.id})
+        self.assertEqual(self.search('kisumo'), [self.kisumu.id])
+        self.assertEqual(self.search('meru', ordering='-date_added'), [self.meru_brand.id, self.meru_town.id])
+        
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+    def test_search_vector_follows_edits_and_imports(self):
+        """Test that the trigger keeps the search column and lexicon current"""
+        self.client.force_authenticate(user=self.seller_user)
+        response = self.client.patch(
+            reverse('gas-inventory-detail', args=[self.kisumu.id]), {'location': 'Eldoret Junction'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.post(
+            reverse('v1-seller-inventory-import'),
+            'brand,weight_kg,quantity,unit_price,location\nMERU,13,5,4500,Naivasha Stage\n',
+            content_type='text/csv'
+        )
+        self.assertTrue(SearchLexeme.objects.filter(word__in=['eldoret', 'naivasha']).count() == 2)
+        cache.clear()
+        
+        self.assertEqual(self.search('eldoret'), [self.kisumu.id])
+        self.assertEqual(self.search('kisumu'), [])
+        self.assertEqual(len(self.search('naivasha')), 1)
+        
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+    def test_ranked_results_page_with_cursor(self):
+        """Test that paging through ranked results visits every match exactly once"""
+        for index in range(5):
+            GasInventory.objects.create(
+                seller=self.seller_user, brand='OTHER', weight_kg=6.0, quantity=10,
+                unit_price=1000, location=f'Nairobi Depot {index}'
+            )
+        seen = []
+        response = self.client.get(self.url, {'search': 'nairobi', 'page_size': 2})
+        for _ in range(5):
+            seen += [item['id'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+
+class AsgiExportTests(TransactionTestCase):
+    """Exports must stream under the ASGI application as they do under WSGI."""
+    
+    async def fetch(self, path, user, query_string=b''):
+        communicator = ApplicationCommunicator(asgi_application, {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+            'headers': [(b'host', b'testserver'),
+                        (b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())],
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(5)
+        body = b''
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        await communicator.wait(5)
+        return start, body
+        
+    def test_order_export_streams_through_asgi(self):
+        """Test that an admin export read from the database is streamed in full by backend.asgi"""
+        admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=admin_user, role='ADMIN')
+        inventory = GasInventory.objects.create(
+            seller=seller_user, brand='TOTAL', weight_kg=6, quantity=10, unit_price=1000, location='Nairobi'
+        )
+        orders = Order.objects.bulk_create([
+            Order(gas_inventory=inventory, buyer=buyer_user, quantity=1, total_price=1000,
+                  delivery_address='Ngong Road', contact_phone='0700000000')
+            for _ in range(3)
+        ])
+        
+        start, body = async_to_sync(self.fetch)(
+            reverse('v1-admin-orders-export'), admin_user, b'export_format=ndjson'
+        )
+        self.assertEqual(start['status'], 200)
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), len(orders))
+        self.assertEqual({row['buyer_name'] for row in rows}, {'buyer'})
+        
+        
+class OrderEventStreamTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.other_user = User.objects.create_user('other', 'other@test.com', 'password123')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.other_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user, brand='TOTAL', weight_kg=6.0, quantity=5, unit_price=1000, location='Kisumu'
+        )
+        self.order = Order.objects.create(
+            buyer=self.buyer_user, gas_inventory=self.inventory, quantity=2, total_price=2000
+        )
+        self.client = APIClient()
+        
+    def stream(self, user=None, headers=None, query_string=b''):
+        if headers is None:
+            headers = [(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())]
+        return ApplicationCommunicator(asgi_application, {
+            'type': 'http', 'method': 'GET', 'path': ORDER_EVENTS_PATH,
+            'headers': headers, 'query_string': query_string,
+        })
+        
+    async def open(self, communicator):
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(1)
+        if start['status'] == 200:
+            self.assertEqual((await communicator.receive_output(1))['body'], b'retry: 5000\n\n')
+        return start
+        
+    async def close(self, communicator):
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+        
+    async def next_event(self, communicator):
+        body = (await communicator.receive_output(1))['body'].decode()
+        event, data = body.strip().split('\n')
+        self.assertEqual(event, 'event: order_status')
+        return json.loads(data[len('data: '):])
+        
+    def post_as(self, user, name, payload=None, **kwargs):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(name, **kwargs), payload, format='json')
+            
+    def test_transitions_reach_buyer_and_seller_only(self):
+        """Test that approve and mark_delivered are pushed to the order's buyer and seller"""
+        async def scenario():
+            buyer, seller, other = streams = [
+                self.stream(user) for user in (self.buyer_user, self.seller_user, self.other_user)
+            ]
+            for communicator in streams:
+                self.assertEqual((await self.open(communicator))['status'], 200)
+            
+            await sync_to_async(self.post_as)(self.admin_user, 'order-approve', kwargs={'pk': self.order.pk})
+            approved = [await self.next_event(buyer), await self.next_event(seller)]
+            await sync_to_async(self.post_as)(self.seller_user, 'order-mark-delivered', kwargs={'pk': self.order.pk})
+            delivered = await self.next_event(buyer)
+            await self.next_event(seller)
+            self.assertTrue(await other.receive_nothing(0.1))
+            
+            for communicator in streams:
+                await self.close(communicator)
+            return approved, delivered
+            
+        approved, delivered = async_to_sync(scenario)()
+        for event in approved:
+            self.assertEqual(
+                (event['order'], event['status'], event['previous_status']), (self.order.pk, 'APPROVED', 'PENDING')
+            )
+        self.assertEqual((delivered['status'], delivered['previous_status']), ('DELIVERED', 'APPROVED'))
+        self.assertEqual(broker.connections(), 0)
+        
+    def test_bulk_reject_and_cancel_are_streamed(self):
+        """Test that batch rejections and cancellations publish one event per order"""
+        second = Order.objects.create(
+            buyer=self.buyer_user, gas_inventory=self.inventory, quantity=1, total_price=1000
+        )
+        third = Order.objects.create(
+            buyer=self.buyer_user, gas_inventory=self.inventory, quantity=1, total_price=1000
+        )
+        
+        async def scenario():
+            buyer = self.stream(self.buyer_user)
+            await self.open(buyer)
+            await sync_to_async(self.post_as)(self.admin_user, 'order-bulk-reject', {'ids': [self.order.pk, second.pk]})
+            await sync_to_async(self.post_as)(self.buyer_user, 'order-cancel', kwargs={'pk': third.pk})
+            events = [await self.next_event(buyer) for _ in range(3)]
+            self.assertTrue(await buyer.receive_nothing(0.1))
+            await self.close(buyer)
+            return events
+            
+        events = async_to_sync(scenario)()
+        self.assertEqual(
+            sorted((event['order'], event['status']) for event in events),
+            [(self.order.pk, 'REJECTED'), (second.pk, 'REJECTED'), (third.pk, 'CANCELLED')]
+        )
+        
+    def test_rejects_missing_or_invalid_tokens(self):
+        """Test that a stream needs a valid access token, from the header or ?token="""
+        async def scenario():
+            starts = []
+            for communicator in [
+                self.stream(headers=[]),
+                self.stream(headers=[(b'authorization', b'Bearer not-a-token')]),
+                self.stream(headers=[], query_string=f'token={AccessToken.for_user(self.buyer_user)}'.encode()),
+            ]:
+                starts.append((await self.open(communicator))['status'])
+                if starts[-1] == 200:
+                    await self.close(communicator)
+                else:
+                    body = json.loads((await communicator.receive_output(1))['body'])
+                    self.assertIn('detail', body)
+            return starts
+            
+        self.assertEqual(async_to_sync(scenario)(), [401, 401, 200])
+        
+    @override_settings(ORDER_EVENTS_KEEPALIVE=0.05)
+    def test_idle_stream_sends_keepalives(self):
+        """Test that an idle stream sends comments so proxies keep it open"""
+        async def scenario():
+            buyer = self.stream(self.buyer_user)
+            await self.open(buyer)
+            body = (await buyer.receive_output(1))['body']
+            await self.close(buyer)
+            return body
+            
+        self.assertEqual(async_to_sync(scenario)(), b': keepalive\n\n')
+        
+    def test_lagging_subscription_overflows_instead_of_growing(self):
+        """Test that a stream that falls behind is marked for closing rather than buffering without bound"""
+        async def scenario():
+            subscription = broker.subscribe(self.buyer_user.pk, maxsize=2)
+            try:
+                for index in range(3):
+                    broker.dispatch([self.buyer_user.pk], {'order': index})
+                await asyncio.sleep(0)
+                return len(subscription.events), subscription.overflowed
+            finally:
+                broker.unsubscribe(subscription)
+                
+        self.assertEqual(async_to_sync(scenario)(), (2, True))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = False
+        
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    def make_pool(self, ping=None, **options):
+        self.opened = []
+        
+        def connect():
+            self.opened.append(FakeConnection())
+            return self.opened[-1]
+            
+        return ConnectionPool(
+            connect,
+            lambda conn: not conn.closed and not conn.in_transaction,
+            ping or (lambda conn: None),
+            {'MIN_SIZE': 0, 'MAX_SIZE': 2, **options},
+        )
+        
+    def test_reuses_connections_up_to_max_size(self):
+        """Test that released connections are handed out again before new ones are opened"""
+        pool = self.make_pool()
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        pool.release(second)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['in_use'], stats['idle']), (2, 1, 1))
+        self.assertEqual((stats['opened'], stats['checkouts']), (2, 3))
+        
+    def test_full_pool_waits_then_times_out(self):
+        """Test that a checkout waits for a released connection and fails after TIMEOUT"""
+        pool = self.make_pool(MAX_SIZE=1, TIMEOUT=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+            
+        timer = threading.Timer(0.02, pool.release, [conn])
+        timer.start()
+        pool.timeout = 5
+        self.assertIs(pool.acquire(), conn)
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['waits']), (1, 1))
+        self.assertGreater(stats['wait_ms_max'], 0)
+        
+    def test_recycles_old_and_broken_connections(self):
+        """Test that connections past MAX_AGE or left mid-transaction are closed, not pooled"""
+        pool = self.make_pool()
+        broken = pool.acquire()
+        broken.in_transaction = True
+        pool.release(broken)
+        self.assertTrue(broken.closed)
+        
+        pool.max_age = 0
+        old = pool.acquire()
+        pool.release(old)
+        self.assertTrue(old.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['failed_checks'], stats['recycled']), (0, 1, 1))
+        
+    def test_pings_connections_idle_past_check_after(self):
+        """Test that a connection failing its checkout ping is replaced by a fresh one"""
+        def ping(conn):
+            if conn is self.opened[0]:
+                raise OSError('server closed the connection unexpectedly')
+                
+        pool = self.make_pool(ping=ping, CHECK_AFTER=0)
+        stale = pool.acquire()
+        pool.release(stale)
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, stale)
+        self.assertTrue(stale.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+        
+    def test_pool_statistics_endpoint_is_admin_only(self):
+        """Test that only admins can read this worker's pool statistics"""
+        admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=admin_user, role='ADMIN')
+        UserProfile.objects.create(user=buyer_user, role='BUYER')
+        client = APIClient()
+        url = reverse('v1-admin-database-pool')
+        
+        client.force_authenticate(user=buyer_user)
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        client.force_authenticate(user=admin_user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('pools', response.data)
+        if connection.vendor == 'postgresql':
+            self.assertTrue(any(pool['in_use'] for pool in response.data['pools'].values()))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        
+    def sample(self, name, **labels):
+        """ The value of one series in the /metrics output, or 0 if it does not exist yet. """
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        for line in response.content.decode().splitlines():
+            series, _, value = line.rpartition(' ')
+            if series.startswith(name + '{') and all(f'{key}="{val}"' in series for key, val in labels.items()):
+                return float(value)
+        return 0
+        
+    def test_records_latency_queries_and_size_by_route(self):
+        """Test that a catalogue request is counted under its route name with its queries"""
+        labels = {'route': 'v1-gas-list', 'method': 'GET', 'status': '2xx'}
+        before = self.sample('http_request_duration_seconds_count', **labels)
+        queries_before = self.sample('http_request_db_queries_sum', **labels)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('v1-gas-list'))
+        # Read now: the next request resets the connection's query log
+        query_count = len(queries)
+        
+        self.assertEqual(self.sample('http_request_duration_seconds_count', **labels), before + 1)
+        self.assertEqual(self.sample('http_request_db_queries_sum', **labels), queries_before + query_count)
+        self.assertGreater(self.sample('http_response_size_bytes_sum', **labels), 0)
+        self.assertEqual(
+            self.sample('http_request_duration_seconds_bucket', le='+Inf', **labels),
+            self.sample('http_request_duration_seconds_count', **labels)
+        )
+        
+    def test_path_parameters_do_not_create_series(self):
+        """Test that detail routes and unknown paths are labelled by pattern, never by path"""
+        for pk in (101, 102):
+            self.client.get(reverse('order-detail', kwargs={'pk': pk}))
+        self.client.get('/no/such/path/')
+        
+        routes = set(re.findall(r'route="([^"]*)"', self.client.get('/metrics').content.decode()))
+        self.assertIn('order-detail', routes)
+        self.assertIn('unmatched', routes)
+        self.assertEqual([route for route in routes if '/' in route or '101' in route], [])
+        
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_guards_the_endpoint_when_set(self):
+        """Test that scrapes need the bearer token once METRICS_TOKEN is set"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+    def test_histogram_buckets_are_cumulative(self):
+        """Test the exposition format of a histogram, including label escaping"""
+        histogram = Histogram('demo_seconds', 'Demo.', ('route',), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(('a"b',), value)
+        self.assertEqual(histogram.collect(), [
+            '# HELP demo_seconds Demo.',
+            '# TYPE demo_seconds histogram',
+            'demo_seconds_bucket{route="a\\"b",le="0.1"} 2',
+            'demo_seconds_bucket{route="a\\"b",le="1"} 3',
+            'demo_seconds_bucket{route="a\\"b",le="+Inf"} 4',
+            'demo_seconds_sum{route="a\\"b"} 3.65',
+            'demo_seconds_count{route="a\\"b"} 4',
+        ])
+
+
+class SeedDataTests(TestCase):
+    def seed(self, *args):
+        out = StringIO()
+        call_command('seed_data', '--sellers', '5', '--buyers', '20', '--inventory', '300',
+                     '--orders', '1000', *args, stdout=out)
+        return out.getvalue()
+        
+    def test_history_matches_order_status(self):
+        """Test that seeded orders carry the invoices, payments and ratings their status implies"""
+        self.seed()
+        self.assertEqual(Order.objects.count(), 1000)
+        self.assertEqual(GasInventory.objects.count(), 300)
+        invoiced = set(Invoice.objects.values_list('order__status', flat=True))
+        self.assertLessEqual(invoiced, {'APPROVED', 'DELIVERED'})
+        self.assertFalse(Order.objects.filter(status='DELIVERED', invoice__isnull=True).exists())
+        self.assertFalse(Order.objects.filter(status='DELIVERED', invoice__payment__isnull=True).exists())
+        self.assertFalse(Invoice.objects.filter(is_paid=True, payment__isnull=True).exists())
+        self.assertFalse(Rating.objects.exclude(order__status='DELIVERED').exists())
+        self.assertTrue(Rating.objects.exists())
+        payment = Payment.objects.select_related('invoice__order').first()
+        self.assertEqual(payment.amount, payment.invoice.order.total_price)
+        
+    def test_orders_span_history(self):
+        """Test that orders are spread over past days and only recent ones are unsettled"""
+        self.seed('--days', '60')
+        now = timezone.now()
+        oldest = Order.objects.order_by('created_at').first().created_at
+        self.assertGreater(now - oldest, timezone.timedelta(days=30))
+        self.assertFalse(Order.objects.filter(status='PENDING', created_at__lt=now - timezone.timedelta(days=4)).exists())
+        self.assertFalse(Invoice.objects.filter(created_at__lt=F('order__created_at')).exists())
+        
+    def test_rebuilds_derived_tables(self):
+        """Test that seller ratings and the daily sales rollup reflect the seeded data"""
+        self.seed()
+        self.assertTrue(SellerDailySales.objects.exists())
+        rated = UserProfile.objects.filter(role='SELLER', rating_count__gt=0)
+        self.assertTrue(rated.exists())
+        self.assertEqual(sum(rated.values_list('rating_count', flat=True)), Rating.objects.count())
+        
+    def test_rerun_tops_up(self):
+        """Test that re-running adds only the missing rows"""
+        self.seed()
+        invoices = Invoice.objects.count()
+        self.seed()
+        self.assertEqual(Order.objects.count(), 1000)
+        self.assertEqual(Invoice.objects.count(), invoices)
+        self.seed('--scale', '1.5')
+        self.assertEqual(Order.objects.count(), 1500)
+        self.assertEqual(GasInventory.objects.count(), 450)
+        
+    def test_scenarios_keep_seeded_volumes(self):
+        """Test that scenario fixtures count rows of every seeded user, not just the ones they use"""
+        self.seed()
+        ensure_inventory(300, sellers=2)
+        ensure_orders(1000, buyers=2)
+        self.assertEqual(GasInventory.objects.count(), 300)
+        self.assertEqual(Order.objects.count(), 1000)
+        
+    def test_endpoint_benchmark_report_and_compare(self):
+        """Test that the endpoint benchmark records query counts and compares with a saved run"""
+        self.seed()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark', 'endpoints', '--rows', '1000', '--iterations', '2', '--output', path, stdout=StringIO())
+            with open(path) as baseline:
+                report = json.load(baseline)
+            self.assertEqual(report['environment']['database'], connection.vendor)
+            self.assertEqual(report['results']['catalogue']['count'], 2)
+            self.assertGreaterEqual(report['results']['buyer_orders']['queries_min'], 1)
+            
+            out = StringIO()
+            call_command('benchmark', 'endpoints', '--rows', '1000', '--iterations', '2', '--compare', path, stdout=out)
+            self.assertIn('catalogue.p95_ms:', out.getvalue())
+            
+        changes = compare({'a': {'p50_ms': 10, 'ops_per_sec': 100}}, {'a': {'p50_ms': 5, 'ops_per_sec': 80}})
+        self.assertEqual([(c['figure'], c['change_pct'], c['better']) for c in changes],
+                         [('a.p50_ms', -50.0, True), ('a.ops_per_sec', -20.0, False)])
+
+
+class ProjectedListTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        
+        def stock(location, unit_price, weight_kg, latitude=None, longitude=None):
+            return GasInventory.objects.create(
+                seller=self.seller_user, brand='TOTAL', weight_kg=weight_kg, quantity=10,
+                unit_price=unit_price, location=location, latitude=latitude, longitude=longitude
+            )
+        self.stock = [
+            stock('Nairobi Westlands', 1000, 6),
+            stock('Thika \u2028 Road "Depot" é', Decimal('2450.5'), Decimal('13.0'), -1.0333, 37.0693),
+            stock('Kisumu Market', Decimal('12000.00'), Decimal('22.5'), 0.25, 34.768),
+        ]
+        for index, inventory in enumerate(self.stock * 2):
+            Order.objects.create(
+                gas_inventory=inventory, buyer=self.buyer_user, quantity=index + 1,
+                total_price=inventory.unit_price * (index + 1), status='PENDING',
+                delivery_address='Ngong Road é', contact_phone='0700000000'
+            )
+        self.client = APIClient()
+        cache.clear()
+        
+    def expected(self, serializer_class, queryset, response):
+        """What the serializer and DRF's JSONRenderer make of the same page"""
+        data = {
+            'next': response.data['next'],
+            'previous': response.data['previous'],
+            'results': serializer_class(list(queryset), many=True).data,
+        }
+        return JSONRenderer().render(data)
+        
+    @override_settings(CATALOGUE_CACHE_TIMEOUT=0)
+    def test_catalogue_is_byte_identical(self):
+        """Test that the projected catalogue matches the serializer byte for byte"""
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.get(reverse('v1-gas-list'), {'ordering': 'unit_price', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.projected)
+        queryset = GasInventory.objects.order_by('unit_price', 'pk')[:2]
+        self.assertEqual(response.content, self.expected(GasInventorySerializer, queryset, response))
+        self.assertIn(b'\\u2028', response.content)
+        
+        # The cursor built from values() rows reaches the same next page
+        response = self.client.get(response.data['next'])
+        queryset = GasInventory.objects.order_by('unit_price', 'pk')[2:]
+        self.assertEqual(response.content, self.expected(GasInventorySerializer, queryset, response))
+        
+    def test_orders_are_byte_identical(self):
+        """Test that projected order pages, with their nested gas details, match the serializer"""
+        self.client.force_authenticate(user=self.seller_user)
+        response = self.client.get(reverse('v1-seller-orders'), {'page_size': 4})
+        self.assertTrue(response.projected)
+        queryset = Order.objects.order_by('-created_at', '-pk')
+        self.assertEqual(response.content, self.expected(OrderSerializer, queryset[:4], response))
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.content, self.expected(OrderSerializer, queryset[4:], response))
+        
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.get(reverse('order-my-orders'))
+        self.assertEqual(response.content, self.expected(OrderSerializer, queryset, response))
+        
+    @override_settings(CATALOGUE_CACHE_TIMEOUT=0)
+    def test_exponent_floats_fall_back_to_stock_encoder(self):
+        """Test that a float encoders spell differently sends the page through DRF's encoder"""
+        GasInventory.objects.filter(pk=self.stock[0].pk).update(latitude=0.00005, longitude=36.8)
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.get(reverse('v1-gas-list'))
+        self.assertFalse(response.projected)
+        queryset = GasInventory.objects.order_by('-date_added', '-pk')
+        self.assertEqual(response.content, self.expected(GasInventorySerializer, queryset, response))
+        self.assertIn(b'5e-05', response.content)
+        
+    @override_settings(CATALOGUE_CACHE_TIMEOUT=0)
+    def test_indented_output_is_unchanged(self):
+        """Test that a request for indented JSON is rendered by DRF's encoder"""
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.get(reverse('v1-gas-list'), HTTP_ACCEPT='application/json; indent=2')
+        queryset = GasInventory.objects.order_by('-date_added', '-pk')
+        data = {'next': None, 'previous': None, 'results': GasInventorySerializer(list(queryset), many=True).data}
+        self.assertEqual(response.content, JSONRenderer().render(data, 'application/json; indent=2'))
+        
+    def test_unsupported_serializers_are_refused(self):
+        """Test that a serializer with nested serializers cannot be projected"""
+        with self.assertRaises(ImproperlyConfigured):
+            Projection(InvoiceSerializer)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.other_user = User.objects.create_user('other', 'other@test.com', 'password123')
+        self.buyer_profile = UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.other_user, role='BUYER')
+        self.url = reverse('v1-orders')
+        self.client = APIClient()
+        cache.clear()
+        user_cache.clear()
+        
+    def login(self, username):
+        response = self.client.post(reverse('login'), {'username': username, 'password': 'password123'})
+        return response.data['access']
+        
+    def get(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        identity = [q for q in queries.captured_queries
+                    if 'FROM "auth_user"' in q['sql'] or 'gas_management_userprofile' in q['sql']]
+        return response, len(identity)
+        
+    def test_steady_state_has_no_identity_queries(self):
+        """Test that repeat requests with a token are served without loading the user"""
+        token = self.login('buyer')
+        response, first = self.get(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(first, 1)
+        response, second = self.get(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(second, 0)
+        
+    def test_deactivation_takes_effect_immediately(self):
+        """Test that saving an inactive user stops their cached copy being trusted"""
+        token = self.login('buyer')
+        self.get(token)
+        self.buyer_user.is_active = False
+        self.buyer_user.save()
+        response, _ = self.get(token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+    def test_looked_up_role_is_cached_until_profile_changes(self):
+        """Test that a token without a role claim looks the role up once per profile version"""
+        token = str(AccessToken.for_user(self.buyer_user))
+        self.assertEqual(self.get(token)[1], 2)
+        self.assertEqual(self.get(token)[1], 0)
+        
+        self.buyer_profile.role = 'SELLER'
+        self.buyer_profile.save()
+        self.assertEqual(self.get(token)[1], 2)
+        response = self.client.post(self.url, {'gas_inventory': 1, 'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+    @override_settings(AUTH_USER_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        """Test that the least recently used user is evicted beyond AUTH_USER_CACHE_SIZE"""
+        buyer, other = self.login('buyer'), self.login('other')
+        self.get(buyer)
+        self.get(other)
+        self.assertEqual(self.get(buyer)[1], 1)
+        self.assertEqual(self.get(buyer)[1], 0)
+        
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_timeout_zero_disables_the_cache(self):
+        """Test that with AUTH_USER_CACHE_TIMEOUT at 0 every request loads the user"""
+        token = self.login('buyer')
+        self.get(token)
+        self.assertEqual(self.get(token)[1], 1)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.other_user = User.objects.create_user('other', 'other@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.other_user, role='BUYER')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user, brand='TOTAL', weight_kg=6, quantity=10,
+            unit_price=1000, location='Nairobi'
+        )
+        self.order = Order.objects.create(
+            gas_inventory=self.inventory, buyer=self.buyer_user, quantity=1,
+            total_price=1000, status='PENDING',
+            delivery_address='Ngong Road', contact_phone='0700000000'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        cache.clear()
+        
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        
+    @override_settings(CATALOGUE_CACHE_TIMEOUT=0)
+    def test_unchanged_catalogue_page_is_not_serialized(self):
+        """Test that a catalogue page the client holds is answered with a bodiless 304"""
+        url = reverse('v1-gas-list')
+        first = self.client.get(url, {'brand': 'total'})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', first)
+        with mock.patch.object(Projection, 'serialize', side_effect=AssertionError('serialized')):
+            second = self.revalidate(url, first, brand='total')
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second['ETag'], first['ETag'])
+        
+        # Stock moved by a queryset update still changes the page
+        take_stock(self.inventory.pk, 1)
+        third = self.revalidate(url, first, brand='total')
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+        self.assertEqual(third.data['results'][0]['quantity'], 9)
+        
+    def test_cached_catalogue_page_revalidates_without_queries(self):
+        """Test that a catalogue cache hit answers If-None-Match from the cached validator"""
+        url = reverse('v1-gas-list')
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        # Only the role lookup for the permission check remains
+        self.assertLessEqual(len(queries), 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.unit_price = 1100
+            self.inventory.save()
+        self.assertEqual(self.revalidate(url, first).status_code, status.HTTP_200_OK)
+        
+    def test_inventory_detail_honours_both_validators(self):
+        """Test that a detail GET sends ETag and Last-Modified and answers either with a 304"""
+        url = reverse('gas-inventory-detail', args=[self.inventory.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(self.revalidate(url, first).status_code, status.HTTP_304_NOT_MODIFIED)
+        since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        # Re-copying unchanged ratings leaves the rows, and their validators, alone
+        rebuild_seller_ratings()
+        self.assertEqual(self.revalidate(url, first).status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        # A seller's new rating is copied onto the row and moves its timestamp
+        with self.captureOnCommitCallbacks(execute=True):
+            record_seller_rating(self.seller_user.pk, 1, 4)
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['seller_rating'], '4.00')
+        
+    def test_order_validators_follow_the_inventory_shown(self):
+        """Test that order list and detail ETags change when the ordered inventory does"""
+        list_url, detail_url = reverse('order-my-orders'), reverse('order-detail', args=[self.order.pk])
+        listed, detail = self.client.get(list_url), self.client.get(detail_url)
+        self.assertEqual(self.revalidate(list_url, listed).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.revalidate(detail_url, detail).status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        self.inventory.brand = 'K-GAS'
+        self.inventory.save()
+        response = self.revalidate(list_url, listed)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['gas_details']['brand'], 'K-GAS')
+        self.assertEqual(self.revalidate(detail_url, detail).status_code, status.HTTP_200_OK)
+        
+    def test_validators_are_checked_after_permissions(self):
+        """Test that another user's matching ETag gets the usual 404, and new orders change the list"""
+        detail_url = reverse('order-detail', args=[self.order.pk])
+        detail = self.client.get(detail_url)
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.revalidate(detail_url, detail).status_code, status.HTTP_404_NOT_FOUND)
+        
+        self.client.force_authenticate(user=self.buyer_user)
+        list_url = reverse('order-list')
+        listed = self.client.get(list_url)
+        Order.objects.create(
+            gas_inventory=self.inventory, buyer=self.buyer_user, quantity=2,
+            total_price=2000, status='PENDING',
+            delivery_address='Ngong Road', contact_phone='0700000000'
+        )
+        self.assertEqual(self.revalidate(list_url, listed).status_code, status.HTTP_200_OK)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user, brand='TOTAL', weight_kg=6, quantity=10,
+            unit_price=1000, location='Nairobi'
+        )
+        self.order_data = {
+            'gas_inventory': self.inventory.id, 'quantity': 2,
+            'delivery_address': 'Ngong Road', 'contact_phone': '0700000000'
+        }
+        self.url = reverse('v1-orders')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.buyer_user)
+        cache.clear()
+        
+    def place(self, key, data=None):
+        return self.client.post(self.url, data or self.order_data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        
+    def test_retried_order_is_replayed(self):
+        """Test that a retry with the same key returns the first response without a second order"""
+        first = self.place('order-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', first)
+        
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.place('order-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        # One indexed lookup of the key, plus the role lookup for the permission check
+        self.assertLessEqual(len(queries), 2)
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.place('order-1').content, first.content)
+        self.assertFalse(any('idempotencykey' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(Order.objects.count(), 1)
+        
+        # Without a key, or with a new one, each request is its own order
+        self.client.post(self.url, self.order_data, format='json')
+        self.place('order-2')
+        self.assertEqual(Order.objects.count(), 3)
+        
+    def test_key_reused_for_another_request_is_refused(self):
+        """Test that a key sent with a different body gets a 422 and changes nothing"""
+        self.place('order-1')
+        response = self.place('order-1', {**self.order_data, 'quantity': 3})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.get().quantity, 2)
+        self.assertEqual(self.place('x' * 256).status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # Keys are per user
+        other = User.objects.create_user('other', 'other@test.com', 'password123')
+        UserProfile.objects.create(user=other, role='BUYER')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.place('order-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+        
+    def test_retried_mark_as_paid_creates_one_payment(self):
+        """Test that a retried mark-as-paid replays its success instead of failing"""
+        order = Order.objects.create(
+            gas_inventory=self.inventory, buyer=self.buyer_user, quantity=1,
+            total_price=1000, status='APPROVED'
+        )
+        invoice = Invoice.objects.create(order=order)
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse('invoice-mark-as-paid', args=[invoice.id])
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='pay-1')
+        retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Payment.objects.filter(invoice=invoice).count(), 1)
+        # A fresh attempt without the key still gets the usual answer
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_failed_write_does_not_claim_the_key(self):
+        """Test that a request that errors leaves its key free for the retry"""
+        with mock.patch('gas_management.views.OrderSerializer.save', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                self.place('order-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.place('order-1').status_code, status.HTTP_201_CREATED)
+        
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_keys_are_purged_in_bulk(self):
+        """Test that keys past their TTL are deleted in batches and can then be reused"""
+        for index in range(5):
+            self.place(f'order-{index}')
+        IdempotencyKey.objects.filter(key__in=['order-0', 'order-1', 'order-2']).update(
+            created_at=timezone.now() - datetime.timedelta(seconds=61)
+        )
+        self.assertEqual(purge_expired_keys(batch_size=2), 3)
+        self.assertEqual(sorted(IdempotencyKey.objects.values_list('key', flat=True)), ['order-3', 'order-4'])
+        
+        # An expired key still in the table is not replayed either
+        IdempotencyKey.objects.filter(key='order-3').update(created_at=timezone.now() - datetime.timedelta(seconds=61))
+        cache.clear()
+        response = self.place('order-3')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 6)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class IdempotencyContentionTests(TransactionTestCase):
+    """Concurrent duplicates of one keyed request must make a single order."""
+    
+    threads = 8
+    
+    def test_concurrent_duplicates_place_one_order(self):
+        """Test that simultaneous retries wait for the first and replay its response"""
+        seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=seller_user, role='SELLER')
+        UserProfile.objects.create(user=buyer_user, role='BUYER')
+        inventory = GasInventory.objects.create(
+            seller=seller_user, brand='TOTAL', weight_kg=6, quantity=10, unit_price=1000, location='Nairobi'
+        )
+        data = {'gas_inventory': inventory.id, 'quantity': 1,
+                'delivery_address': 'Ngong Road', 'contact_phone': '0700000000'}
+        barrier = threading.Barrier(self.threads)
+        responses = []
+        lock = threading.Lock()
+        
+        def place():
+            client = APIClient()
+            client.force_authenticate(user=buyer_user)
+            barrier.wait()
+            try:
+                response = client.post(reverse('v1-orders'), data, format='json', HTTP_IDEMPOTENCY_KEY='retry-storm')
+                with lock:
+                    responses.append(response)
+            finally:
+                connection.close()
+                
+        workers = [threading.Thread(target=place) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_201_CREATED})
+        self.assertEqual({response.data['id'] for response in responses}, {Order.objects.get().id})
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), self.threads - 1)
+
+
+class OrderStateMachineTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user, brand='TOTAL', weight_kg=6, quantity=10,
+            unit_price=1000, location='Nairobi'
+        )
+        self.order = Order.objects.create(
+            gas_inventory=self.inventory, buyer=self.buyer_user, quantity=2,
+            total_price=2000, status='PENDING',
+            delivery_address='Ngong Road', contact_phone='0700000000'
+        )
+        self.client = APIClient()
+        
+    def test_transitions_are_recorded_and_readable(self):
+        """Test that each status change through the API is appended to the order's history"""
+        self.client.force_authenticate(user=self.admin_user)
+        self.client.post(reverse('order-approve', args=[self.order.id]))
+        self.client.force_authenticate(user=self.seller_user)
+        self.client.post(reverse('order-mark-delivered', args=[self.order.id]))
+        
+        response = self.client.get(reverse('order-history', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(change['from_status'], change['to_status'], change['actor']) for change in response.data],
+            [('PENDING', 'APPROVED', self.admin_user.id), ('APPROVED', 'DELIVERED', self.seller_user.id)]
+        )
+        other = User.objects.create_user('other', 'other@test.com', 'password123')
+        UserProfile.objects.create(user=other, role='BUYER')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('order-history', args=[self.order.id])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        
+    def test_lost_race_is_detected(self):
+        """Test that a transition from a status read before another change fails or moves on from the new one"""
+        stale = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=self.order.pk).update(status='REJECTED')
+        with self.assertRaises(InvalidTransition) as raised:
+            transition(stale, 'APPROVED')
+        self.assertEqual(raised.exception.status, 'REJECTED')
+        self.assertFalse(OrderStatusChange.objects.exists())
+        
+        # Cancelling is still allowed from the status another request moved to
+        stale = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=self.order.pk).update(status='APPROVED')
+        stale.status = 'PENDING'
+        self.assertEqual(transition(stale, 'CANCELLED', self.buyer_user), 'APPROVED')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'CANCELLED')
+        change = OrderStatusChange.objects.get()
+        self.assertEqual((change.get_from_status_display(), change.get_to_status_display()), ('APPROVED', 'CANCELLED'))
+        
+    def test_transition_writes_only_the_status(self):
+        """Test that a status change does not overwrite columns changed since the order was read"""
+        self.client.force_authenticate(user=self.admin_user)
+        with mock.patch('gas_management.views.OrderViewSet.get_object', return_value=Order.objects.get(pk=self.order.pk)):
+            Order.objects.filter(pk=self.order.pk).update(delivery_address='Thika Road')
+            response = self.client.post(reverse('order-reject', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.delivery_address), ('REJECTED', 'Thika Road'))
+        
+        response = self.client.post(reverse('order-reject', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'Cannot reject order with status REJECTED')
+        
+    def test_failed_side_effect_rolls_back_the_transition(self):
+        """Test that an approval without enough stock leaves the order pending and unrecorded"""
+        self.inventory.quantity = 1
+        self.inventory.save()
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(reverse('order-approve', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'PENDING')
+        self.assertFalse(OrderStatusChange.objects.exists())
+        
+        # Batch approvals are recorded too
+        self.inventory.quantity = 10
+        self.inventory.save()
+        self.client.post(reverse('v1-admin-orders-bulk-approve'), {'ids': [self.order.id]}, format='json')
+        self.assertEqual(
+            list(OrderStatusChange.objects.values_list('order_id', 'actor_id')), [(self.order.id, self.admin_user.id)]
+        )
+        
+    @skipUnless(connection.vendor == 'postgresql', 'the single-statement swap needs PostgreSQL')
+    def test_transition_is_one_round_trip(self):
+        """Test that the swap and its history row are written by one statement"""
+        order = Order.objects.get(pk=self.order.pk)
+        with CaptureQueriesContext(connection) as queries:
+            transition(order, 'APPROVED', self.admin_user)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(OrderStatusChange.objects.get().order_id, self.order.pk)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        self.admin_user = User.objects.create_user('admin', 'admin@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        UserProfile.objects.create(user=self.admin_user, role='ADMIN')
+        
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user, brand='TOTAL', weight_kg=6, quantity=10,
+            unit_price=1000, location='Nairobi'
+        )
+        self.long_ago = timezone.now() - datetime.timedelta(days=400)
+        self.client = APIClient()
+        
+    def make_order(self, status='DELIVERED', created_at=None, invoiced=False, rated=False):
+        order = Order.objects.create(
+            gas_inventory=self.inventory, buyer=self.buyer_user, quantity=2,
+            total_price=2000, status=status,
+            delivery_address='Ngong Road', contact_phone='0700000000'
+        )
+        if invoiced:
+            invoice = Invoice.objects.create(order=order, is_paid=True, payment_date=timezone.now())
+            Payment.objects.create(invoice=invoice, amount=2000, status='COMPLETED', payment_method='M-PESA')
+        if rated:
+            Rating.objects.create(order=order, rating=4, comment='Quick delivery')
+        Order.objects.filter(pk=order.pk).update(created_at=created_at or self.long_ago)
+        return Order.objects.get(pk=order.pk)
+        
+    def test_moves_only_old_settled_orders(self):
+        """Test that old delivered, cancelled and rejected orders move with their invoice, payment and rating"""
+        delivered = self.make_order(invoiced=True, rated=True)
+        cancelled = self.make_order('CANCELLED')
+        approved = self.make_order('APPROVED', invoiced=True)
+        recent = self.make_order(created_at=timezone.now() - datetime.timedelta(days=30))
+        awaiting_invoice = self.make_order()
+        InvoiceOutbox.objects.create(order=awaiting_invoice)
+        invoice_number = delivered.invoice.invoice_number
+        moved = (delivered.invoice.pk, delivered.invoice.payment.pk, delivered.rating.pk)
+        
+        out = StringIO()
+        call_command('archive_orders', stdout=out)
+        self.assertIn('Archived 2 orders older than 365 days', out.getvalue())
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {approved.pk, recent.pk, awaiting_invoice.pk})
+        self.assertEqual(set(ArchivedOrder.objects.values_list('pk', flat=True)), {delivered.pk, cancelled.pk})
+        self.assertEqual(Invoice.objects.get().order_id, approved.pk)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertFalse(Rating.objects.exists())
+        self.assertEqual(
+            (list(ArchivedInvoice.objects.values_list('pk', 'order_id')),
+             list(ArchivedPayment.objects.values_list('pk', 'invoice_id')),
+             list(ArchivedRating.objects.values_list('pk', 'order_id'))),
+            ([(moved[0], delivered.pk)], [(moved[1], moved[0])], [(moved[2], delivered.pk)])
+        )
+        
+        archived = ArchivedOrder.objects.select_related('invoice__payment', 'rating').get(pk=delivered.pk)
+        self.assertEqual(
+            (archived.buyer_id, archived.status, archived.total_price, archived.created_at),
+            (self.buyer_user.pk, 'DELIVERED', Decimal('2000.00'), delivered.created_at)
+        )
+        self.assertEqual(archived.invoice.invoice_number, invoice_number)
+        self.assertEqual((archived.invoice.payment.amount, archived.rating.rating), (Decimal('2000.00'), 4))
+        
+    def test_interrupted_run_resumes(self):
+        """Test that orders move in chunks and a failed chunk leaves the earlier ones archived"""
+        orders = [self.make_order() for _ in range(5)]
+        real_move = archive._move
+        moved_orders = []
+        
+        def failing_move(target, rows, archived_at, partitions):
+            if target is ArchivedOrder:
+                moved_orders.append(sorted(rows.values_list('pk', flat=True)))
+                if len(moved_orders) == 2:
+                    raise RuntimeError('connection lost')
+            return real_move(target, rows, archived_at, partitions)
+            
+        with mock.patch('gas_management.archive._move', side_effect=failing_move):
+            with self.assertRaises(RuntimeError):
+                archive_orders(batch_size=2)
+        self.assertEqual(list(ArchivedOrder.objects.order_by('pk').values_list('pk', flat=True)),
+                         [order.pk for order in orders[:2]])
+        self.assertEqual(Order.objects.count(), 3)
+        
+        self.assertEqual(archive_orders(batch_size=2), 3)
+        self.assertEqual(archive_orders(batch_size=2), 0)
+        self.assertFalse(Order.objects.exists())
+        
+    def test_archived_orders_read_path(self):
+        """Test that archived orders are listed for their buyer, seller and admins, filtered by date"""
+        earlier = self.make_order(invoiced=True, rated=True, created_at=self.long_ago - datetime.timedelta(days=40))
+        later = self.make_order('REJECTED')
+        OrderStatusChange.objects.create(order_id=earlier.pk, from_status=2, to_status=4, actor=self.seller_user)
+        archive_orders()
+        
+        self.client.force_authenticate(user=self.buyer_user)
+        response = self.client.get(reverse('archived-order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in response.data['results']], [later.pk, earlier.pk])
+        first = response.data['results'][1]
+        self.assertEqual(first['invoice']['payment']['status'], 'COMPLETED')
+        self.assertEqual(first['rating']['rating'], 4)
+        self.assertIsNone(response.data['results'][0]['invoice'])
+        
+        day = timezone.localdate(earlier.created_at).isoformat()
+        response = self.client.get(reverse('archived-order-list'), {'date_from': day, 'date_to': day})
+        self.assertEqual([order['id'] for order in response.data['results']], [earlier.pk])
+        response = self.client.get(reverse('archived-order-list'), {'date_from': '2024-13-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('order-detail', args=[earlier.pk])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        
+        self.client.force_authenticate(user=self.seller_user)
+        self.assertEqual(self.client.get(reverse('archived-order-detail', args=[earlier.pk])).status_code,
+                         status.HTTP_200_OK)
+        history = self.client.get(reverse('archived-order-history', args=[earlier.pk])).data
+        self.assertEqual([(change['from_status'], change['to_status']) for change in history], [('APPROVED', 'DELIVERED')])
+        other = User.objects.create_user('other', 'other@test.com', 'password123')
+        UserProfile.objects.create(user=other, role='BUYER')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('archived-order-list')).data['results'], [])
+        self.assertEqual(self.client.get(reverse('archived-order-detail', args=[earlier.pk])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        
+    def test_rebuilds_count_archived_orders(self):
+        """Test that rebuilding ratings and sales after archiving finds nothing to change"""
+        self.make_order(invoiced=True, rated=True)
+        self.make_order(invoiced=True, rated=True, created_at=timezone.now() - datetime.timedelta(days=10))
+        rebuild_seller_ratings()
+        rebuild_sales()
+        profile = UserProfile.objects.get(user=self.seller_user)
+        sales = list(SellerDailySales.objects.order_by('day').values_list('day', 'orders', 'rating_sum'))
+        
+        self.assertEqual(archive_orders(), 1)
+        self.assertEqual(rebuild_seller_ratings(), 0)
+        self.assertEqual(rebuild_sales()[1], 0)
+        self.assertEqual(UserProfile.objects.get(user=self.seller_user).rating_count, profile.rating_count)
+        self.assertEqual(list(SellerDailySales.objects.order_by('day').values_list('day', 'orders', 'rating_sum')), sales)
+        
+    @skipUnless(connection.vendor == 'postgresql', 'the archive is only partitioned on PostgreSQL')
+    def test_archive_is_partitioned_by_month(self):
+        """Test that archiving creates the monthly partitions its rows land in"""
+        order = self.make_order(invoiced=True)
+        archive_orders()
+        month = order.created_at.astimezone(datetime.timezone.utc).strftime('%Y%m')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "WHERE parent.relname = %s",
+                [ArchivedOrder._meta.db_table]
+            )
+            partitions = {name for (name,) in cursor.fetchall()}
+        self.assertEqual(partitions, {f'{ArchivedOrder._meta.db_table}_p{month}'})
+        self.assertEqual(ArchivedOrder.objects.get().pk, order.pk)
+
+
+class InvoiceNumberTests(TestCase):
+    def setUp(self):
+        self.seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        self.buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        UserProfile.objects.create(user=self.seller_user, role='SELLER')
+        UserProfile.objects.create(user=self.buyer_user, role='BUYER')
+        self.inventory = GasInventory.objects.create(
+            seller=self.seller_user, brand='TOTAL', weight_kg=6, quantity=10,
+            unit_price=1000, location='Nairobi'
+        )
+        
+    def make_orders(self, count, status='APPROVED'):
+        return [
+            Order.objects.create(
+                gas_inventory=self.inventory, buyer=self.buyer_user, quantity=1,
+                total_price=1000, status=status,
+                delivery_address='Ngong Road', contact_phone='0700000000'
+            )
+            for _ in range(count)
+        ]
+        
+    def test_numbers_are_readable_and_increasing(self):
+        """Test that invoices saved one by one get INV- plus ten digits, in increasing order"""
+        numbers = [Invoice.objects.create(order=order).invoice_number for order in self.make_orders(3)]
+        for number in numbers:
+            self.assertRegex(number, r'^INV-\d{10}$')
+        self.assertEqual(numbers, sorted(set(numbers)))
+        
+    def test_outbox_drain_numbers_the_batch(self):
+        """Test that bulk-created invoices get distinct numbers in order id order"""
+        orders = self.make_orders(5)
+        InvoiceOutbox.objects.bulk_create([InvoiceOutbox(order=order) for order in orders])
+        self.assertEqual(drain_batch(), 5)
+        numbers = list(Invoice.objects.order_by('order_id').values_list('invoice_number', flat=True))
+        self.assertEqual(len(numbers), 5)
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertGreater(next_invoice_numbers(1)[0], numbers[-1])
+        
+    @skipUnless(connection.vendor == 'postgresql', 'blocks are reserved from a PostgreSQL sequence')
+    def test_one_round_trip_per_block(self):
+        """Test that a process reserves numbers a block at a time and issues the rest from memory"""
+        allocator = BlockAllocator()
+        with CaptureQueriesContext(connection) as queries:
+            first = allocator.take(150)
+            second = allocator.take(40)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all(SEQUENCE in query['sql'] for query in queries.captured_queries))
+        values = first + second
+        self.assertEqual(values, sorted(set(values)))
+        # The second block was consumed in order from its start
+        self.assertEqual(values[100:], list(range(values[100], values[100] + 90)))
+        
+    @skipUnless(connection.vendor == 'postgresql', 'blocks are reserved from a PostgreSQL sequence')
+    def test_forked_worker_reserves_its_own_block(self):
+        """Test that a process forked after its parent reserved a block does not reuse it"""
+        allocator = BlockAllocator()
+        parent = allocator.take(1)[0]
+        with mock.patch('gas_management.invoice_numbers.os.getpid', return_value=os.getpid() + 1):
+            child = allocator.take(1)[0]
+        self.assertGreaterEqual(child, parent + 100)
+        
+        
+@skipUnless(connection.vendor == 'postgresql', 'concurrent writers need PostgreSQL')
+class InvoiceNumberContentionTests(TransactionTestCase):
+    """Many workers numbering invoices at once must never produce the same number twice."""
+    
+    threads = 16
+    invoices_per_thread = 20
+    
+    def test_concurrent_workers_never_collide(self):
+        """Test that threads saving invoices and separate allocators standing in for processes never collide"""
+        seller_user = User.objects.create_user('seller', 'seller@test.com', 'password123')
+        buyer_user = User.objects.create_user('buyer', 'buyer@test.com', 'password123')
+        inventory = GasInventory.objects.create(
+            seller=seller_user, brand='TOTAL', weight_kg=6, quantity=10, unit_price=1000, location='Nairobi'
+        )
+        Order.objects.bulk_create([
+            Order(gas_inventory=inventory, buyer=buyer_user, quantity=1, total_price=1000, status='APPROVED',
+                  delivery_address='Ngong Road', contact_phone='0700000000')
+            for _ in range(self.threads * self.invoices_per_thread)
+        ])
+        order_ids = list(Order.objects.order_by('pk').values_list('pk', flat=True))
+        barrier = threading.Barrier(self.threads)
+        issued, errors = [], []
+        lock = threading.Lock()
+        
+        def work(index):
+            mine = order_ids[index::self.threads]
+            try:
+                barrier.wait()
+                if index % 2:
+                    # This process's own allocator, in batches as drain_batch() takes them
+                    allocator = BlockAllocator()
+                    values = [value for size in (1, 7, 45, 93, 154) for value in allocator.take(size)]
+                    with lock:
+                        issued.append(values)
+                for order_id in mine[:self.invoices_per_thread // 2]:
+                    Invoice.objects.create(order_id=order_id)
+                rest = mine[self.invoices_per_thread // 2:]
+                Invoice.objects.bulk_create([
+                    Invoice(order_id=order_id, invoice_number=number)
+                    for order_id, number in zip(rest, next_invoice_numbers(len(rest)))
+                ])
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+            finally:
+                connection.close()
+                
+        workers = [threading.Thread(target=work, args=(index,)) for index in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            
+        self.assertEqual(errors, [])
+        numbers = list(Invoice.objects.values_list('invoice_number', flat=True))
+        self.assertEqual(len(numbers), len(order_ids))
+        values = [int(number[len('INV-'):]) for number in numbers] + [value for batch in issued for value in batch]
+        self.assertEqual(len(values), len(set(values)))
+        for batch in issued:
+            self.assertEqual(batch, sorted(batch))
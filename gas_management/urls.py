@@ -1,6 +1,5 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView
 from . import views
 
 router = DefaultRouter()
@@ -10,20 +9,29 @@ router.register(r'orders', views.OrderViewSet, basename='order')
 router.register(r'invoices', views.InvoiceViewSet, basename='invoice')
 router.register(r'payments', views.PaymentViewSet, basename='payment')
 router.register(r'ratings', views.RatingViewSet, basename='rating')
+router.register(r'archive/orders', views.ArchivedOrderViewSet, basename='archived-order')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', views.RegisterView.as_view(), name='register'),
     # API v1 routes compatible with README documentation
     path('v1/register/', views.RegisterView.as_view(), name='v1-register'),
-    path('v1/login/', TokenObtainPairView.as_view(), name='login'),
+    path('v1/login/', views.LoginView.as_view(), name='login'),
     path('v1/gas/', views.GasInventoryViewSet.as_view({'get': 'list'}), name='v1-gas-list'),
     path('v1/orders/', views.OrderViewSet.as_view({'get': 'list', 'post': 'create'}), name='v1-orders'),
     path('v1/feedback/', views.RatingViewSet.as_view({'post': 'create'}), name='v1-feedback'),
     path('v1/seller/inventory/', views.GasInventoryViewSet.as_view({'get': 'my_inventory', 'post': 'create'}), name='v1-seller-inventory'),
+    path('v1/seller/inventory/import/', views.GasInventoryViewSet.as_view({'post': 'import_inventory'}), name='v1-seller-inventory-import'),
+    path('v1/seller/analytics/', views.SellerAnalyticsView.as_view(), name='v1-seller-analytics'),
     path('v1/seller/orders/', views.OrderViewSet.as_view({'get': 'seller_orders'}), name='v1-seller-orders'),
     path('v1/seller/invoice/', views.InvoiceViewSet.as_view({'post': 'create'}), name='v1-seller-invoice'),
     path('v1/admin/orders/pending/', views.OrderViewSet.as_view({'get': 'list'}), {'status': 'PENDING'}, name='v1-admin-orders-pending'),
+    path('v1/admin/orders/bulk-approve/', views.OrderViewSet.as_view({'post': 'bulk_approve'}), name='v1-admin-orders-bulk-approve'),
+    path('v1/admin/orders/bulk-reject/', views.OrderViewSet.as_view({'post': 'bulk_reject'}), name='v1-admin-orders-bulk-reject'),
+    path('v1/admin/orders/export/', views.OrderViewSet.as_view({'get': 'export'}), name='v1-admin-orders-export'),
+    path('v1/admin/invoices/export/', views.InvoiceViewSet.as_view({'get': 'export'}), name='v1-admin-invoices-export'),
+    path('v1/admin/payments/export/', views.PaymentViewSet.as_view({'get': 'export'}), name='v1-admin-payments-export'),
+    path('v1/admin/database-pool/', views.DatabasePoolView.as_view(), name='v1-admin-database-pool'),
     path('v1/admin/invoices/pending/', views.InvoiceViewSet.as_view({'get': 'list'}), {'admin_approval': False}, name='v1-admin-invoices-pending'),
     
     # Adding explicit endpoints for actions
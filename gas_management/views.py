@@ -1,19 +1,125 @@
+import datetime
+import os
+
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
 
-from .models import UserProfile, GasInventory, Order, Invoice, Payment, Rating
+from .models import UserProfile, GasInventory, Order, OrderStatusChange, Invoice, Payment, Rating, ArchivedOrder
 from .serializers import (
     UserSerializer, UserProfileSerializer, GasInventorySerializer,
-    OrderSerializer, InvoiceSerializer, PaymentSerializer, RatingSerializer,
-    UserRegistrationSerializer
+    OrderSerializer, OrderStatusChangeSerializer, InvoiceSerializer, PaymentSerializer, RatingSerializer,
+    UserRegistrationSerializer, ArchivedOrderSerializer
 )
 from .permissions import IsBuyer, IsSeller, IsAdmin, IsSellerOrReadOnly, IsBuyerOrSellerOrAdmin
+from .pagination import InventoryCursorPagination, CreatedAtCursorPagination
+from .authentication import GasTokenObtainPairSerializer, GasTokenRefreshSerializer, get_principal
+from .stock import InsufficientStock, take_stock, return_stock
+from .importers import InventoryImport, ImportFormatError, read_rows
+from .invoicing import queue_invoices
+from .catalogue_cache import cache_timeout, catalogue_filters, catalogue_key, stats as catalogue_cache_stats
+from .exports import (
+    ORDER_COLUMNS, INVOICE_COLUMNS, PAYMENT_COLUMNS, INVOICE_STATUS_FILTERS,
+    ExportError, filter_export, stream_export
+)
+from .ratings import record_seller_rating
+from .geo import GeoQueryError, nearest, parse_near
+from .search import CatalogueSearchFilter
+from .analytics import order_sales, record_rating, record_sales, seller_dashboard
+from .approvals import MAX_BATCH_SIZE, approve_orders, reject_orders
+from .order_states import InvalidTransition, transition
+from .events import publish_order_status
+from .connection_pool import pool_stats
+from .projections import projection_for
+from .idempotency import idempotent
+from .conditional import entity_tag, last_modified, not_modified, rows_version, set_validators
+
+def get_principal_or_404(request):
+    """ Return the caller's request-scoped principal, or 404 if they have no profile. """
+    principal = get_principal(request)
+    if principal.role is None:
+        raise Http404('No UserProfile matches the given query.')
+    return principal
+
+def projected_list(view, queryset):
+    """
+    A page of `queryset` built from the serializer's values() projection
+    instead of model instances; the JSON is the same, only cheaper to make.
+    The page's ETag comes from its rows' `view.validator_fields`, and a
+    client already holding it gets a 304 before anything is serialized.
+    """
+    projection = projection_for(view.get_serializer_class())
+    ordering = view.paginator.get_ordering(view.request, queryset, view) if view.paginator else ()
+    rows = projection.queryset(queryset, ordering, view.validator_fields)
+    page = view.paginate_queryset(rows)
+    rows = rows if page is None else page
+    # The next and previous links are all a page shows beyond its rows
+    version = rows_version(rows, view.validator_fields,
+                           getattr(view.paginator, 'has_next', None), getattr(view.paginator, 'has_previous', None))
+    etag = entity_tag(view.request, version)
+    response = not_modified(view.request, etag)
+    if response is not None:
+        return response
+        
+    items, plain = projection.serialize(rows)
+    response = Response(items) if page is None else view.get_paginated_response(items)
+    # Lets ProjectedJSONRenderer take its faster encoder
+    response.projected = plain
+    response.rows_version = version
+    return set_validators(response, etag)
+
+def conditional_retrieve(view):
+    """ `view`'s object, or a 304 when the client's copy has the same `view.validator_fields`. """
+    instance = view.get_object()
+    etag = entity_tag(view.request, rows_version([instance], view.validator_fields))
+    modified = last_modified([instance], view.validator_fields)
+    response = not_modified(view.request, etag, modified)
+    if response is not None:
+        return response
+        
+    return set_validators(Response(view.get_serializer(instance).data), etag, modified)
+
+def admin_export(request, queryset, columns, filename, status_filters=None):
+    """ Stream a filtered export of `queryset` to an admin, or explain why not. """
+    principal = get_principal_or_404(request)
+    if not principal.is_admin:
+        return Response(
+            {"detail": "Only admins can export records."}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+        
+    try:
+        queryset = filter_export(queryset, request.query_params, status_filters)
+        return stream_export(queryset, columns, request.query_params.get('export_format', 'csv'), filename)
+    except ExportError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+def parse_order_ids(data):
+    """ Return the de-duplicated order ids from a batch request body, or None if malformed. """
+    ids = data.get('ids') if hasattr(data, 'get') else None
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_BATCH_SIZE:
+        return None
+    if not all(isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in ids):
+        return None
+    return list(dict.fromkeys(ids))
+
+class LoginView(TokenObtainPairView):
+    """ Obtain a JWT pair whose access token carries the user's role. """
+    serializer_class = GasTokenObtainPairSerializer
+
+class RefreshView(TokenRefreshView):
+    """ Refresh an access token, with the user's current role as its claim. """
+    serializer_class = GasTokenRefreshSerializer
 
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -28,8 +134,52 @@ class RegisterView(APIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class SellerAnalyticsView(APIView):
+    """ Revenue, units, orders and average rating for the calling seller, served from daily rollups. """
+    permission_classes = [permissions.IsAuthenticated]
+    default_days = 30
+    max_days = 366
+    
+    def get(self, request):
+        principal = get_principal_or_404(request)
+        if not principal.is_seller:
+            return Response(
+                {"detail": "Only sellers can view sales analytics."}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+            
+        # Both bounds are inclusive dates; the default window ends today
+        try:
+            date_to = parse_date(request.query_params.get('date_to', '')) or timezone.localdate()
+            date_from = parse_date(request.query_params.get('date_from', '')) or (
+                date_to - datetime.timedelta(days=self.default_days - 1)
+            )
+        except ValueError:
+            date_from = date_to = None
+        if date_from is None or date_from > date_to or (date_to - date_from).days >= self.max_days:
+            return Response(
+                {"detail": f"date_from and date_to must be valid dates at most {self.max_days} days apart."}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        return Response(seller_dashboard(request.user.pk, date_from, date_to))
+
+class DatabasePoolView(APIView):
+    """ Connection pool statistics for the worker process that serves the request. """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
+            return Response(
+                {"detail": "Only admins can view database pool statistics."}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+            
+        return Response({"pid": os.getpid(), "pools": pool_stats()})
+
 class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -40,48 +190,49 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 class GasInventoryViewSet(viewsets.ModelViewSet):
-    queryset = GasInventory.objects.all()
+    # GasInventorySerializer reads seller.username
+    queryset = GasInventory.objects.select_related('seller')
     serializer_class = GasInventorySerializer
     permission_classes = [permissions.IsAuthenticated, IsSellerOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = InventoryCursorPagination
+    # CatalogueSearchFilter also picks the paginator's ordering, so it goes first
+    filter_backends = [CatalogueSearchFilter, filters.OrderingFilter]
     search_fields = ['brand', 'location']
-    ordering_fields = ['unit_price', 'weight_kg', 'date_added']
+    ordering_fields = ['unit_price', 'weight_kg', 'date_added', 'seller_rating', 'seller_rating_count']
+    # Timestamps that move whenever a row's output changes; see conditional
+    validator_fields = ('last_updated',)
     
     def get_queryset(self):
-        queryset = GasInventory.objects.all()
+        queryset = super().get_queryset()
+        # Normalised as the cache key normalises them, so a cached page is
+        # only ever reused for requests that select the same rows
+        params = catalogue_filters(self.request.query_params)
         
         # Filter by brand
-        brand = self.request.query_params.get('brand', None)
+        brand = params.get('brand')
         if brand:
             queryset = queryset.filter(brand__iexact=brand)
             
-        # Filter by weight
-        weight = self.request.query_params.get('weight', None)
+        # Filter by weight ("6", "6.0" and "6kg" alike)
+        weight = params.get('weight')
         if weight:
-            # Remove 'kg' suffix if present and convert to decimal
-            try:
-                if 'kg' in weight.lower():
-                    weight = weight.lower().replace('kg', '').strip()
-                weight_value = float(weight)
-                queryset = queryset.filter(weight_kg=weight_value)
-            except ValueError:
-                pass
+            queryset = queryset.filter(weight_kg=float(weight))
             
         # Filter by location
-        location = self.request.query_params.get('location', None)
+        location = params.get('location')
         if location:
             queryset = queryset.filter(location__icontains=location)
             
         # Filter by price range
-        min_price = self.request.query_params.get('min_price', None)
-        max_price = self.request.query_params.get('max_price', None)
+        min_price = params.get('min_price')
+        max_price = params.get('max_price')
         if min_price:
             queryset = queryset.filter(unit_price__gte=min_price)
         if max_price:
             queryset = queryset.filter(unit_price__lte=max_price)
             
         # Filter by seller
-        seller_id = self.request.query_params.get('seller', None)
+        seller_id = params.get('seller')
         if seller_id:
             queryset = queryset.filter(seller_id=seller_id)
             
@@ -90,36 +241,119 @@ class GasInventoryViewSet(viewsets.ModelViewSet):
             
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        """
+        The catalogue is identical for every caller, so whole pages are cached
+        under a key built from the filters; see catalogue_cache for invalidation.
+        """
+        timeout = cache_timeout()
+        if not timeout:
+            return self.catalogue_page(request, *args, **kwargs)
+            
+        key = catalogue_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            catalogue_cache_stats.hit()
+            data, version = cached
+            etag = entity_tag(request, version)
+            response = not_modified(request, etag) or Response(data)
+            response['X-Cache'] = 'HIT'
+            return set_validators(response, etag)
+            
+        catalogue_cache_stats.miss()
+        response = self.catalogue_page(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, (response.data, response.rows_version), timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_retrieve(self)
+    
+    def catalogue_page(self, request, *args, **kwargs):
+        """
+        With `near=lat,lon` the page is the closest in-stock items within
+        `radius_km`, nearest first and each with its `distance_km`, instead
+        of a cursor page in the requested ordering.
+        """
+        near = request.query_params.get('near')
+        if not near:
+            return projected_list(self, self.filter_queryset(self.get_queryset()))
+            
+        try:
+            lat, lon, radius_km = parse_near(near, request.query_params.get('radius_km'))
+        except GeoQueryError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            
+        page = nearest(self.filter_queryset(self.get_queryset()), lat, lon, radius_km,
+                       self.paginator.get_page_size(request))
+        version = rows_version(page, self.validator_fields, 'near')
+        etag = entity_tag(request, version)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+            
+        results = self.get_serializer(page, many=True).data
+        for data, item in zip(results, page):
+            data['distance_km'] = round(item.distance_km, 3)
+        response = Response({'next': None, 'previous': None, 'results': results})
+        response.rows_version = version
+        return set_validators(response, etag)
+    
     @action(detail=False, methods=['get'])
     def my_inventory(self, request):
-        queryset = self.get_queryset().filter(seller=request.user)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return projected_list(self, self.filter_queryset(self.get_queryset().filter(seller=request.user)))
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_inventory(self, request):
+        """
+        Bulk create or restock the seller's inventory from a CSV or NDJSON body.
+        The body is streamed straight from the request, never via request.data.
+        """
+        principal = get_principal_or_404(request)
+        if not principal.is_seller:
+            return Response(
+                {"detail": "Only sellers can import inventory."}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+            
+        stream = request.stream if request.stream is not None else []
+        try:
+            summary = InventoryImport(request.user).run(read_rows(stream, request.content_type))
+        except ImportFormatError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            
+        return Response(summary)
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+    # OrderSerializer reads buyer.username, gas_inventory and its seller.username
+    queryset = Order.objects.select_related('buyer', 'gas_inventory__seller')
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsBuyerOrSellerOrAdmin]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'updated_at', 'status']
+    # An order also shows its inventory's brand, weight, price and location
+    validator_fields = ('updated_at', 'gas_inventory__last_updated')
     
     def get_queryset(self):
         user = self.request.user
-        profile = get_object_or_404(UserProfile, user=user)
+        principal = get_principal_or_404(self.request)
         
         # Admins can see all orders
-        if profile.role == 'ADMIN':
-            return Order.objects.all()
+        if principal.is_admin:
+            return super().get_queryset()
             
         # Regular users can see orders where they're the buyer or the seller
-        return Order.objects.filter(
+        return super().get_queryset().filter(
             Q(buyer=user) | Q(gas_inventory__seller=user)
         )
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         # Check if user is a buyer
-        profile = get_object_or_404(UserProfile, user=request.user)
-        if profile.role != 'BUYER':
+        principal = get_principal_or_404(request)
+        if not principal.is_buyer:
             return Response(
                 {"detail": "Only buyers can place orders."}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -150,74 +384,118 @@ class OrderViewSet(viewsets.ModelViewSet):
             
         return super().create(request, *args, **kwargs)
     
+    def list(self, request, *args, **kwargs):
+        return projected_list(self, self.filter_queryset(self.get_queryset()))
+    
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_retrieve(self)
+    
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
-        queryset = Order.objects.filter(buyer=request.user)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return projected_list(self, self.filter_queryset(self.queryset.filter(buyer=request.user)))
     
     @action(detail=False, methods=['get'])
     def seller_orders(self, request):
-        queryset = Order.objects.filter(gas_inventory__seller=request.user)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return projected_list(self, self.filter_queryset(self.queryset.filter(gas_inventory__seller=request.user)))
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """ Stream every order matching the date and status filters as CSV or NDJSON. """
+        return admin_export(request, Order.objects.all(), ORDER_COLUMNS, 'orders')
         
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         order = self.get_object()
         
         # Check if user is admin
-        profile = get_object_or_404(UserProfile, user=request.user)
-        if profile.role != 'ADMIN':
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
             return Response(
                 {"detail": "Only admins can approve orders."}, 
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        if order.status != 'PENDING':
+        try:
+            with transaction.atomic():
+                # Of two admins approving at once only one moves the order
+                transition(order, 'APPROVED', request.user)
+                # Decrease inventory quantity only if enough is in stock
+                take_stock(order.gas_inventory_id, order.quantity)
+                record_sales([order_sales(order)])
+                queue_invoices([order.pk])
+                publish_order_status(order, 'PENDING')
+        except InvalidTransition as exc:
             return Response(
-                {"detail": f"Cannot approve order with status {order.status}"}, 
+                {"detail": f"Cannot approve order with status {exc.status}"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        # Check if there's enough inventory
-        if order.quantity > order.gas_inventory.quantity:
+        except InsufficientStock:
             return Response(
                 {"detail": "Not enough inventory to fulfill this order."}, 
-                status=status.HTTP_400_BAD_REQUEST
+                status=status.HTTP_409_CONFLICT
             )
-            
-        # Update order status
-        order.status = 'APPROVED'
-        order.save()
-        
-        # Decrease inventory quantity
-        inventory = order.gas_inventory
-        inventory.quantity -= order.quantity
-        inventory.save()
         
         return Response(OrderSerializer(order).data)
     
+    @action(detail=False, methods=['post'], url_path='bulk-approve')
+    def bulk_approve(self, request):
+        """ Approve a batch of pending orders; responds with one outcome per requested id. """
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
+            return Response(
+                {"detail": "Only admins can approve orders."}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+            
+        order_ids = parse_order_ids(request.data)
+        if order_ids is None:
+            return Response(
+                {"detail": f"ids must be a list of 1 to {MAX_BATCH_SIZE} order ids."}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        return Response({"results": approve_orders(order_ids, request.user.pk)})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-reject')
+    def bulk_reject(self, request):
+        """ Reject a batch of pending orders; responds with one outcome per requested id. """
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
+            return Response(
+                {"detail": "Only admins can reject orders."}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+            
+        order_ids = parse_order_ids(request.data)
+        if order_ids is None:
+            return Response(
+                {"detail": f"ids must be a list of 1 to {MAX_BATCH_SIZE} order ids."}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        return Response({"results": reject_orders(order_ids, request.user.pk)})
+    
     @action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
         order = self.get_object()
         
         # Check if user is admin
-        profile = get_object_or_404(UserProfile, user=request.user)
-        if profile.role != 'ADMIN':
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
             return Response(
                 {"detail": "Only admins can reject orders."}, 
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        if order.status != 'PENDING':
+        try:
+            with transaction.atomic():
+                transition(order, 'REJECTED', request.user)
+                publish_order_status(order, 'PENDING')
+        except InvalidTransition as exc:
             return Response(
-                {"detail": f"Cannot reject order with status {order.status}"}, 
+                {"detail": f"Cannot reject order with status {exc.status}"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        order.status = 'REJECTED'
-        order.save()
         
         return Response(OrderSerializer(order).data)
     
@@ -232,21 +510,22 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        if order.status not in ['PENDING', 'APPROVED']:
+        try:
+            with transaction.atomic():
+                # Stock is returned at most once: only one cancel can move the order
+                previous_status = transition(order, 'CANCELLED', request.user)
+                
+                # If order was approved, return quantity to inventory
+                if previous_status == 'APPROVED':
+                    return_stock(order.gas_inventory_id, order.quantity)
+                    record_sales([order_sales(order)], sign=-1)
+                publish_order_status(order, previous_status)
+        except InvalidTransition as exc:
             return Response(
-                {"detail": f"Cannot cancel order with status {order.status}"}, 
+                {"detail": f"Cannot cancel order with status {exc.status}"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # If order was approved, return quantity to inventory
-        if order.status == 'APPROVED':
-            inventory = order.gas_inventory
-            inventory.quantity += order.quantity
-            inventory.save()
-            
-        order.status = 'CANCELLED'
-        order.save()
-        
         return Response(OrderSerializer(order).data)
         
     @action(detail=True, methods=['post'])
@@ -260,42 +539,57 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        if order.status != 'APPROVED':
+        try:
+            with transaction.atomic():
+                transition(order, 'DELIVERED', request.user)
+                publish_order_status(order, 'APPROVED')
+        except InvalidTransition as exc:
             return Response(
-                {"detail": f"Cannot mark as delivered an order with status {order.status}"}, 
+                {"detail": f"Cannot mark as delivered an order with status {exc.status}"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        order.status = 'DELIVERED'
-        order.save()
         
         return Response(OrderSerializer(order).data)
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """ The order's status changes, oldest first. """
+        order = self.get_object()
+        changes = order.status_changes.order_by('changed_at', 'pk')
+        return Response(OrderStatusChangeSerializer(changes, many=True).data)
 
 class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.all()
+    # InvoiceSerializer nests OrderSerializer
+    queryset = Invoice.objects.select_related('order__buyer', 'order__gas_inventory__seller')
     serializer_class = InvoiceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         user = self.request.user
-        profile = get_object_or_404(UserProfile, user=user)
+        principal = get_principal_or_404(self.request)
         
         # Admins can see all invoices
-        if profile.role == 'ADMIN':
-            return Invoice.objects.all()
+        if principal.is_admin:
+            return super().get_queryset()
             
         # Regular users can see invoices for orders where they're the buyer or seller
-        return Invoice.objects.filter(
+        return super().get_queryset().filter(
             Q(order__buyer=user) | Q(order__gas_inventory__seller=user)
         )
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """ Stream every invoice matching the date and PAID/UNPAID filters as CSV or NDJSON. """
+        return admin_export(request, Invoice.objects.all(), INVOICE_COLUMNS, 'invoices', INVOICE_STATUS_FILTERS)
+    
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         invoice = self.get_object()
         
         # Check if user is admin
-        profile = get_object_or_404(UserProfile, user=request.user)
-        if profile.role != 'ADMIN':
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
             return Response(
                 {"detail": "Only admins can approve invoices."}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -321,71 +615,86 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         return Response(InvoiceSerializer(invoice).data)
         
     @action(detail=True, methods=['post'])
+    @idempotent
     def mark_as_paid(self, request, pk=None):
         invoice = self.get_object()
         
         # Only admin can mark as paid
-        profile = get_object_or_404(UserProfile, user=request.user)
-        if profile.role != 'ADMIN':
+        principal = get_principal_or_404(request)
+        if not principal.is_admin:
             return Response(
                 {"detail": "Only admins can mark invoices as paid."}, 
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        if invoice.is_paid:
-            return Response(
-                {"detail": "Invoice already marked as paid."}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        with transaction.atomic():
+            # Re-read under a row lock so two requests cannot both create the payment
+            invoice.is_paid = Invoice.objects.select_for_update().values_list('is_paid', flat=True).get(pk=invoice.pk)
+            if invoice.is_paid:
+                return Response(
+                    {"detail": "Invoice already marked as paid."}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+                
+            invoice.is_paid = True
+            invoice.payment_date = timezone.now()
+            invoice.save()
             
-        invoice.is_paid = True
-        invoice.payment_date = timezone.now()
-        invoice.save()
-        
-        # Optionally create payment record
-        Payment.objects.create(
-            invoice=invoice,
-            amount=invoice.order.total_price,
-            status='COMPLETED',
-            payment_method='Admin Approved'
-        )
+            # Optionally create payment record
+            Payment.objects.create(
+                invoice=invoice,
+                amount=invoice.order.total_price,
+                status='COMPLETED',
+                payment_method='Admin Approved'
+            )
         
         return Response(InvoiceSerializer(invoice).data)
 
 class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all()
+    # PaymentSerializer nests InvoiceSerializer, which nests OrderSerializer
+    queryset = Payment.objects.select_related(
+        'invoice__order__buyer', 'invoice__order__gas_inventory__seller'
+    )
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         user = self.request.user
-        profile = get_object_or_404(UserProfile, user=user)
+        principal = get_principal_or_404(self.request)
         
         # Admins can see all payments
-        if profile.role == 'ADMIN':
-            return Payment.objects.all()
+        if principal.is_admin:
+            return super().get_queryset()
             
         # Regular users can see payments for their orders
-        return Payment.objects.filter(
+        return super().get_queryset().filter(
             Q(invoice__order__buyer=user) | Q(invoice__order__gas_inventory__seller=user)
         )
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """ Stream every payment matching the date and status filters as CSV or NDJSON. """
+        return admin_export(request, Payment.objects.all(), PAYMENT_COLUMNS, 'payments')
 
 class RatingViewSet(viewsets.ModelViewSet):
-    queryset = Rating.objects.all()
+    # RatingSerializer reads the order's buyer and seller usernames
+    queryset = Rating.objects.select_related('order__buyer', 'order__gas_inventory__seller')
     serializer_class = RatingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         user = self.request.user
-        profile = get_object_or_404(UserProfile, user=user)
+        principal = get_principal_or_404(self.request)
         
         # Admins can see all ratings
-        if profile.role == 'ADMIN':
-            return Rating.objects.all()
+        if principal.is_admin:
+            return super().get_queryset()
             
         # Regular users can see ratings for their orders (as buyer)
         # or ratings for orders related to their inventory (as seller)
-        return Rating.objects.filter(
+        return super().get_queryset().filter(
             Q(order__buyer=user) | Q(order__gas_inventory__seller=user)
         )
     
@@ -419,4 +728,87 @@ class RatingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
             
-        return super().create(request, *args, **kwargs)
\ No newline at end of file
+        return super().create(request, *args, **kwargs)
+    
+    def record(self, rating, count_delta, sum_delta):
+        # Keep the sales rollup and the seller's denormalised rating in step with the Rating table
+        record_rating(rating, count_delta, sum_delta)
+        record_seller_rating(rating.order.gas_inventory.seller_id, count_delta, sum_delta)
+        
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            rating = serializer.save()
+            self.record(rating, 1, rating.rating)
+            
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            previous = Rating.objects.select_for_update().values_list('rating', flat=True).get(pk=serializer.instance.pk)
+            rating = serializer.save()
+            if rating.rating != previous:
+                self.record(rating, 0, rating.rating - previous)
+                
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self.record(instance, -1, -instance.rating)
+            instance.delete()
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class ArchivedOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """ Orders moved out of the live tables by archive_orders, with their invoice, payment and rating. """
+    queryset = ArchivedOrder.objects.select_related('invoice__payment', 'rating')
+    serializer_class = ArchivedOrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    
+    def get_queryset(self):
+        user = self.request.user
+        principal = get_principal_or_404(self.request)
+        
+        # Admins can see all archived orders
+        if principal.is_admin:
+            return super().get_queryset()
+            
+        # Buyers see the archived orders they placed and sellers those against
+        # their inventory. A profile has one role, so unlike the live order
+        # list there is no OR, and a buyer's page is one walk of the
+        # (buyer_id, created_at, id) index in each partition.
+        if principal.is_seller:
+            return super().get_queryset().filter(gas_inventory__seller=user)
+        return super().get_queryset().filter(buyer=user)
+    
+    def list(self, request, *args, **kwargs):
+        # Both bounds are optional inclusive dates. They filter on created_at
+        # itself, so PostgreSQL only reads the monthly partitions they cover.
+        queryset = self.get_queryset()
+        bounds = {}
+        for name in ('date_from', 'date_to'):
+            value = request.query_params.get(name)
+            if not value:
+                continue
+            try:
+                bounds[name] = parse_date(value)
+            except ValueError:
+                bounds[name] = None
+            if bounds[name] is None:
+                return Response(
+                    {"detail": "date_from and date_to must be dates (YYYY-MM-DD)."}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        if 'date_from' in bounds:
+            queryset = queryset.filter(created_at__gte=_start_of_day(bounds['date_from']))
+        if 'date_to' in bounds:
+            queryset = queryset.filter(created_at__lt=_start_of_day(bounds['date_to'] + datetime.timedelta(days=1)))
+            
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """ The archived order's status changes, which stay in the live history table, oldest first. """
+        order = self.get_object()
+        changes = OrderStatusChange.objects.filter(order_id=order.pk).order_by('changed_at', 'pk')
+        return Response(OrderStatusChangeSerializer(changes, many=True).data)